@@ -7,23 +7,64 @@ from routes.usuarios_routes import usuarios_bp
 from routes.producto_routes import productos_bp
 from routes.empleado_routes import empleado_bp
 from routes.contrato_routes import contrato_bp
+from routes.admin_routes import admin_bp
+from comandos import registrar_comandos
+from models.schema import asegurar_esquema
+from config import conexion, ARANGO_BACKEND
+from services.metricas import instalar_metricas, registro
+from services.pdf_pool import pool_facturas
+from services.catalogo_cache import catalogo
+from services import secuencias
+from services.busqueda_global import busqueda
 
 
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'supersecretkey')
+def crear_app():
+    """
+    Crea la aplicación Flask. La usan el servidor de desarrollo
+    (python app.py), 'flask --app app' y gunicorn (ver gunicorn.conf.py).
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv('SECRET_KEY', 'supersecretkey')
 
+    # Colecciones e índices declarados en models/schema.py (una consulta si ya están)
+    asegurar_esquema()
+    if ARANGO_BACKEND == "memoria":
+        # Base en memoria: arranca vacía en cada proceso, cargar datos de prueba
+        from services.datos_sinteticos import poblar_si_vacia
+        poblar_si_vacia()
 
-# Blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(cliente_bp)
-app.register_blueprint(ventas_bp)
-app.register_blueprint(usuarios_bp)
-app.register_blueprint(productos_bp)
-app.register_blueprint(empleado_bp)
-app.register_blueprint(contrato_bp)
+    # Blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(cliente_bp)
+    app.register_blueprint(ventas_bp)
+    app.register_blueprint(usuarios_bp)
+    app.register_blueprint(productos_bp)
+    app.register_blueprint(empleado_bp)
+    app.register_blueprint(contrato_bp)
+    app.register_blueprint(admin_bp)
 
+    # El índice del buscador del administrador (/admin/buscar) no se construye
+    # aquí: los comandos 'flask' y los benchmarks también importan la app. Lo
+    # construye gunicorn (when_ready) o la primera búsqueda.
 
-# Configuración para Railway
+    # Comandos de mantenimiento (flask --app app <comando>)
+    registrar_comandos(app)
+
+    # Métricas Prometheus por endpoint + pools (GET /metrics, sólo administradores)
+    instalar_metricas(app)
+    registro.agregar_fuente("arango_pool", conexion.metricas)
+    registro.agregar_fuente("pdf_pool", pool_facturas.metricas)
+    registro.agregar_fuente("catalogo_cache", catalogo.metricas)
+    registro.agregar_fuente("secuencias", secuencias.metricas)
+    registro.agregar_fuente("busqueda_global", busqueda.metricas)
+
+    return app
+
+
+app = crear_app()
+
+
+# Servidor de desarrollo (en producción: gunicorn -c gunicorn.conf.py app:app)
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
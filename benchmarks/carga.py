@@ -0,0 +1,312 @@
+"""
+Prueba de carga de punta a punta del punto de venta.
+
+Cada hilo es un vendedor: inicia sesión, arma carritos (con productos
+"populares" que compiten por el mismo stock), los envía a /ventas, sigue la
+redirección a la factura, descarga el PDF y mezcla reportes y listados.
+Al final informa throughput, latencias p50/p95/p99 por operación y, en modo
+local, verifica el stock: ninguno negativo y stock inicial - vendido = stock final.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.carga --hilos 8 --duracion 30            # app y base en memoria, en proceso
+    python -m benchmarks.carga --url http://127.0.0.1:5000 --escala chico
+        (servidor levantado con ARANGO_BACKEND=memoria ARANGO_MEMORIA_DATOS=chico y
+         un solo worker; sin verificación de stock)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+# En modo local la app corre en este proceso sobre la base en memoria
+os.environ["ARANGO_BACKEND"] = "memoria"
+os.environ["ARANGO_MEMORIA_DATOS"] = "0"
+os.environ.setdefault("AQL_PERFIL", "0")
+
+from benchmarks.comun import commit_actual, guardar_resultados, percentil
+from services.datos_sinteticos import SEMILLA, USUARIOS_DEMO, parametros_escala
+
+# Peso de cada acción en la mezcla de tráfico
+MEZCLA = {"venta": 6, "listado": 3, "reporte": 1}
+LISTADOS = ["/ventas/facturas", "/ventas/stock", "/clientes", "/ventas/buscar/productos?q=leche",
+            "/ventas/buscar/clientes?q=ana"]
+PERIODOS = ["semanal", "mensual"]
+# Productos que aparecen en la mitad de los carritos (compiten por el stock)
+PRODUCTOS_POPULARES = 10
+
+
+class ClienteLocal:
+    """Cliente de prueba de Flask: la app corre en el mismo proceso."""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def get(self, ruta):
+        r = self._cliente.get(ruta)
+        return r.status_code, r.headers.get("Location"), r.data
+
+    def post(self, ruta, datos):
+        r = self._cliente.post(ruta, data=datos)
+        return r.status_code, r.headers.get("Location"), r.data
+
+
+class ClienteRemoto:
+    """Cliente HTTP contra un servidor ya levantado (sin seguir redirecciones)."""
+
+    def __init__(self, url):
+        import requests
+        self._url = url.rstrip("/")
+        self._sesion = requests.Session()
+
+    def _ruta(self, location):
+        if location and location.startswith(self._url):
+            return location[len(self._url):]
+        return location
+
+    def get(self, ruta):
+        r = self._sesion.get(self._url + ruta, allow_redirects=False, timeout=60)
+        return r.status_code, self._ruta(r.headers.get("Location")), r.content
+
+    def post(self, ruta, datos):
+        r = self._sesion.post(self._url + ruta, data=datos, allow_redirects=False, timeout=60)
+        return r.status_code, self._ruta(r.headers.get("Location")), r.content
+
+
+class Resultados:
+    """Latencias (ms) y contadores por operación, compartidos entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+        self.eventos = {}
+
+    def medir(self, operacion, funcion, *args):
+        inicio = time.perf_counter()
+        try:
+            respuesta = funcion(*args)
+        except Exception:
+            self.contar(operacion, error=True)
+            raise
+        ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.latencias.setdefault(operacion, []).append(ms)
+            if respuesta[0] >= 500:
+                self.errores[operacion] = self.errores.get(operacion, 0) + 1
+        return respuesta
+
+    def contar(self, evento, error=False):
+        with self._lock:
+            destino = self.errores if error else self.eventos
+            destino[evento] = destino.get(evento, 0) + 1
+
+    def resumen(self, segundos):
+        with self._lock:
+            operaciones = {}
+            total = 0
+            for operacion, valores in sorted(self.latencias.items()):
+                ordenados = sorted(valores)
+                total += len(ordenados)
+                operaciones[operacion] = {
+                    "requests": len(ordenados),
+                    "errores": self.errores.get(operacion, 0),
+                    "rps": round(len(ordenados) / segundos, 2),
+                    "ms_p50": round(percentil(ordenados, 50), 2),
+                    "ms_p95": round(percentil(ordenados, 95), 2),
+                    "ms_p99": round(percentil(ordenados, 99), 2),
+                    "ms_max": round(ordenados[-1], 2),
+                }
+            return {
+                "segundos": round(segundos, 2),
+                "requests": total,
+                "rps": round(total / segundos, 2),
+                "ventas_por_segundo": round(self.eventos.get("venta_ok", 0) / segundos, 2),
+                "eventos": dict(self.eventos),
+                "errores": {k: v for k, v in self.errores.items() if k not in operaciones},
+                "operaciones": operaciones,
+            }
+
+
+def _carrito(azar, productos):
+    populares = min(PRODUCTOS_POPULARES, productos)
+    lineas = {}
+    for _ in range(azar.randint(1, 4)):
+        if azar.random() < 0.5:
+            numero = azar.randint(1, populares)
+        else:
+            numero = azar.randint(1, productos)
+        lineas[f"p{numero}"] = lineas.get(f"p{numero}", 0) + azar.randint(1, 3)
+    return [{"id": k, "cantidad": v} for k, v in lineas.items()]
+
+
+def _vender(cliente, azar, parametros, resultados, descargar_pdf):
+    carrito = _carrito(azar, parametros["productos"])
+    estado, location, _ = resultados.medir("venta", cliente.post, "/ventas", {
+        "cliente": f"c{azar.randint(1, parametros['clientes'])}",
+        "carrito": json.dumps(carrito)
+    })
+    if estado != 302 or not location or "/ventas/factura/" not in location:
+        resultados.contar("venta_rechazada")
+        return
+    resultados.contar("venta_ok")
+    resultados.medir("factura", cliente.get, location)
+    if descargar_pdf:
+        estado, location, _ = resultados.medir("factura_pdf", cliente.get, location + "/pdf")
+        if estado != 200:
+            resultados.contar("pdf_no_listo")
+
+
+def vendedor(numero, crear_cliente, fin, parametros, resultados, semilla, descargar_pdf):
+    """Hilo de un vendedor: inicia sesión y repite la mezcla de acciones hasta 'fin'."""
+    azar = random.Random(semilla + numero)
+    vendedores = [u for u in USUARIOS_DEMO if u[3] != "administrador"]
+    _, email, password, _ = vendedores[numero % len(vendedores)]
+    cliente = crear_cliente()
+    estado, _, _ = resultados.medir("login", cliente.post, "/", {"email": email, "password": password})
+    if estado != 302:
+        resultados.contar("login", error=True)
+        return
+    acciones, pesos = list(MEZCLA), list(MEZCLA.values())
+    while time.perf_counter() < fin:
+        accion = azar.choices(acciones, pesos)[0]
+        try:
+            if accion == "venta":
+                _vender(cliente, azar, parametros, resultados, descargar_pdf)
+            elif accion == "listado":
+                resultados.medir("listado", cliente.get, azar.choice(LISTADOS))
+            else:
+                resultados.medir("reporte", cliente.get, f"/reporte_ventas?periodo={azar.choice(PERIODOS)}")
+        except Exception as e:
+            print(f"❌ Vendedor {numero} ({accion}): {e}")
+
+
+def _stock_por_producto(db):
+    aql = """
+    FOR s IN stock
+        COLLECT producto_id = s.producto_id AGGREGATE cantidad = SUM(s.cantidad)
+        RETURN [producto_id, cantidad]
+    """
+    return dict(db.aql.execute(aql))
+
+
+def verificar_stock(db, inicial, desde):
+    """
+    Compara el stock final con el inicial menos lo vendido desde 'desde'.
+    - negativos: productos con stock < 0
+    - descuentos_perdidos: vendidos pero el stock no bajó lo mismo (quedó más)
+    - descuentos_de_mas: el stock bajó más de lo vendido
+    """
+    aql = """
+    FOR v IN ventas
+        FILTER v.fecha >= @desde
+        FOR l IN v.productos
+            COLLECT producto_id = l.id AGGREGATE unidades = SUM(l.cantidad)
+            RETURN [producto_id, unidades]
+    """
+    vendidas = dict(db.aql.execute(aql, bind_vars={"desde": desde}))
+    final = _stock_por_producto(db)
+    negativos = sorted(p for p, c in final.items() if c < 0)
+    perdidos, de_mas = [], []
+    for producto_id, cantidad in final.items():
+        esperado = inicial.get(producto_id, 0) - vendidas.get(producto_id, 0)
+        if cantidad > esperado:
+            perdidos.append({"producto_id": producto_id, "esperado": esperado, "final": cantidad})
+        elif cantidad < esperado:
+            de_mas.append({"producto_id": producto_id, "esperado": esperado, "final": cantidad})
+    return {
+        "productos_vendidos": len(vendidas),
+        "unidades_vendidas": sum(vendidas.values()),
+        "negativos": len(negativos),
+        "descuentos_perdidos": len(perdidos),
+        "descuentos_de_mas": len(de_mas),
+        "ejemplos": (perdidos + de_mas)[:10] + [{"producto_id": p, "final": final[p]} for p in negativos[:10]],
+    }
+
+
+def verificar_catalogo(db):
+    """Productos cuyo stock en la copia en memoria del catálogo difiere del de la base."""
+    from services.catalogo_cache import catalogo
+    en_base = _stock_por_producto(db)
+    return sum(1 for item in catalogo.listar() if item.get("stock") != en_base.get(item["_key"], 0))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del punto de venta.")
+    parser.add_argument("--hilos", type=int, default=8, help="Vendedores simultáneos.")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de carga.")
+    parser.add_argument("--escala", default="chico",
+                        help="Datos sintéticos (modo local) o escala con la que se pobló el servidor (--url).")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--url", default=None, help="Servidor ya levantado; por defecto la app en proceso.")
+    parser.add_argument("--sin-pdf", action="store_true", help="No descargar el PDF de cada factura.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados.")
+    args = parser.parse_args(argumentos)
+
+    parametros = parametros_escala(args.escala)
+    db = None
+    if args.url:
+        crear_cliente = lambda: ClienteRemoto(args.url)
+    else:
+        from config import obtener_db
+        from services.datos_sinteticos import poblar
+        from app import app
+        print(f"Generando datos (escala {args.escala})...")
+        poblar(args.escala, args.semilla)
+        db = obtener_db()
+        crear_cliente = lambda: ClienteLocal(app)
+    stock_inicial = _stock_por_producto(db) if db is not None else None
+    desde = datetime.utcnow().isoformat()
+
+    resultados = Resultados()
+    print(f"Carga: {args.hilos} vendedor(es) durante {args.duracion:.0f}s...")
+    inicio = time.perf_counter()
+    fin = inicio + args.duracion
+    hilos = [
+        threading.Thread(target=vendedor, args=(n, crear_cliente, fin, parametros, resultados,
+                                                args.semilla, not args.sin_pdf), daemon=True)
+        for n in range(args.hilos)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    resumen = resultados.resumen(time.perf_counter() - inicio)
+
+    if db is not None:
+        resumen["stock"] = verificar_stock(db, stock_inicial, desde)
+        resumen["stock"]["catalogo_desfasado"] = verificar_catalogo(db)
+
+    print(f"\n{resumen['requests']} requests en {resumen['segundos']}s: {resumen['rps']} req/s, "
+          f"{resumen['ventas_por_segundo']} ventas/s  {resumen['eventos']}")
+    for operacion, datos in resumen["operaciones"].items():
+        print(f"   {operacion:12s} n={datos['requests']:6d}  p50 {datos['ms_p50']:8.1f}  p95 {datos['ms_p95']:8.1f}  "
+              f"p99 {datos['ms_p99']:8.1f} ms  errores {datos['errores']}")
+    consistente = True
+    if "stock" in resumen:
+        s = resumen["stock"]
+        consistente = not (s["negativos"] or s["descuentos_perdidos"] or s["descuentos_de_mas"]
+                           or s["catalogo_desfasado"])
+        marca = "✅" if consistente else "❌"
+        print(f"{marca} Stock: {s['unidades_vendidas']} unidades vendidas, {s['negativos']} negativos, "
+              f"{s['descuentos_perdidos']} descuentos perdidos, {s['descuentos_de_mas']} de más, "
+              f"{s['catalogo_desfasado']} desfasados en el catálogo")
+
+    informe = {
+        "fecha": datetime.utcnow().isoformat(),
+        "commit": commit_actual(),
+        "modo": args.url or "local",
+        "escala": args.escala,
+        "hilos": args.hilos,
+        "duracion": args.duracion,
+        **resumen,
+    }
+    print(f"✅ Resultados en {guardar_resultados(informe, 'carga', args.salida)}")
+    return 0 if consistente else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Utilidades compartidas por los benchmarks: commit actual, percentiles y archivo de resultados."""
+import json
+import os
+import subprocess
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, "data", "benchmarks")
+
+
+def commit_actual():
+    """Hash corto del commit actual (None fuera de un repositorio git)."""
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True, timeout=10)
+        return salida.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def guardar_resultados(informe, prefijo, salida=None):
+    """Escribe el informe en JSON (por defecto en data/benchmarks/) y devuelve la ruta."""
+    salida = salida or os.path.join(
+        DIRECTORIO_RESULTADOS,
+        f"{prefijo}_{informe.get('commit') or 'sin-commit'}_{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    return salida
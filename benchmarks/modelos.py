@@ -0,0 +1,219 @@
+"""
+Micro-benchmarks de la capa de modelos sobre la base en memoria.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.modelos --escala 10k
+    python -m benchmarks.modelos --escala 100k --repeticiones 3 --casos ventas.
+    python -m benchmarks.modelos --escala 10k --comparar data/benchmarks/<anterior>.json
+
+Genera los datos con services/datos_sinteticos (siempre los mismos para una
+escala y semilla), mide cada caso y guarda un JSON con el commit, la escala
+y los tiempos por caso en data/benchmarks/ para comparar corridas entre commits.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Siempre contra la base en memoria: poblar un servidor real lo ensuciaría.
+# Sin perfil de AQL para medir los modelos y no el log de consultas lentas.
+os.environ["ARANGO_BACKEND"] = "memoria"
+os.environ["ARANGO_MEMORIA_DATOS"] = "0"
+os.environ.setdefault("AQL_PERFIL", "0")
+
+from config import OBSERVADORES_DB
+from app import app
+from models import cliente_model, contrato_model, empleado_model, producto_model, ventas_model
+from routes.ventas_routes import generar_pdf_factura_mejorada
+from services.busqueda_global import busqueda
+from services.datos_sinteticos import FECHA_BASE, SEMILLA, USUARIOS_DEMO, parametros_escala, poblar
+from benchmarks.comun import commit_actual, guardar_resultados, percentil
+
+
+class ContadorLlamadas:
+    """Cuenta las llamadas a la base (mismo gancho que usa /metrics)."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, metodo, url, segundos, ok):
+        self.total += 1
+
+
+def _tamanio(resultado):
+    """Filas devueltas (listas/dicts) o bytes generados (PDF/Excel)."""
+    if hasattr(resultado, "data"):
+        return len(resultado.data)
+    if isinstance(resultado, tuple):
+        return sum(_tamanio(r) for r in resultado)
+    try:
+        return len(resultado)
+    except TypeError:
+        return 1
+
+
+def _cliente_admin():
+    """Cliente de prueba de Flask con la sesión del administrador de los datos sintéticos."""
+    nombre, email, password, _ = USUARIOS_DEMO[0]
+    cliente = app.test_client()
+    respuesta = cliente.post("/", data={"email": email, "password": password})
+    if respuesta.status_code != 302:
+        raise RuntimeError(f"No se pudo iniciar sesión como {nombre}")
+    return cliente
+
+
+def _descarga(cliente, url):
+    def ejecutar(i):
+        respuesta = cliente.get(url(i) if callable(url) else url)
+        if respuesta.status_code != 200 or respuesta.mimetype == "text/html":
+            raise RuntimeError(f"{respuesta.status_code} en {respuesta.request.path}")
+        return respuesta
+    return ejecutar
+
+
+def casos(dias_periodo):
+    """Lista de (nombre, funcion(i)); i es el número de repetición."""
+    ventas = [f["venta_id"] for f in ventas_model.listar_facturas(limite=200)[0]]
+    facturas = [ventas_model.obtener_factura(v) for v in ventas[:20]]
+    contratos = contrato_model.listar_contratos()[:20]
+    empleados = {c["empleado_id"]: empleado_model.obtener_empleado_por_id(c["empleado_id"]) for c in contratos}
+    hasta = FECHA_BASE
+    desde = hasta - timedelta(days=dias_periodo)
+    admin = _cliente_admin()
+    # Los datos se cargan después de crear la app: construir el índice global con ellos
+    busqueda.construir()
+    print(f"   índice de búsqueda global: {len(busqueda.indice)} documentos en "
+          f"{busqueda.indice.ms_construccion:.0f} ms (~{busqueda.indice.bytes_estimados / 1048576:.1f} MB)")
+
+    return [
+        ("productos.listar_productos", lambda i: producto_model.listar_productos()),
+        ("clientes.listar_clientes", lambda i: cliente_model.listar_clientes()),
+        ("clientes.listar_clientes_q", lambda i: cliente_model.listar_clientes("ana")),
+        ("clientes.reporte_por_pais", lambda i: cliente_model.reporte_por_pais()),
+        ("contratos.listar_contratos", lambda i: contrato_model.listar_contratos()),
+        ("contratos.listar_contratos_busqueda", lambda i: contrato_model.listar_contratos("gomez")),
+        ("contratos.listar_contratos_pagina", lambda i: contrato_model.listar_contratos_pagina()),
+        ("busqueda_global.buscar", lambda i: busqueda.buscar("gomez", 20)),
+        ("busqueda_global.buscar_corta", lambda i: busqueda.buscar("an", 20)),
+        ("ventas.obtener_factura", lambda i: ventas_model.obtener_factura(ventas[i % len(ventas)])),
+        ("ventas.obtener_ventas_por_periodo",
+         lambda i: ventas_model.obtener_ventas_por_periodo(desde, hasta)),
+        ("ventas.obtener_ventas_detalladas_por_periodo",
+         lambda i: ventas_model.obtener_ventas_detalladas_por_periodo(desde, hasta)),
+        ("pdf.factura", lambda i: generar_pdf_factura_mejorada(facturas[i % len(facturas)])),
+        ("pdf.contrato", lambda i: contrato_model.generar_pdf_contrato(
+            contratos[i % len(contratos)], empleados[contratos[i % len(contratos)]["empleado_id"]])),
+        ("pdf.empleados", _descarga(admin, "/empleados/exportar/pdf")),
+        ("excel.empleados", _descarga(admin, "/empleados/exportar/excel")),
+        ("excel.contrato", _descarga(admin, lambda i: f"/contratos/descargar-excel/{contratos[i % len(contratos)]['_key']}")),
+    ]
+
+
+def medir(funcion, repeticiones, contador):
+    """
+    Ejecuta funcion una vez en frío y luego 'repeticiones' veces.
+    Devuelve tiempos en ms, tamaño del resultado y llamadas a la base por ejecución.
+    """
+    inicio = time.perf_counter()
+    funcion(0)
+    primera = (time.perf_counter() - inicio) * 1000
+
+    tiempos = []
+    contador.total = 0
+    tamanio = 0
+    for i in range(1, repeticiones + 1):
+        inicio = time.perf_counter()
+        resultado = funcion(i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        tamanio = _tamanio(resultado)
+    tiempos.sort()
+    return {
+        "repeticiones": repeticiones,
+        "ms_primera": round(primera, 3),
+        "ms_min": round(tiempos[0], 3),
+        "ms_mediana": round(statistics.median(tiempos), 3),
+        "ms_p95": round(percentil(tiempos, 95), 3),
+        "ms_max": round(tiempos[-1], 3),
+        "ms_promedio": round(statistics.fmean(tiempos), 3),
+        "tamanio_resultado": tamanio,
+        "llamadas_db": round(contador.total / repeticiones, 2),
+    }
+
+
+def comparar(anterior, actual):
+    """Imprime la mediana de cada caso contra la de una corrida anterior."""
+    print(f"\nComparación con {anterior.get('commit')} ({anterior.get('fecha')}, escala {anterior.get('escala')}):")
+    if (anterior.get("escala"), anterior.get("semilla")) != (actual["escala"], actual["semilla"]):
+        print("❌ Las corridas usan otra escala o semilla: los tiempos no son comparables")
+    for nombre, datos in actual["casos"].items():
+        previo = anterior.get("casos", {}).get(nombre)
+        if not previo or "ms_mediana" not in previo or "ms_mediana" not in datos:
+            print(f"   {nombre:48s} sin datos previos")
+            continue
+        razon = datos["ms_mediana"] / previo["ms_mediana"] if previo["ms_mediana"] else float("inf")
+        marca = "❌" if razon > 1.1 else "✅"
+        print(f"{marca} {nombre:48s} {previo['ms_mediana']:10.2f} → {datos['ms_mediana']:10.2f} ms  (x{razon:.2f})")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de la capa de modelos (base en memoria).")
+    parser.add_argument("--escala", default="10k",
+                        help="chico, mediano, grande o cantidad de clientes/ventas (10k, 100k, 1M).")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--dias-periodo", type=int, default=30, help="Días del periodo de los reportes de ventas.")
+    parser.add_argument("--casos", default="", help="Sólo los casos cuyo nombre contiene este texto.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados.")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior.")
+    args = parser.parse_args(argumentos)
+
+    parametros = parametros_escala(args.escala)
+    print(f"Generando datos (escala {args.escala}: {parametros})...")
+    inicio = time.perf_counter()
+    insertados = poblar(args.escala, args.semilla)
+    carga = time.perf_counter() - inicio
+    print(f"✅ Datos cargados en {carga:.1f}s: {insertados}")
+
+    contador = ContadorLlamadas()
+    OBSERVADORES_DB.append(contador)
+    resultados = {}
+    for nombre, funcion in casos(args.dias_periodo):
+        if args.casos and args.casos not in nombre:
+            continue
+        try:
+            resultados[nombre] = medir(funcion, args.repeticiones, contador)
+            r = resultados[nombre]
+            print(f"   {nombre:48s} mediana {r['ms_mediana']:10.2f} ms  p95 {r['ms_p95']:10.2f} ms  "
+                  f"({r['tamanio_resultado']} filas/bytes, {r['llamadas_db']} llamadas)")
+        except Exception as e:
+            resultados[nombre] = {"error": str(e)}
+            print(f"❌ {nombre}: {e}")
+
+    commit = commit_actual()
+    informe = {
+        "fecha": datetime.utcnow().isoformat(),
+        "commit": commit,
+        "escala": args.escala,
+        "parametros": parametros,
+        "semilla": args.semilla,
+        "documentos": insertados,
+        "carga_s": round(carga, 3),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "casos": resultados,
+    }
+    salida = guardar_resultados(informe, f"modelos_{args.escala}", args.salida)
+    print(f"✅ Resultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(json.load(archivo), informe)
+    return 0 if all("error" not in r for r in resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import base64
+import click
+from config import obtener_db
+from services.blob_store import guardar_pdf
+from models.contrato_model import campos_busqueda
+from models.ventas_model import reconstruir_ventas_diarias
+from models.schema import asegurar_esquema, informe_escaneos
+from services.datos_sinteticos import ESCALAS, SEMILLA, poblar
+
+
+# Colecciones con PDFs embebidos en base64 y el campo que los contiene
+CAMPOS_PDF = {
+    "historial_facturas": "pdf_data",
+    "contratos": "pdf_base64",
+}
+
+
+def migrar_pdfs_coleccion(nombre_coleccion, campo, lote=100):
+    """
+    Mueve los PDFs en base64 de una colección al almacén de PDFs, por lotes.
+    Cada documento migrado queda con pdf_ref / pdf_sha256 y sin el campo base64.
+    Devuelve la cantidad de documentos migrados.
+    """
+    coleccion = obtener_db().collection(nombre_coleccion)
+    aql = """
+    FOR doc IN @@coleccion
+        FILTER doc[@campo] != null
+        RETURN {_key: doc._key, pdf: doc[@campo]}
+    """
+    cursor = obtener_db().aql.execute(
+        aql,
+        bind_vars={"@coleccion": nombre_coleccion, "campo": campo},
+        batch_size=lote,
+        stream=True
+    )
+
+    migrados = 0
+    pendientes = []
+    for doc in cursor:
+        cambios = guardar_pdf(base64.b64decode(doc["pdf"]))
+        pendientes.append({"_key": doc["_key"], **cambios, campo: None})
+        if len(pendientes) >= lote:
+            coleccion.update_many(pendientes, keep_none=False)
+            migrados += len(pendientes)
+            pendientes = []
+            print(f"   ... {migrados} documentos migrados en {nombre_coleccion}")
+    if pendientes:
+        coleccion.update_many(pendientes, keep_none=False)
+        migrados += len(pendientes)
+    return migrados
+
+
+# Colecciones cuyos documentos usan como _key la clave de su padre
+CLAVES_POR_PADRE = {
+    "historial_facturas": "venta_id",
+    "stock": "producto_id",
+}
+
+
+def migrar_claves_coleccion(nombre_coleccion, campo, lote=100):
+    """
+    Pasa los documentos anteriores a la convención _key = doc[campo] a su
+    nueva clave, por lotes. Cada lote corre en una transacción exclusiva sobre
+    la colección (copia con la clave nueva + borrado de la vieja), así una
+    venta simultánea no puede descontar stock de un documento ya copiado.
+    Los documentos cuyo padre ya tiene un documento con esa clave (duplicados)
+    se dejan como están y se informan.
+    Devuelve (migrados, duplicados).
+    """
+    aql = """
+    FOR doc IN @@coleccion
+        FILTER doc._key > @desde
+        SORT doc._key
+        FILTER doc[@campo] != null AND doc._key != TO_STRING(doc[@campo])
+        LIMIT @lote
+        RETURN MERGE(doc, {ocupada: DOCUMENT(@coleccion, TO_STRING(doc[@campo])) != null})
+    """
+    migrados = 0
+    duplicados = 0
+    desde = ""
+    while True:
+        transaccion = obtener_db().begin_transaction(exclusive=[nombre_coleccion])
+        try:
+            docs = list(transaccion.aql.execute(aql, bind_vars={
+                "@coleccion": nombre_coleccion, "coleccion": nombre_coleccion,
+                "campo": campo, "desde": desde, "lote": lote
+            }))
+            nuevos, viejos, claves = [], [], set()
+            for doc in docs:
+                clave = str(doc[campo])
+                if doc.pop("ocupada") or clave in claves:
+                    duplicados += 1
+                    print(f"❌ {nombre_coleccion}/{doc['_key']}: ya existe un documento con clave {clave}")
+                    continue
+                claves.add(clave)
+                nuevos.append({**{k: v for k, v in doc.items() if k not in ("_id", "_rev")}, "_key": clave})
+                viejos.append({"_key": doc["_key"], "_rev": doc["_rev"]})
+            coleccion = transaccion.collection(nombre_coleccion)
+            if nuevos:
+                # insert_many/delete_many devuelven los errores por documento en vez de lanzarlos
+                resultados = coleccion.insert_many(nuevos) + coleccion.delete_many(viejos)
+                errores = [r for r in resultados if isinstance(r, Exception)]
+                if errores:
+                    raise errores[0]
+            transaccion.commit_transaction()
+        except Exception:
+            transaccion.abort_transaction()
+            raise
+        migrados += len(nuevos)
+        if len(docs) < lote:
+            return migrados, duplicados
+        desde = docs[-1]["_key"]
+        print(f"   ... {migrados} documentos migrados en {nombre_coleccion}")
+
+
+def indexar_busqueda_contratos(lote=100):
+    """
+    Guarda los campos de búsqueda (contrato_model.campos_busqueda) en los
+    contratos creados antes de que existieran, por lotes.
+    Devuelve la cantidad de contratos actualizados.
+    """
+    coleccion = obtener_db().collection("contratos")
+    aql = """
+    FOR contrato IN contratos
+        FILTER contrato.busqueda_claves == null
+        RETURN {
+            _key: contrato._key, tipo_contrato: contrato.tipo_contrato, cargo: contrato.cargo,
+            empleado: DOCUMENT("empleados", contrato.empleado_id)
+        }
+    """
+    cursor = obtener_db().aql.execute(aql, batch_size=lote, stream=True)
+
+    actualizados = 0
+    pendientes = []
+    for contrato in cursor:
+        pendientes.append({"_key": contrato["_key"], **campos_busqueda(contrato, contrato["empleado"])})
+        if len(pendientes) >= lote:
+            coleccion.update_many(pendientes)
+            actualizados += len(pendientes)
+            pendientes = []
+            print(f"   ... {actualizados} contratos indexados")
+    if pendientes:
+        coleccion.update_many(pendientes)
+        actualizados += len(pendientes)
+    return actualizados
+
+
+def registrar_comandos(app):
+    """Registra los comandos de mantenimiento en 'flask --app app <comando>'."""
+
+    @app.cli.command("migrar-pdfs")
+    @click.option("--lote", default=100, show_default=True, help="Documentos por lote.")
+    @click.option("--coleccion", type=click.Choice(list(CAMPOS_PDF)), default=None,
+                  help="Migrar sólo esta colección (por defecto todas).")
+    def migrar_pdfs(lote, coleccion):
+        """Mueve los PDFs en base64 de facturas y contratos al almacén de PDFs."""
+        for nombre, campo in CAMPOS_PDF.items():
+            if coleccion and nombre != coleccion:
+                continue
+            total = migrar_pdfs_coleccion(nombre, campo, lote)
+            print(f"✅ {nombre}: {total} PDF(s) migrados")
+
+    @app.cli.command("reconstruir-ventas-diarias")
+    def reconstruir_ventas_diarias_cmd():
+        """Recalcula el resumen 'ventas_diarias' desde todas las ventas."""
+        dias = reconstruir_ventas_diarias()
+        print(f"✅ ventas_diarias: {dias} día(s) recalculados")
+
+    @app.cli.command("verificar-esquema")
+    def verificar_esquema():
+        """Crea colecciones/índices faltantes y muestra qué consultas recorren colecciones completas."""
+        creadas = asegurar_esquema(forzar=True)
+        print(f"✅ Esquema aplicado ({len(creadas)} colección(es) creadas)")
+        for fila in informe_escaneos():
+            if fila["escaneos"]:
+                print(f"❌ {fila['consulta']}: recorre {', '.join(fila['escaneos'])} completa")
+            else:
+                print(f"✅ {fila['consulta']}: {', '.join(fila['indices']) or 'sin colección'}")
+
+    @app.cli.command("sembrar-datos")
+    @click.option("--escala", default="chico", show_default=True,
+                  help=f"Tamaño: {', '.join(ESCALAS)} o cantidad de clientes/ventas (10k, 1M).")
+    @click.option("--semilla", default=SEMILLA, show_default=True, help="Semilla del generador.")
+    def sembrar_datos(escala, semilla):
+        """Carga datos sintéticos (usuarios, clientes, productos, ventas...) en la base."""
+        insertados = poblar(escala, semilla)
+        for nombre, total in insertados.items():
+            print(f"✅ {nombre}: {total} documento(s)")
+
+    @app.cli.command("migrar-claves")
+    @click.option("--lote", default=100, show_default=True, help="Documentos por transacción.")
+    def migrar_claves(lote):
+        """Cambia la _key de facturas y stock antiguos a la de su venta / producto."""
+        for nombre, campo in CLAVES_POR_PADRE.items():
+            migrados, duplicados = migrar_claves_coleccion(nombre, campo, lote)
+            print(f"✅ {nombre}: {migrados} documento(s) con clave nueva, {duplicados} duplicado(s)")
+
+    @app.cli.command("indexar-contratos")
+    @click.option("--lote", default=100, show_default=True, help="Contratos por lote.")
+    def indexar_contratos(lote):
+        """Agrega los campos de búsqueda a los contratos anteriores a la búsqueda por índice."""
+        total = indexar_busqueda_contratos(lote)
+        print(f"✅ contratos: {total} contrato(s) indexados para la búsqueda")
@@ -1,5 +1,8 @@
 import os
+import threading
+import time
 from arango import ArangoClient
+from arango.http import DefaultHTTPClient
 
 # Configuración de ArangoDB usando variables de entorno
 ARANGO_HOST = os.getenv('ARANGO_HOST', 'https://3d098d1d6628.arangodb.cloud:8529')
@@ -7,18 +10,237 @@ ARANGO_DB_NAME = os.getenv('ARANGO_DB_NAME', 'minimarket_db')
 ARANGO_USERNAME = os.getenv('ARANGO_USERNAME', 'root')
 ARANGO_PASSWORD = os.getenv('ARANGO_PASSWORD', 'Q2QlGWMP02FLtUXbSH9')
 
-# Inicializar cliente de ArangoDB
-client = ArangoClient(hosts=ARANGO_HOST)
+# Pool de conexiones HTTP hacia ArangoDB
+ARANGO_POOL_MAXSIZE = int(os.getenv('ARANGO_POOL_MAXSIZE', '10'))        # conexiones por host
+ARANGO_POOL_TIMEOUT = float(os.getenv('ARANGO_POOL_TIMEOUT', '30'))      # espera máx. por una conexión libre
+ARANGO_TIMEOUT = float(os.getenv('ARANGO_TIMEOUT', '60'))                # timeout de cada request
+ARANGO_REINTENTOS = int(os.getenv('ARANGO_REINTENTOS', '3'))             # sólo GET/HEAD y 429/5xx
+ARANGO_BACKOFF = float(os.getenv('ARANGO_BACKOFF', '0.5'))               # 0.5s, 1s, 2s...
+ARANGO_KEEPALIVE = os.getenv('ARANGO_KEEPALIVE', '1') != '0'
+ARANGO_VERIFICAR_DB = os.getenv('ARANGO_VERIFICAR_DB', '1') != '0'       # crear la base si no existe
+AQL_PERFIL = os.getenv('AQL_PERFIL', '1') != '0'                         # estadísticas y log de AQL lentas
 
-# Conectar a la base de datos (o crearla si no existe)
-sys_db = client.db('_system', username=ARANGO_USERNAME, password=ARANGO_PASSWORD)
+# 'http' = servidor ArangoDB; 'memoria' = base en memoria del proceso (sin red,
+# para desarrollo, benchmarks y pruebas de carga; ver services/arango_memoria)
+ARANGO_BACKEND = os.getenv('ARANGO_BACKEND', 'http').lower()
 
-# Verificar si la base de datos existe, si no, crearla
-if not sys_db.has_database(ARANGO_DB_NAME):
-    sys_db.create_database(ARANGO_DB_NAME)
 
-# Conectar a la base de datos del proyecto
-db = client.db(ARANGO_DB_NAME, username=ARANGO_USERNAME, password=ARANGO_PASSWORD)
+# Funciones llamadas después de cada request a la base:
+# observador(metodo, url, segundos, ok). Las usa services/metricas.
+OBSERVADORES_DB = []
+
+
+def notificar_llamada_db(metodo, url, segundos, ok):
+    for observador in OBSERVADORES_DB:
+        try:
+            observador(metodo, url, segundos, ok)
+        except Exception as e:
+            print("❌ Error en observador de la base:", e)
+
+
+def _pool_medido(clase_pool, cliente):
+    """
+    Subclase de un pool de urllib3 cuyas conexiones avisan a 'cliente' cada
+    vez que abren un socket (conexión nueva o reapertura de una caída).
+    """
+    class ConexionMedida(clase_pool.ConnectionCls):
+        def connect(self):
+            super().connect()
+            cliente._conexion_abierta(self)
+
+    return type(clase_pool.__name__ + "Medido", (clase_pool,), {"ConnectionCls": ConexionMedida})
+
+
+class ClienteHTTPMedido(DefaultHTTPClient):
+    """
+    Cliente HTTP de python-arango con pool acotado y métricas.
+
+    - Un semáforo del tamaño del pool reparte las conexiones; el tiempo que
+      un request espera por él es la espera por conexión libre.
+    - Cuenta requests en vuelo, tiempos, errores de conexión y reconexiones:
+      sockets abiertos después del calentamiento (reapertura de una conexión
+      caída o conexión nueva cuando el pool ya había abierto las suyas).
+    """
+
+    def __init__(self):
+        super().__init__(
+            request_timeout=ARANGO_TIMEOUT,
+            retry_attempts=ARANGO_REINTENTOS,
+            backoff_factor=ARANGO_BACKOFF,
+            pool_connections=1,
+            pool_maxsize=ARANGO_POOL_MAXSIZE,
+            pool_timeout=ARANGO_POOL_TIMEOUT
+        )
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(ARANGO_POOL_MAXSIZE)
+        self._sesiones = []
+        self.en_vuelo = 0
+        self.en_vuelo_max = 0
+        self.requests = 0
+        self.errores_conexion = 0
+        self.reconexiones = 0
+        self._abiertas_por_destino = {}
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.duracion_total = 0.0
+
+    def create_session(self, host):
+        sesion = super().create_session(host)
+        for adaptador in self._adaptadores(sesion):
+            manager = adaptador.poolmanager
+            manager.pool_classes_by_scheme = {
+                esquema: _pool_medido(clase, self) for esquema, clase in manager.pool_classes_by_scheme.items()
+            }
+        with self._lock:
+            self._sesiones.append(sesion)
+        return sesion
+
+    def _conexion_abierta(self, conexion):
+        """La llaman las conexiones medidas al abrir un socket."""
+        destino = (conexion.host, conexion.port)
+        with self._lock:
+            if getattr(conexion, "_ya_abierta", False):
+                self.reconexiones += 1
+                return
+            conexion._ya_abierta = True
+            abiertas = self._abiertas_por_destino.get(destino, 0) + 1
+            self._abiertas_por_destino[destino] = abiertas
+            if abiertas > ARANGO_POOL_MAXSIZE:
+                self.reconexiones += 1
+
+    def send_request(self, session, method, url, headers=None, params=None, data=None, auth=None):
+        if not ARANGO_KEEPALIVE:
+            headers = {**(headers or {}), "Connection": "close"}
+        inicio = time.perf_counter()
+        if not self._cupos.acquire(timeout=ARANGO_POOL_TIMEOUT):
+            raise TimeoutError("Sin conexiones libres hacia ArangoDB")
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            self.en_vuelo += 1
+            self.en_vuelo_max = max(self.en_vuelo_max, self.en_vuelo)
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+        ok = False
+        try:
+            respuesta = super().send_request(session, method, url, headers, params, data, auth)
+            ok = True
+            return respuesta
+        except OSError:
+            # requests.ConnectionError / urllib3 derivan de OSError
+            with self._lock:
+                self.errores_conexion += 1
+            raise
+        finally:
+            self._cupos.release()
+            duracion = time.perf_counter() - inicio - espera
+            with self._lock:
+                self.en_vuelo -= 1
+                self.requests += 1
+                self.duracion_total += duracion
+            notificar_llamada_db(method, url, duracion, ok)
+
+    @staticmethod
+    def _adaptadores(sesion):
+        """Adaptadores de la sesión sin repetir (python-arango monta el mismo para http y https)."""
+        return {id(a): a for a in sesion.adapters.values()}.values()
+
+    def _conexiones_creadas(self):
+        total = 0
+        for sesion in self._sesiones:
+            for adaptador in self._adaptadores(sesion):
+                for clave in adaptador.poolmanager.pools.keys():
+                    total += getattr(adaptador.poolmanager.pools[clave], "num_connections", 0)
+        return total
+
+    def metricas(self):
+        with self._lock:
+            creadas = self._conexiones_creadas()
+            return {
+                "pool_maxsize": ARANGO_POOL_MAXSIZE,
+                "en_vuelo": self.en_vuelo,
+                "en_vuelo_max": self.en_vuelo_max,
+                "requests": self.requests,
+                "espera_ms_promedio": round(self.espera_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "espera_ms_max": round(self.espera_max * 1000, 3),
+                "duracion_ms_promedio": round(self.duracion_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "conexiones_creadas": creadas,
+                "reconexiones": self.reconexiones,
+                "errores_conexion": self.errores_conexion
+            }
+
+
+class GestorConexion:
+    """
+    Conexión perezosa y compartida a la base del proyecto.
+    Se abre en el primer obtener_db() (no al importar) y se vuelve a abrir
+    si el proceso cambió (workers creados por fork), así cada worker tiene
+    su propio pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db = None
+        self.http = None
+        self.memoria = None
+        self.aperturas = 0
+
+    def _abrir(self):
+        if ARANGO_BACKEND == 'memoria':
+            from services.arango_memoria import base_memoria
+            self.aperturas += 1
+            db = base_memoria(ARANGO_DB_NAME)
+            self.memoria = db
+        else:
+            db = self._abrir_http()
+        if AQL_PERFIL:
+            from services.perfil_aql import BaseDatosMedida
+            db = BaseDatosMedida(db)
+        return db
+
+    def _abrir_http(self):
+        http = ClienteHTTPMedido()
+        self.http = http
+        cliente = ArangoClient(hosts=ARANGO_HOST, http_client=http)
+        if ARANGO_VERIFICAR_DB:
+            # Verificar si la base de datos existe, si no, crearla
+            sys_db = cliente.db('_system', username=ARANGO_USERNAME, password=ARANGO_PASSWORD)
+            if not sys_db.has_database(ARANGO_DB_NAME):
+                sys_db.create_database(ARANGO_DB_NAME)
+        self.aperturas += 1
+        return cliente.db(ARANGO_DB_NAME, username=ARANGO_USERNAME, password=ARANGO_PASSWORD)
+
+    def obtener_db(self):
+        db = self._db
+        if db is not None and self._pid == os.getpid():
+            return db
+        with self._lock:
+            if self._db is None or self._pid != os.getpid():
+                self._db = self._abrir()
+                self._pid = os.getpid()
+            return self._db
+
+    def reiniciar(self):
+        """Descarta la conexión actual; la próxima llamada abre una nueva."""
+        with self._lock:
+            self._db = None
+            self._pid = None
+
+    def metricas(self):
+        if self.memoria is not None:
+            datos = self.memoria.metricas()
+        else:
+            datos = self.http.metricas() if self.http is not None else {}
+        return {"aperturas": self.aperturas, **datos}
+
+
+conexion = GestorConexion()
+
+
+def obtener_db():
+    """Base de datos del proyecto (se conecta en el primer uso)."""
+    return conexion.obtener_db()
+
 
 # Configuración de email con SendGrid (sin cambios)
 MAIL_SETTINGS = {
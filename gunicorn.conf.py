@@ -0,0 +1,65 @@
+"""
+Configuración de gunicorn para producción (Procfile: gunicorn -c gunicorn.conf.py app:app).
+
+- preload_app: la app (Flask, reportlab, openpyxl, plantillas) se importa una
+  vez en el proceso maestro y los workers la comparten por copy-on-write.
+- Cada worker abre su propio pool de conexiones a ArangoDB después del fork.
+- Recarga sin cortar requests:
+    kill -HUP <pid maestro>     relee esta configuración y reemplaza los workers
+                                de a uno, esperando graceful_timeout a los viejos.
+  Con preload_app el código nuevo no se recarga con HUP; para desplegar código
+  nuevo sin cortar: kill -USR2 <pid maestro> (arranca un maestro nuevo) y luego
+  kill -TERM al maestro viejo.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Procesos y hilos por proceso (las rutas de PDF usan CPU: conviene más de un proceso)
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclar workers de a poco para acotar el crecimiento de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server):
+    """En el maestro, antes de crear los workers."""
+    # Cargar fuentes y estilos de reportlab una sola vez (compartidos por COW)
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfbase import pdfmetrics
+    getSampleStyleSheet()
+    for fuente in ("Helvetica", "Helvetica-Bold", "Times-Roman"):
+        pdfmetrics.getFont(fuente)
+
+    # Índice del buscador del administrador: los workers lo heredan construido
+    from services.busqueda_global import busqueda, BUSQUEDA_GLOBAL_AL_INICIO
+    if BUSQUEDA_GLOBAL_AL_INICIO:
+        busqueda.construir_al_inicio()
+
+    # La conexión usada al arrancar (verificación del esquema y el índice) no se hereda
+    from config import conexion
+    conexion.reiniciar()
+
+    # Los objetos ya cargados no los recorre el GC: menos páginas copiadas por COW
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """En cada worker recién creado: pools propios."""
+    from config import conexion
+    conexion.reiniciar()
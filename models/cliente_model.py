@@ -1,38 +1,60 @@
 from datetime import datetime
-from config import db
+from config import obtener_db
+from models.schema import coleccion
+from services.busqueda_global import busqueda
+from services.indice_busqueda import IndiceTrigramas, normalizar
+from services.secuencias import siguiente_id
 import re
 
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
+clientes = coleccion("clientes")
 
 
-clientes = get_collection("clientes")
-counters = get_collection("counters")
+def _resumen_cliente(cliente):
+    return {
+        "_key": cliente["_key"],
+        "nombre": cliente.get("nombre") or "",
+        "email": cliente.get("email") or ""
+    }
 
 
-def obtener_siguiente_id(nombre_secuencia):
-    """Obtiene el siguiente ID autoincrementable para una secuencia"""
-    try:
-        # Intentar obtener el contador existente
-        counter_doc = counters.get(nombre_secuencia)
-        nuevo_valor = counter_doc["valor"] + 1
-        counters.update({"_key": nombre_secuencia, "valor": nuevo_valor})
-        return nuevo_valor
-    except:
-        # Si no existe, crearlo
-        counters.insert({"_key": nombre_secuencia, "valor": 1})
-        return 1
+def _entradas_indice_clientes():
+    """Tuplas (id, textos, datos) para cargar el índice de búsqueda de clientes."""
+    aql = """
+    FOR cliente IN clientes
+        RETURN {_key: cliente._key, nombre: cliente.nombre, email: cliente.email}
+    """
+    for cliente in obtener_db().aql.execute(aql):
+        resumen = _resumen_cliente(cliente)
+        yield resumen["_key"], (resumen["nombre"], resumen["email"]), resumen
+
+
+# Índice en memoria por nombre y email (buscador del punto de venta)
+indice_clientes = IndiceTrigramas(cargador=_entradas_indice_clientes)
+
+
+def _busqueda_global(cliente):
+    """(textos, datos) del cliente para el buscador del administrador."""
+    nombre = cliente.get("nombre") or ""
+    email = cliente.get("email") or ""
+    return (nombre, email), {"titulo": nombre, "detalle": email, "filtro": nombre}
+
+
+def _entradas_busqueda_global():
+    aql = """
+    FOR cliente IN clientes
+        RETURN {_key: cliente._key, nombre: cliente.nombre, email: cliente.email}
+    """
+    for cliente in obtener_db().aql.execute(aql, batch_size=1000, stream=True):
+        yield (cliente["_key"], *_busqueda_global(cliente))
+
+
+busqueda.registrar_fuente("cliente", _entradas_busqueda_global)
 
 
 def crear_cliente(nombre, email, telefono, direccion, ciudad, pais):
     email_norm = email.strip().lower() if email else ""
-    nuevo_id = obtener_siguiente_id("clientes")  # id autoincrementable
+    nuevo_id = siguiente_id("clientes")  # id autoincrementable
 
     cliente = {
         "id_cliente": nuevo_id,  # nuevo campo id incremental
@@ -42,25 +64,48 @@ def crear_cliente(nombre, email, telefono, direccion, ciudad, pais):
         "direccion": direccion.strip() if direccion else "",
         "ciudad": ciudad.strip() if ciudad else "",
         "pais": pais.strip() if pais else "",
-        "fecha_registro": datetime.utcnow()
+        "fecha_registro": datetime.utcnow().isoformat()
     }
-    return clientes.insert(cliente)
+    resultado = clientes.insert(cliente)
+    resumen = _resumen_cliente({**cliente, "_key": resultado["_key"]})
+    indice_clientes.agregar(resumen["_key"], (resumen["nombre"], resumen["email"]), resumen)
+    busqueda.guardar("cliente", resultado["_key"], *_busqueda_global(cliente))
+    return resultado
+
+
+# Campos de la vista clientes_busqueda (models/schema.py)
+CAMPOS_BUSQUEDA = ("nombre", "email", "ciudad", "pais")
 
 
-def listar_clientes(filtro_q=None):
-    if filtro_q:
-        q = filtro_q.strip().lower()
-        # Usar AQL para búsqueda con filtros
+def listar_clientes(filtro_q=None, limite=50):
+    """
+    Sin filtro devuelve todos los clientes. Con filtro busca en la vista
+    clientes_busqueda los que contienen el texto (sin distinguir tildes ni
+    mayúsculas) en nombre, email, ciudad o país, los más relevantes
+    primero (BM25) y como máximo 'limite'.
+    La vista sólo guarda trigramas: un campo de menos de 3 letras (un país
+    "UY", por ejemplo) no aparece en ninguna búsqueda.
+    """
+    q = normalizar(filtro_q).strip() if filtro_q else ""
+    if q:
+        if len(q) >= 3:
+            # Contiene el término = tiene todos sus trigramas
+            condicion = " OR ".join(f"terminos ALL == cliente.{campo}" for campo in CAMPOS_BUSQUEDA)
+        else:
+            # 1-2 letras: algún trigrama que las contiene (también al final del campo)
+            condicion = " OR ".join(f"LIKE(cliente.{campo}, @patron)" for campo in CAMPOS_BUSQUEDA)
         aql = """
-        FOR cliente IN clientes
-            FILTER LOWER(cliente.nombre) LIKE @q OR
-                   LOWER(cliente.email) LIKE @q OR
-                   LOWER(cliente.ciudad) LIKE @q OR
-                   LOWER(cliente.pais) LIKE @q
-            SORT cliente.fecha_registro DESC
+        LET terminos = TOKENS(@q, "texto_ngram")
+        FOR cliente IN clientes_busqueda
+            SEARCH ANALYZER(""" + condicion + """, "texto_ngram")
+            SORT BM25(cliente) DESC, cliente.fecha_registro DESC
+            LIMIT @limite
             RETURN cliente
         """
-        cursor = db.aql.execute(aql, bind_vars={"q": f"%{q}%"})
+        bind_vars = {"q": q, "limite": max(1, int(limite))}
+        if len(q) < 3:
+            bind_vars["patron"] = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        cursor = obtener_db().aql.execute(aql, bind_vars=bind_vars)
         return list(cursor)
     else:
         # Sin filtro, obtener todos
@@ -69,10 +114,15 @@ def listar_clientes(filtro_q=None):
             SORT cliente.fecha_registro DESC
             RETURN cliente
         """
-        cursor = db.aql.execute(aql)
+        cursor = obtener_db().aql.execute(aql)
         return list(cursor)
 
 
+def buscar_clientes(consulta, limite=10):
+    """Clientes cuyo nombre o email empieza con (o contiene) la consulta."""
+    return indice_clientes.buscar(consulta, limite)
+
+
 def buscar_cliente_por_id(client_id):
     try:
         return clientes.get(str(client_id))
@@ -108,6 +158,9 @@ def actualizar_cliente(client_id, nombre=None, email=None, telefono=None,
         cliente = clientes.get(str(client_id))
         if cliente:
             clientes.update({**cliente, **cambios})
+            resumen = _resumen_cliente({**cliente, **cambios})
+            indice_clientes.agregar(resumen["_key"], (resumen["nombre"], resumen["email"]), resumen)
+            busqueda.guardar("cliente", cliente["_key"], *_busqueda_global({**cliente, **cambios}))
             return {"matched_count": 1, "modified_count": 1}
         return {"matched_count": 0, "modified_count": 0}
     except Exception as e:
@@ -118,6 +171,8 @@ def actualizar_cliente(client_id, nombre=None, email=None, telefono=None,
 def eliminar_cliente(client_id):
     try:
         clientes.delete(str(client_id))
+        indice_clientes.quitar(client_id)
+        busqueda.quitar("cliente", client_id)
         return {"deleted_count": 1}
     except Exception as e:
         print("❌ eliminar_cliente error:", e)
@@ -131,5 +186,5 @@ def reporte_por_pais():
         SORT total DESC
         RETURN {_id: pais, total: total}
     """
-    cursor = db.aql.execute(aql)
+    cursor = obtener_db().aql.execute(aql)
     return list(cursor)
\ No newline at end of file
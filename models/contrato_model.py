@@ -1,7 +1,6 @@
 from datetime import datetime
-from config import db
-import unicodedata
-import base64
+from config import obtener_db
+from models.schema import coleccion
 import os
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
@@ -10,43 +9,79 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 from reportlab.lib import colors
+from services.blob_store import guardar_pdf
+from services.busqueda_global import busqueda
+from services.indice_busqueda import claves_texto, normalizar
+from services.secuencias import siguiente_id
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
 
-contratos = get_collection("contratos")
-empleados = get_collection("empleados")
-counters = get_collection("counters")
+contratos = coleccion("contratos")
+empleados = coleccion("empleados")
 
-def remover_acentos(texto):
-    """Remueve tildes y acentos de un texto para búsqueda insensible"""
-    if not texto:
-        return ""
-    texto_normalizado = unicodedata.normalize('NFD', str(texto))
-    texto_sin_acentos = ''.join(c for c in texto_normalizado if unicodedata.category(c) != 'Mn')
-    return texto_sin_acentos
 
-def obtener_siguiente_id(nombre_secuencia="contrato"):
-    """Obtiene el siguiente ID secuencial para contratos"""
-    try:
-        aql = """
-        UPSERT { _key: @nombre }
-        INSERT { _key: @nombre, valor: 1 }
-        UPDATE { valor: OLD.valor + 1 }
-        IN counters
-        RETURN NEW.valor
-        """
-        cursor = db.aql.execute(aql, bind_vars={"nombre": nombre_secuencia})
-        resultado = list(cursor)
-        return resultado[0] if resultado else 1
-    except Exception as e:
-        print(f"❌ Error obtener_siguiente_id: {e}")
-        return 1
+def campos_busqueda(contrato, empleado):
+    """
+    Campos de búsqueda del contrato, normalizados (minúsculas y sin tildes):
+    busqueda_texto con nombre, apellido y documento del empleado, tipo de
+    contrato y cargo (uno por línea) y busqueda_claves con sus trigramas y
+    prefijos de palabra, indexado para buscar en la base (idx_contratos_busqueda).
+    Se guardan al crear/editar el contrato y al editar el empleado.
+    """
+    empleado = empleado or {}
+    textos = [normalizar(t) for t in (
+        empleado.get("nombre"), empleado.get("apellido"), empleado.get("nro_documento"),
+        contrato.get("tipo_contrato"), contrato.get("cargo")
+    )]
+    trigramas, prefijos = claves_texto(textos)
+    return {"busqueda_texto": "\n".join(textos), "busqueda_claves": sorted(trigramas | prefijos)}
+
+
+def _busqueda_global(contrato, empleado):
+    """(textos, datos) del contrato para el buscador del administrador."""
+    empleado = empleado or {}
+    nombre = f"{empleado.get('nombre') or ''} {empleado.get('apellido') or ''}".strip()
+    documento = empleado.get("nro_documento") or ""
+    tipo_contrato = contrato.get("tipo_contrato") or ""
+    cargo = contrato.get("cargo") or ""
+    datos = {"titulo": f"Contrato de {nombre or 'empleado no encontrado'}",
+             "detalle": f"{tipo_contrato} · {cargo}", "filtro": documento}
+    return (nombre, documento, tipo_contrato, cargo), datos
+
+def _entradas_busqueda_global():
+    aql = """
+    FOR contrato IN contratos
+        LET empleado = DOCUMENT("empleados", contrato.empleado_id)
+        RETURN {
+            _key: contrato._key,
+            tipo_contrato: contrato.tipo_contrato,
+            cargo: contrato.cargo,
+            empleado: empleado ? {nombre: empleado.nombre, apellido: empleado.apellido,
+                                  nro_documento: empleado.nro_documento} : null
+        }
+    """
+    for contrato in obtener_db().aql.execute(aql, batch_size=1000, stream=True):
+        yield (contrato["_key"], *_busqueda_global(contrato, contrato["empleado"]))
+
+busqueda.registrar_fuente("contrato", _entradas_busqueda_global)
+
+def actualizar_busqueda_empleado(empleado):
+    """
+    Recalcula los campos de búsqueda de los contratos de un empleado (tras
+    editarlo) y los reindexa en el buscador del administrador.
+    """
+    aql = """
+    FOR contrato IN contratos
+        FILTER contrato.empleado_id == @empleado_id
+        RETURN {_key: contrato._key, tipo_contrato: contrato.tipo_contrato, cargo: contrato.cargo}
+    """
+    cursor = obtener_db().aql.execute(aql, bind_vars={"empleado_id": str(empleado["_key"])})
+    lista = list(cursor)
+    cambios = [{"_key": c["_key"], **campos_busqueda(c, empleado)} for c in lista]
+    if cambios:
+        contratos.update_many(cambios)
+    for contrato in lista:
+        busqueda.guardar("contrato", contrato["_key"], *_busqueda_global(contrato, empleado))
+    return len(cambios)
 
 def generar_pdf_contrato(contrato_data, empleado_data):
     """Genera el PDF del contrato según el tipo (Colombia)"""
@@ -270,7 +305,7 @@ def generar_pdf_contrato(contrato_data, empleado_data):
 def crear_contrato(empleado_id, tipo_contrato, fecha_inicio, fecha_fin, 
                    salario, cargo, observaciones=""):
     """Crea un nuevo contrato y genera su PDF"""
-    id_contrato = obtener_siguiente_id("contrato")
+    id_contrato = siguiente_id("contrato")
     
     # Obtener datos del empleado
     empleado_doc = empleados.get(str(empleado_id))
@@ -290,77 +325,129 @@ def crear_contrato(empleado_id, tipo_contrato, fecha_inicio, fecha_fin,
         "fecha_registro": datetime.utcnow().isoformat()
     }
     
-    # Generar PDF del contrato
+    # Generar PDF del contrato (el documento sólo guarda la referencia y el hash)
     try:
         pdf_bytes = generar_pdf_contrato(contrato_data, empleado_doc)
-        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-        contrato_data["pdf_base64"] = pdf_base64
+        contrato_data.update(guardar_pdf(pdf_bytes))
     except Exception as e:
         print(f"❌ Error generando PDF: {e}")
-        contrato_data["pdf_base64"] = None
+        contrato_data["pdf_ref"] = None
+    contrato_data.update(campos_busqueda(contrato_data, empleado_doc))
     
     try:
         res = contratos.insert(contrato_data)
+        busqueda.guardar("contrato", res["_key"], *_busqueda_global(contrato_data, empleado_doc))
         return res["_key"]
     except Exception as e:
         print(f"❌ Error crear_contrato: {e}")
         return None
 
-def listar_contratos(busqueda=None):
-    """Lista todos los contratos con información del empleado"""
-    if busqueda:
-        busqueda_sin_acentos = remover_acentos(busqueda).lower()
-        
-        aql = """
-        FOR contrato IN contratos
-            LET empleado = FIRST(
-                FOR e IN empleados
-                    FILTER e._key == contrato.empleado_id
-                    RETURN e
-            )
-            SORT contrato.fecha_registro DESC
-            RETURN MERGE(contrato, {
+# Columnas del listado de contratos: nunca el PDF ni los campos de búsqueda
+_AQL_FILA_CONTRATO = """
+            LET empleado = DOCUMENT("empleados", contrato.empleado_id)
+            RETURN {
+                _key: contrato._key,
+                id_contrato: contrato.id_contrato,
+                empleado_id: contrato.empleado_id,
                 empleado_nombre: empleado ? CONCAT(empleado.nombre, " ", empleado.apellido) : "Empleado no encontrado",
                 empleado_documento: empleado ? empleado.nro_documento : "N/A",
-                empleado_nombre_completo: empleado ? empleado.nombre : "",
-                empleado_apellido_completo: empleado ? empleado.apellido : ""
-            })
-        """
-        cursor = db.aql.execute(aql)
-        todos_contratos = list(cursor)
-        
-        resultados = []
-        for contrato in todos_contratos:
-            nombre = remover_acentos(contrato.get('empleado_nombre_completo', '')).lower()
-            apellido = remover_acentos(contrato.get('empleado_apellido_completo', '')).lower()
-            documento = remover_acentos(contrato.get('empleado_documento', '')).lower()
-            tipo_contrato = remover_acentos(contrato.get('tipo_contrato', '')).lower()
-            cargo = remover_acentos(contrato.get('cargo', '')).lower()
-            
-            if (busqueda_sin_acentos in nombre or 
-                busqueda_sin_acentos in apellido or 
-                busqueda_sin_acentos in documento or
-                busqueda_sin_acentos in tipo_contrato or
-                busqueda_sin_acentos in cargo):
-                resultados.append(contrato)
-        
-        return resultados
-    else:
-        aql = """
+                tipo_contrato: contrato.tipo_contrato,
+                cargo: contrato.cargo,
+                fecha_inicio: contrato.fecha_inicio,
+                fecha_fin: contrato.fecha_fin,
+                salario: contrato.salario,
+                observaciones: contrato.observaciones,
+                fecha_registro: contrato.fecha_registro
+            }
+"""
+
+def _filtros_busqueda(busqueda, bind_vars):
+    """
+    FILTERs de la búsqueda de contratos (sin distinguir tildes ni mayúsculas)
+    en nombre, apellido o documento del empleado, tipo de contrato o cargo.
+    """
+    termino = normalizar(busqueda).strip() if busqueda else ""
+    if not termino:
+        return []
+    bind_vars["termino"] = termino
+    if len(termino) < 3:
+        # 1-2 letras pueden estar en medio de una palabra ("ez" en "gomez"):
+        # sólo CONTAINS sobre el texto normalizado, sin índice
+        return ["FILTER CONTAINS(contrato.busqueda_texto, @termino)"]
+    # Todo texto que contiene el término tiene su primer trigrama: el índice
+    # da los candidatos y CONTAINS confirma sobre el texto ya normalizado.
+    bind_vars["clave"] = termino[:3]
+    return [
+        "FILTER @clave IN contrato.busqueda_claves[*]",
+        "FILTER CONTAINS(contrato.busqueda_texto, @termino)",
+    ]
+
+
+def listar_contratos(busqueda=None):
+    """
+    Lista todos los contratos (columnas del listado) con el nombre y documento
+    del empleado, del más reciente al más antiguo. Con 'busqueda' devuelve
+    sólo los que la contienen.
+    """
+    bind_vars = {}
+    filtros = _filtros_busqueda(busqueda, bind_vars)
+    aql = """
         FOR contrato IN contratos
-            LET empleado = FIRST(
-                FOR e IN empleados
-                    FILTER e._key == contrato.empleado_id
-                    RETURN e
-            )
+            """ + "\n            ".join(filtros) + """
             SORT contrato.fecha_registro DESC
-            RETURN MERGE(contrato, {
-                empleado_nombre: empleado ? CONCAT(empleado.nombre, " ", empleado.apellido) : "Empleado no encontrado",
-                empleado_documento: empleado ? empleado.nro_documento : "N/A"
-            })
-        """
-        cursor = db.aql.execute(aql)
-        return list(cursor)
+    """ + _AQL_FILA_CONTRATO
+    cursor = obtener_db().aql.execute(aql, bind_vars=bind_vars)
+    return list(cursor)
+
+def listar_contratos_pagina(limite=50, cursor=None, busqueda=None):
+    """
+    Devuelve una página del listado de contratos, del más reciente al más antiguo.
+
+    Paginación por clave (keyset) sobre (fecha_registro, _key) con el índice
+    de fecha_registro: 'cursor' es el valor devuelto por la página anterior.
+    La misma consulta cuenta el total de contratos (o de los que coinciden con
+    'busqueda').
+    Devuelve (contratos, siguiente_cursor, total); siguiente_cursor es None
+    en la última página.
+    """
+    limite = max(1, min(int(limite), 200))
+    bind_vars = {"limite": limite + 1}
+    filtros = _filtros_busqueda(busqueda, bind_vars)
+    filtros_pagina = list(filtros)
+    # El cursor llega de la URL: si no tiene la forma "fecha|_key" se empieza desde la primera página
+    partes = cursor.split("|", 1) if isinstance(cursor, str) else []
+    if len(partes) == 2 and all(partes):
+        cursor_fecha, cursor_key = partes
+        # La primera condición usa el índice de fecha; la segunda desempata por _key
+        filtros_pagina.append("FILTER contrato.fecha_registro <= @cursor_fecha")
+        filtros_pagina.append("FILTER contrato.fecha_registro < @cursor_fecha OR contrato._key < @cursor_key")
+        bind_vars.update({"cursor_fecha": cursor_fecha, "cursor_key": cursor_key})
+
+    aql = """
+    LET total = FIRST(
+        FOR contrato IN contratos
+            """ + "\n            ".join(filtros) + """
+            COLLECT WITH COUNT INTO cantidad
+            RETURN cantidad
+    )
+    LET pagina = (
+        FOR contrato IN contratos
+            """ + "\n            ".join(filtros_pagina) + """
+            SORT contrato.fecha_registro DESC, contrato._key DESC
+            LIMIT @limite
+    """ + _AQL_FILA_CONTRATO + """
+    )
+    RETURN {total: total, contratos: pagina}
+    """
+    resultado = list(obtener_db().aql.execute(aql, bind_vars=bind_vars))[0]
+    contratos_pagina = resultado["contratos"]
+
+    siguiente = None
+    if len(contratos_pagina) > limite:
+        contratos_pagina = contratos_pagina[:limite]
+        ultimo = contratos_pagina[-1]
+        siguiente = f"{ultimo['fecha_registro']}|{ultimo['_key']}"
+    return contratos_pagina, siguiente, resultado["total"]
 
 def obtener_contrato_por_id(contrato_id):
     """Obtiene un contrato por su _key"""
@@ -369,6 +456,31 @@ def obtener_contrato_por_id(contrato_id):
     except Exception:
         return None
 
+def listar_contratos_empleado(empleado_id):
+    """Contratos de un empleado (columnas del listado, sin PDF), del más reciente al más antiguo."""
+    aql = """
+        FOR contrato IN contratos
+            FILTER contrato.empleado_id == @empleado_id
+            SORT contrato.fecha_registro DESC
+    """ + _AQL_FILA_CONTRATO
+    cursor = obtener_db().aql.execute(aql, bind_vars={"empleado_id": str(empleado_id)})
+    return list(cursor)
+
+def contar_contratos_por_empleado(empleado_ids):
+    """Cantidad de contratos de cada empleado dado, en una sola consulta agrupada: {empleado_id: cantidad}."""
+    try:
+        aql = """
+        FOR contrato IN contratos
+            FILTER contrato.empleado_id IN @empleado_ids
+            COLLECT empleado_id = contrato.empleado_id WITH COUNT INTO cantidad
+            RETURN {empleado_id: empleado_id, cantidad: cantidad}
+        """
+        cursor = obtener_db().aql.execute(aql, bind_vars={"empleado_ids": [str(e) for e in empleado_ids]})
+        return {fila["empleado_id"]: fila["cantidad"] for fila in cursor}
+    except Exception as e:
+        print(f"❌ Error contar_contratos_por_empleado: {e}")
+        return {}
+
 def contar_contratos_empleado(empleado_id):
     """Cuenta cuántos contratos tiene un empleado"""
     try:
@@ -378,7 +490,7 @@ def contar_contratos_empleado(empleado_id):
             COLLECT WITH COUNT INTO cantidad
             RETURN cantidad
         """
-        cursor = db.aql.execute(aql, bind_vars={"empleado_id": str(empleado_id)})
+        cursor = obtener_db().aql.execute(aql, bind_vars={"empleado_id": str(empleado_id)})
         resultado = list(cursor)
         return resultado[0] if resultado else 0
     except Exception as e:
@@ -402,7 +514,10 @@ def actualizar_contrato(contrato_id, tipo_contrato=None, fecha_inicio=None,
         if observaciones is not None: cambios["observaciones"] = str(observaciones).strip()
         
         if cambios:
+            empleado = empleados.get(str(contrato.get("empleado_id")))
+            cambios.update(campos_busqueda({**contrato, **cambios}, empleado))
             contratos.update({**contrato, **cambios})
+            busqueda.guardar("contrato", contrato["_key"], *_busqueda_global({**contrato, **cambios}, empleado))
             return {"matched_count": 1, "modified_count": 1}
         return {"matched_count": 1, "modified_count": 0}
     except Exception as e:
@@ -413,6 +528,7 @@ def eliminar_contrato(contrato_id):
     """Elimina un contrato por su _key"""
     try:
         contratos.delete(str(contrato_id))
+        busqueda.quitar("contrato", contrato_id)
         return {"deleted_count": 1}
     except Exception as e:
         print(f"❌ Error eliminar_contrato: {e}")
@@ -1,38 +1,36 @@
 from datetime import datetime
-from config import db
+from config import obtener_db
+from models.schema import coleccion
+from models.contrato_model import actualizar_busqueda_empleado
+from services.busqueda_global import busqueda
+from services.secuencias import siguiente_id
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
 
-empleados = get_collection("empleados")
-counters = get_collection("counters")
+empleados = coleccion("empleados")
 
-def obtener_siguiente_id(nombre_secuencia="empleado"):
-    """Obtiene el siguiente ID secuencial para empleados"""
-    try:
-        aql = """
-        UPSERT { _key: @nombre }
-        INSERT { _key: @nombre, valor: 1 }
-        UPDATE { valor: OLD.valor + 1 }
-        IN counters
-        RETURN NEW.valor
-        """
-        cursor = db.aql.execute(aql, bind_vars={"nombre": nombre_secuencia})
-        resultado = list(cursor)
-        return resultado[0] if resultado else 1
-    except Exception as e:
-        print(f"❌ Error obtener_siguiente_id: {e}")
-        return 1
+def _busqueda_global(empleado):
+    """(textos, datos) del empleado para el buscador del administrador."""
+    nombre = f"{empleado.get('nombre') or ''} {empleado.get('apellido') or ''}".strip()
+    documento = empleado.get("nro_documento") or ""
+    cargo = empleado.get("cargo") or ""
+    textos = (nombre, documento, empleado.get("correo") or "", cargo)
+    return textos, {"titulo": nombre, "detalle": f"{cargo} · Doc. {documento}", "filtro": documento}
+
+def _entradas_busqueda_global():
+    aql = """
+    FOR empleado IN empleados
+        RETURN {_key: empleado._key, nombre: empleado.nombre, apellido: empleado.apellido,
+                nro_documento: empleado.nro_documento, correo: empleado.correo, cargo: empleado.cargo}
+    """
+    for empleado in obtener_db().aql.execute(aql, batch_size=1000, stream=True):
+        yield (empleado["_key"], *_busqueda_global(empleado))
+
+busqueda.registrar_fuente("empleado", _entradas_busqueda_global)
 
 def crear_empleado(nro_documento, nombre, apellido, edad, genero, cargo, 
                    correo, nro_contacto, estado="activo", observaciones=""):
     """Crea un nuevo empleado con ID autoincremental"""
-    id_empleado = obtener_siguiente_id("empleado")
+    id_empleado = siguiente_id("empleado")
     
     doc = {
         "id_empleado": id_empleado,
@@ -51,6 +49,7 @@ def crear_empleado(nro_documento, nombre, apellido, edad, genero, cargo,
     
     try:
         res = empleados.insert(doc)
+        busqueda.guardar("empleado", res["_key"], *_busqueda_global(doc))
         return res["_key"]
     except Exception as e:
         print(f"❌ Error crear_empleado: {e}")
@@ -67,14 +66,14 @@ def listar_empleados(busqueda=None):
             SORT empleado.fecha_registro DESC
             RETURN empleado
         """
-        cursor = db.aql.execute(aql, bind_vars={"busqueda": f"%{busqueda}%"})
+        cursor = obtener_db().aql.execute(aql, bind_vars={"busqueda": f"%{busqueda}%"})
     else:
         aql = """
         FOR empleado IN empleados
             SORT empleado.fecha_registro DESC
             RETURN empleado
         """
-        cursor = db.aql.execute(aql)
+        cursor = obtener_db().aql.execute(aql)
     
     return list(cursor)
 
@@ -94,7 +93,7 @@ def obtener_empleado_por_documento(nro_documento):
             LIMIT 1
             RETURN empleado
         """
-        cursor = db.aql.execute(aql, bind_vars={"nro_documento": str(nro_documento)})
+        cursor = obtener_db().aql.execute(aql, bind_vars={"nro_documento": str(nro_documento)})
         resultado = list(cursor)
         return resultado[0] if resultado else None
     except Exception:
@@ -123,6 +122,10 @@ def actualizar_empleado(empleado_id, nro_documento=None, nombre=None, apellido=N
         
         if cambios:
             empleados.update({**empleado, **cambios})
+            busqueda.guardar("empleado", empleado["_key"], *_busqueda_global({**empleado, **cambios}))
+            # Los contratos guardan nombre, apellido y documento para la búsqueda
+            if cambios.keys() & {"nombre", "apellido", "nro_documento"}:
+                actualizar_busqueda_empleado({**empleado, **cambios})
             return {"matched_count": 1, "modified_count": 1}
         return {"matched_count": 1, "modified_count": 0}
     except Exception as e:
@@ -133,6 +136,7 @@ def eliminar_empleado(empleado_id):
     """Elimina un empleado por su _key"""
     try:
         empleados.delete(str(empleado_id))
+        busqueda.quitar("empleado", empleado_id)
         return {"deleted_count": 1}
     except Exception as e:
         print(f"❌ Error eliminar_empleado: {e}")
@@ -1,36 +1,60 @@
 from datetime import datetime
-from config import db
+from config import obtener_db
+from models.schema import coleccion
+from services.busqueda_global import busqueda
+from services.catalogo_cache import catalogo
+from models.ventas_model import obtener_stock, busqueda_global_producto
 
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
+productos = coleccion("productos")
+stock = coleccion("stock")
 
+# Código de error de ArangoDB para violación de índice único
+_ERROR_DUPLICADO = 1210
 
-productos = get_collection("productos")
-stock = get_collection("stock")
 
+def _normalizar_codigo(codigo_barras):
+    """Código sin espacios; vacío -> None (producto sin código)."""
+    codigo = (codigo_barras or "").strip()
+    return codigo or None
 
-def crear_producto(nombre, precio, categoria="", cantidad_inicial=0):
-    """Crea un producto con registro en stock."""
+
+def _error_codigo_duplicado(codigo_barras):
+    return ValueError(f"El código de barras {codigo_barras} ya está asignado a otro producto")
+
+
+def crear_producto(nombre, precio, categoria="", cantidad_inicial=0, codigo_barras=None):
+    """
+    Crea un producto con registro en stock.
+    Lanza ValueError si el código de barras ya pertenece a otro producto.
+    """
     doc = {
         "nombre": nombre.strip(),
         "precio": float(precio),
         "categoria": categoria.strip(),
         "fecha_registro": datetime.utcnow().isoformat()  # ✅ CAMBIO: guardar como string ISO
     }
-    res = productos.insert(doc)
+    codigo = _normalizar_codigo(codigo_barras)
+    if codigo:
+        doc["codigo_barras"] = codigo
+    try:
+        res = productos.insert(doc)
+    except Exception as e:
+        if getattr(e, "error_code", None) == _ERROR_DUPLICADO:
+            raise _error_codigo_duplicado(codigo)
+        raise
     producto_id = res["_key"]
 
     stock.insert({
+        "_key": producto_id,
         "producto_id": producto_id,
         "cantidad": int(cantidad_inicial),
         "ultima_actualizacion": datetime.utcnow().isoformat()  # ✅ CAMBIO: guardar como string ISO
     })
+    catalogo.guardar_item(producto_id, nombre=doc["nombre"], precio=doc["precio"],
+                          categoria=doc["categoria"], fecha_registro=doc["fecha_registro"],
+                          codigo_barras=codigo, stock=int(cantidad_inicial))
+    busqueda.guardar("producto", producto_id, *busqueda_global_producto(doc))
     
     # Retornar objeto similar a MongoDB para mantener compatibilidad
     class InsertResult:
@@ -41,26 +65,17 @@ def crear_producto(nombre, precio, categoria="", cantidad_inicial=0):
 
 
 def listar_productos():
-    """Lista todos los productos con su stock actual."""
-    aql = """
-    FOR producto IN productos
-        LET stock_info = FIRST(
-            FOR s IN stock
-                FILTER s.producto_id == producto._key
-                RETURN s
-        )
-        SORT producto.fecha_registro DESC
-        RETURN MERGE(producto, {
-            stock_info: stock_info,
-            stock: stock_info ? stock_info.cantidad : 0
-        })
-    """
-    cursor = db.aql.execute(aql)
-    return list(cursor)
+    """Lista todos los productos con su stock actual (desde la copia en memoria del catálogo)."""
+    return catalogo.listar()
 
 
-def actualizar_producto(producto_id, nombre=None, precio=None, categoria=None, cantidad=None):
-    """Actualiza datos del producto y stock si corresponde."""
+def actualizar_producto(producto_id, nombre=None, precio=None, categoria=None, cantidad=None,
+                        codigo_barras=None):
+    """
+    Actualiza datos del producto y stock si corresponde.
+    codigo_barras="" quita el código; lanza ValueError si el código ya
+    pertenece a otro producto.
+    """
     cambios = {}
     if nombre: 
         cambios["nombre"] = nombre.strip()
@@ -68,29 +83,28 @@ def actualizar_producto(producto_id, nombre=None, precio=None, categoria=None, c
         cambios["precio"] = float(precio)
     if categoria is not None: 
         cambios["categoria"] = categoria.strip()
+    if codigo_barras is not None:
+        cambios["codigo_barras"] = _normalizar_codigo(codigo_barras)
 
     if cambios:
         try:
             producto = productos.get(str(producto_id))
             if producto:
                 productos.update({**producto, **cambios})
+                catalogo.guardar_item(producto_id, **cambios)
+                busqueda.guardar("producto", producto["_key"], *busqueda_global_producto({**producto, **cambios}))
         except Exception as e:
+            if getattr(e, "error_code", None) == _ERROR_DUPLICADO:
+                raise _error_codigo_duplicado(cambios["codigo_barras"])
             print("❌ Error actualizando producto:", e)
 
     if cantidad is not None:
         try:
             # Buscar stock existente
-            aql = """
-            FOR s IN stock
-                FILTER s.producto_id == @producto_id
-                RETURN s
-            """
-            cursor = db.aql.execute(aql, bind_vars={"producto_id": str(producto_id)})
-            stock_existente = list(cursor)
-            
-            if stock_existente:
+            stock_doc = obtener_stock(producto_id)
+
+            if stock_doc:
                 # Actualizar stock existente
-                stock_doc = stock_existente[0]
                 stock.update({
                     **stock_doc,
                     "cantidad": int(cantidad),
@@ -99,10 +113,12 @@ def actualizar_producto(producto_id, nombre=None, precio=None, categoria=None, c
             else:
                 # Crear nuevo registro de stock
                 stock.insert({
+                    "_key": str(producto_id),
                     "producto_id": str(producto_id),
                     "cantidad": int(cantidad),
                     "ultima_actualizacion": datetime.utcnow().isoformat()  # ✅ CAMBIO: guardar como string ISO
                 })
+            catalogo.guardar_item(producto_id, stock=int(cantidad))
         except Exception as e:
             print("❌ Error actualizando stock:", e)
 
@@ -113,14 +129,21 @@ def eliminar_producto(producto_id):
         productos.delete(str(producto_id))
     except Exception as e:
         print("❌ Error eliminando producto:", e)
+    catalogo.quitar(producto_id)
+    busqueda.quitar("producto", producto_id)
     
     try:
-        # Eliminar todos los registros de stock asociados
-        aql = """
-        FOR s IN stock
-            FILTER s.producto_id == @producto_id
-            REMOVE s IN stock
-        """
-        db.aql.execute(aql, bind_vars={"producto_id": str(producto_id)})
+        # El stock usa como _key la del producto: se borra por clave primaria
+        doc = stock.get(str(producto_id))
+        if doc and doc.get("producto_id") == str(producto_id):
+            stock.delete(doc["_key"])
+        else:
+            # Stock anterior a esa convención: buscarlo por producto_id
+            aql = """
+            FOR s IN stock
+                FILTER s.producto_id == @producto_id
+                REMOVE s IN stock
+            """
+            obtener_db().aql.execute(aql, bind_vars={"producto_id": str(producto_id)})
     except Exception as e:
         print("❌ Error eliminando stock:", e)
\ No newline at end of file
@@ -0,0 +1,234 @@
+import hashlib
+import json
+from config import obtener_db
+
+
+# Colecciones del sistema y sus índices. Cada índice lleva nombre fijo para
+# que crearlo dos veces (o desde dos workers a la vez) sea idempotente.
+ESQUEMA = {
+    "usuarios": [
+        {"name": "idx_usuarios_email", "fields": ["email"]},
+    ],
+    "counters": [],
+    "clientes": [],
+    "productos": [
+        {"name": "idx_productos_codigo_barras", "fields": ["codigo_barras"], "unique": True, "sparse": True},
+    ],
+    "stock": [
+        {"name": "idx_stock_producto_id", "fields": ["producto_id"]},
+    ],
+    "ventas": [
+        {"name": "idx_ventas_fecha", "fields": ["fecha"]},
+    ],
+    "historial_facturas": [
+        {"name": "idx_facturas_venta_id", "fields": ["venta_id"]},
+        {"name": "idx_facturas_fecha", "fields": ["fecha"]},
+        {"name": "idx_facturas_vendedor_fecha", "fields": ["vendedor", "fecha"]},
+    ],
+    "ventas_diarias": [
+        {"name": "idx_ventas_diarias_fecha", "fields": ["fecha"]},
+    ],
+    "empleados": [
+        {"name": "idx_empleados_nro_documento", "fields": ["nro_documento"]},
+    ],
+    "contratos": [
+        {"name": "idx_contratos_empleado_id", "fields": ["empleado_id"]},
+        {"name": "idx_contratos_busqueda", "fields": ["busqueda_claves[*]"]},
+        {"name": "idx_contratos_fecha_registro", "fields": ["fecha_registro"]},
+    ],
+    "pdf_blobs": [],
+}
+
+# Analizadores de texto: minúsculas y sin tildes, partido en trigramas
+# (una consulta "contiene" exige todos los trigramas del término)
+ANALIZADORES = {
+    "texto_ngram": {
+        "type": "pipeline",
+        "properties": {"pipeline": [
+            {"type": "norm", "properties": {"locale": "es", "case": "lower", "accent": False}},
+            {"type": "ngram", "properties": {"min": 3, "max": 3, "preserveOriginal": False, "streamType": "utf8"}},
+        ]},
+        "features": ["frequency", "norm", "position"],
+    },
+}
+
+# Vistas ArangoSearch y los campos que indexan
+VISTAS = {
+    "clientes_busqueda": {"links": {"clientes": {"fields": {
+        campo: {"analyzers": ["texto_ngram"]} for campo in ("nombre", "email", "ciudad", "pais")
+    }}}},
+}
+
+# Documento marcador con el hash del esquema aplicado
+COLECCION_META = "esquema_meta"
+CLAVE_META = "esquema"
+
+# Errores de ArangoDB que indican que otro worker ya creó lo mismo
+_ERROR_NOMBRE_DUPLICADO = 1207
+
+# Patrones de acceso de los modelos que deben resolverse por índice
+CONSULTAS_CRITICAS = [
+    ("usuario por email", "FOR u IN usuarios FILTER u.email IN [@v, LOWER(@v)] LIMIT 1 RETURN u", {"v": "a@b.c"}),
+    ("producto por código de barras", "FOR p IN productos FILTER p.codigo_barras == @v LIMIT 1 RETURN p", {"v": "0"}),
+    ("stock por producto", "FOR s IN stock FILTER s.producto_id == @v RETURN s", {"v": "0"}),
+    ("factura por venta", "FOR f IN historial_facturas FILTER f.venta_id == @v LIMIT 1 RETURN f", {"v": "0"}),
+    ("facturas por fecha", "FOR f IN historial_facturas SORT f.fecha DESC LIMIT 50 RETURN f", {}),
+    ("facturas por vendedor", "FOR f IN historial_facturas FILTER f.vendedor == @v SORT f.fecha DESC LIMIT 50 RETURN f", {"v": "x"}),
+    ("ventas por periodo", "FOR v IN ventas FILTER v.fecha >= @v AND v.fecha <= @v RETURN v", {"v": "2000-01-01"}),
+    ("resumen diario por periodo", "FOR d IN ventas_diarias FILTER d.fecha > @v AND d.fecha < @v RETURN d", {"v": "2000-01-01"}),
+    ("empleado por documento", "FOR e IN empleados FILTER e.nro_documento == @v LIMIT 1 RETURN e", {"v": "0"}),
+    ("contratos por empleado", "FOR c IN contratos FILTER c.empleado_id == @v RETURN c", {"v": "0"}),
+    ("contratos por fecha", "FOR c IN contratos SORT c.fecha_registro DESC LIMIT 50 RETURN c", {}),
+    ("búsqueda de clientes",
+     "FOR c IN clientes_busqueda SEARCH ANALYZER(TOKENS(@v, 'texto_ngram') ALL == c.nombre, 'texto_ngram') RETURN c",
+     {"v": "ana"}),
+    ("búsqueda de contratos", "FOR c IN contratos FILTER @v IN c.busqueda_claves[*] RETURN c", {"v": "gom"}),
+]
+
+
+def hash_esquema():
+    """Hash del esquema declarado (cambia si se agrega una colección, índice, analizador o vista)."""
+    declarado = {"colecciones": ESQUEMA, "analizadores": ANALIZADORES, "vistas": VISTAS}
+    return hashlib.sha256(json.dumps(declarado, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ColeccionPerezosa:
+    """
+    Referencia a una colección que se resuelve en cada uso contra la
+    conexión actual (config.obtener_db), así importar un modelo no conecta.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __getattr__(self, atributo):
+        return getattr(obtener_db().collection(self.nombre), atributo)
+
+    def __repr__(self):
+        return f"<ColeccionPerezosa {self.nombre}>"
+
+
+def coleccion(nombre):
+    """Referencia a una colección declarada (sin consultar al servidor)."""
+    return ColeccionPerezosa(nombre)
+
+
+def _estado_actual():
+    """
+    Colecciones existentes y marcador del esquema (una sola consulta) y los
+    nombres de los índices de cada colección declarada con índices. AQL no
+    tiene una función para listar índices: se leen con collection.indexes().
+    """
+    aql = """
+    LET colecciones = COLLECTIONS()[*].name
+    RETURN {
+        colecciones: colecciones,
+        marca: @meta IN colecciones ? DOCUMENT(CONCAT(@meta, "/", @clave)) : null
+    }
+    """
+    cursor = obtener_db().aql.execute(aql, bind_vars={"meta": COLECCION_META, "clave": CLAVE_META})
+    estado = list(cursor)[0]
+    estado["indices"] = {
+        nombre: [i.get("name") for i in obtener_db().collection(nombre).indexes()]
+        for nombre, indices in ESQUEMA.items()
+        if indices and nombre in estado["colecciones"]
+    }
+    return estado
+
+
+def _indices_faltantes(estado):
+    """Nombres "coleccion/indice" declarados en ESQUEMA que no existen en la base."""
+    return [
+        f"{nombre}/{indice['name']}"
+        for nombre, indices in ESQUEMA.items()
+        for indice in indices
+        if indice["name"] not in estado["indices"].get(nombre, [])
+    ]
+
+
+def _crear_coleccion(nombre):
+    try:
+        obtener_db().create_collection(nombre)
+    except Exception as e:
+        if getattr(e, "error_code", None) != _ERROR_NOMBRE_DUPLICADO:
+            raise
+
+
+def _asegurar_vista(nombre, propiedades):
+    try:
+        obtener_db().create_arangosearch_view(nombre, propiedades)
+    except Exception as e:
+        if getattr(e, "error_code", None) != _ERROR_NOMBRE_DUPLICADO:
+            raise
+        # Ya existe: agrega los enlaces que falten (actualización parcial)
+        obtener_db().update_arangosearch_view(nombre, propiedades)
+
+
+def asegurar_esquema(forzar=False):
+    """
+    Verifica las colecciones con una sola consulta y los índices de cada una
+    y crea lo que falte (también los analizadores y vistas ArangoSearch).
+    Si están todas las colecciones e índices declarados y el marcador coincide
+    con el esquema no hace nada más (un índice borrado a mano se vuelve a crear).
+    Es seguro ejecutarlo desde varios workers a la vez.
+    Devuelve la lista de colecciones creadas.
+    """
+    estado = _estado_actual()
+    esperado = hash_esquema()
+    existentes = set(estado["colecciones"])
+    faltantes = [n for n in list(ESQUEMA) + [COLECCION_META] if n not in existentes]
+    indices_faltantes = _indices_faltantes(estado)
+    marca = estado["marca"] or {}
+    if not forzar and not faltantes and not indices_faltantes and marca.get("hash") == esperado:
+        return []
+
+    for nombre in faltantes:
+        _crear_coleccion(nombre)
+    for nombre, indices in ESQUEMA.items():
+        col = coleccion(nombre)
+        for indice in indices:
+            # add_index devuelve el índice existente si ya está creado igual
+            col.add_index({"type": "persistent", **indice})
+    for nombre, analizador in ANALIZADORES.items():
+        # Con la misma definición el servidor devuelve el analizador existente
+        obtener_db().create_analyzer(nombre, analizador["type"], analizador["properties"], analizador["features"])
+    for nombre, propiedades in VISTAS.items():
+        _asegurar_vista(nombre, propiedades)
+
+    coleccion(COLECCION_META).insert(
+        {"_key": CLAVE_META, "hash": esperado}, overwrite_mode="replace"
+    )
+    if faltantes:
+        print(f"✅ Esquema: colecciones creadas {', '.join(faltantes)}")
+    if indices_faltantes:
+        print(f"✅ Esquema: índices creados {', '.join(indices_faltantes)}")
+    return faltantes
+
+
+def _nodos_plan(plan):
+    for nodo in plan.get("nodes", []):
+        yield nodo
+        for sub in nodo.get("subquery", {}).get("nodes", []):
+            yield sub
+
+
+def informe_escaneos():
+    """
+    Explica las consultas críticas y devuelve, por cada una, si se resuelve
+    por índice (o vista) o si recorre la colección completa:
+    [{consulta, indices: [...], escaneos: [colecciones]}].
+    """
+    informe = []
+    for nombre, aql, bind_vars in CONSULTAS_CRITICAS:
+        plan = obtener_db().aql.explain(aql, bind_vars=bind_vars)
+        indices = []
+        escaneos = []
+        for nodo in _nodos_plan(plan):
+            if nodo.get("type") == "IndexNode":
+                indices.extend(i.get("name") for i in nodo.get("indexes", []))
+            elif nodo.get("type") == "EnumerateViewNode":
+                indices.append(nodo.get("view"))
+            elif nodo.get("type") == "EnumerateCollectionNode":
+                escaneos.append(nodo.get("collection"))
+        informe.append({"consulta": nombre, "indices": indices, "escaneos": escaneos})
+    return informe
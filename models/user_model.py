@@ -1,32 +1,12 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from config import db
+from config import obtener_db
+from models.schema import coleccion
+from services.secuencias import siguiente_id
 import re
 
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
-
-
-usuarios = get_collection("usuarios")
-counters = get_collection("counters")
-
-
-def obtener_siguiente_id(nombre_secuencia):
-    """Obtiene el siguiente ID autoincrementable para una secuencia"""
-    try:
-        counter_doc = counters.get(nombre_secuencia)
-        nuevo_valor = counter_doc["valor"] + 1
-        counters.update({"_key": nombre_secuencia, "valor": nuevo_valor})
-        return nuevo_valor
-    except:
-        counters.insert({"_key": nombre_secuencia, "valor": 1})
-        return 1
+usuarios = coleccion("usuarios")
 
 
 def listar_usuarios():
@@ -35,7 +15,7 @@ def listar_usuarios():
         SORT usuario.fecha_registro DESC
         RETURN usuario
     """
-    cursor = db.aql.execute(aql)
+    cursor = obtener_db().aql.execute(aql)
     return list(cursor)
 
 
@@ -44,11 +24,11 @@ def buscar_por_email(email):
         return None
     aql = """
     FOR usuario IN usuarios
-        FILTER LOWER(usuario.email) == LOWER(@email)
+        FILTER usuario.email IN [@email, LOWER(@email)]
         LIMIT 1
         RETURN usuario
     """
-    cursor = db.aql.execute(aql, bind_vars={"email": email.strip()})
+    cursor = obtener_db().aql.execute(aql, bind_vars={"email": email.strip()})
     resultado = list(cursor)
     return resultado[0] if resultado else None
 
@@ -69,7 +49,7 @@ def verificar_usuario(email, password):
 
 
 def crear_usuario(nombre, email, password, rol="none", estado="inactivo"):
-    nuevo_id = obtener_siguiente_id("usuarios")  # id autoincrementable
+    nuevo_id = siguiente_id("usuarios")  # id autoincrementable
     doc = {
         "id_usuario": nuevo_id,  # nuevo campo id incremental
         "nombre": nombre.strip(),
@@ -77,7 +57,7 @@ def crear_usuario(nombre, email, password, rol="none", estado="inactivo"):
         "password": generate_password_hash(password.strip()),
         "rol": rol,
         "estado": estado,
-        "fecha_registro": datetime.utcnow()
+        "fecha_registro": datetime.utcnow().isoformat()
     }
     return usuarios.insert(doc)
 
@@ -120,11 +100,11 @@ def actualizar_password_by_email(email, nueva_password):
     try:
         aql = """
         FOR usuario IN usuarios
-            FILTER LOWER(usuario.email) == LOWER(@email)
+            FILTER usuario.email IN [@email, LOWER(@email)]
             UPDATE usuario WITH {password: @password} IN usuarios
             RETURN NEW
         """
-        cursor = db.aql.execute(aql, bind_vars={
+        cursor = obtener_db().aql.execute(aql, bind_vars={
             "email": email.strip(),
             "password": hashed_pw
         })
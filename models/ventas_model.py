@@ -1,42 +1,107 @@
-from datetime import datetime
-from config import db
+from datetime import datetime, timedelta
+from config import obtener_db
+from models.schema import coleccion
+from services.busqueda_global import busqueda
+from services.catalogo_cache import catalogo
+from services.reintentos import ejecutar_con_reintentos
+import os
 
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
-
+# Pasado este tiempo un PDF en "generando" se da por abandonado (el worker
+# que lo tomó murió o se reinició) y otro puede volver a generarlo
+PDF_GENERANDO_VENCE_SEGUNDOS = float(os.getenv("PDF_GENERANDO_VENCE_SEGUNDOS", "120"))
 
 # Colecciones
-productos = get_collection("productos")
-stock = get_collection("stock")
-ventas = get_collection("ventas")
-facturas = get_collection("historial_facturas")
+productos = coleccion("productos")
+stock = coleccion("stock")
+ventas = coleccion("ventas")
+facturas = coleccion("historial_facturas")
+ventas_diarias = coleccion("ventas_diarias")
+
+# Los índices (fecha, vendedor+fecha, venta_id...) se declaran en models/schema.py
+# La factura de una venta y el stock de un producto usan como _key la clave de
+# su padre (venta / producto): se leen por clave primaria. Los documentos
+# anteriores a esa convención se siguen encontrando por venta_id / producto_id
+# (ver 'flask --app app migrar-claves').
 
 
 # -----------------------
 # Productos / Stock
 # -----------------------
+def busqueda_global_producto(producto):
+    """(textos, datos) del producto para el buscador del administrador."""
+    nombre = producto.get("nombre") or ""
+    categoria = producto.get("categoria") or ""
+    textos = (nombre, categoria, producto.get("codigo_barras") or "")
+    return textos, {"titulo": nombre, "detalle": categoria, "filtro": None}
+
+
+def _entradas_busqueda_productos():
+    aql = """
+    FOR producto IN productos
+        RETURN {_key: producto._key, nombre: producto.nombre, categoria: producto.categoria,
+                codigo_barras: producto.codigo_barras}
+    """
+    for producto in obtener_db().aql.execute(aql, batch_size=1000, stream=True):
+        yield (producto["_key"], *busqueda_global_producto(producto))
+
+
+busqueda.registrar_fuente("producto", _entradas_busqueda_productos)
+
+
 def listar_productos():
     """
     Devuelve una lista de productos. Cada producto trae además el campo 'stock'
     con la cantidad disponible (0 si no existe registro de stock).
+    Se sirve desde la copia en memoria del catálogo (ver services/catalogo_cache).
+    """
+    return catalogo.listar()
+
+
+def buscar_productos(consulta, limite=10):
+    """
+    Buscador del punto de venta: productos cuyo nombre o categoría empieza
+    con (o contiene) la consulta. Devuelve dicts con _key, nombre, precio,
+    categoria y stock.
+    """
+    return [item.a_dict() for item in catalogo.buscar(consulta, limite)]
+
+
+def buscar_por_codigo(codigo_barras):
     """
+    Resuelve un código escaneado a {_key, nombre, precio, categoria,
+    codigo_barras, stock} (o None). Con el catálogo en memoria vigente no
+    toca la base; si no, hace una sola lectura por el índice único.
+    """
+    codigo = (codigo_barras or "").strip()
+    if not codigo:
+        return None
+    encontrado, item = catalogo.por_codigo(codigo)
+    if encontrado:
+        return item.a_dict() if item else None
+
     aql = """
-    FOR producto IN productos
-        LET stock_info = FIRST(
+    FOR p IN productos
+        FILTER p.codigo_barras == @codigo
+        LIMIT 1
+        LET directo = DOCUMENT("stock", p._key)
+        LET cantidad = directo.producto_id == p._key ? directo.cantidad : FIRST(
             FOR s IN stock
-                FILTER s.producto_id == producto._key
-                RETURN s
+                FILTER s.producto_id == p._key
+                LIMIT 1
+                RETURN s.cantidad
         )
-        RETURN MERGE(producto, {stock: stock_info ? stock_info.cantidad : 0})
+        RETURN {
+            _key: p._key,
+            nombre: p.nombre,
+            precio: p.precio,
+            categoria: p.categoria,
+            codigo_barras: p.codigo_barras,
+            stock: cantidad != null ? cantidad : 0
+        }
     """
-    cursor = db.aql.execute(aql)
-    return list(cursor)
+    resultado = list(obtener_db().aql.execute(aql, bind_vars={"codigo": codigo}))
+    return resultado[0] if resultado else None
 
 
 def registrar_producto(nombre, precio, cantidad_inicial=0):
@@ -50,7 +115,9 @@ def registrar_producto(nombre, precio, cantidad_inicial=0):
     }
     res = productos.insert(doc)
     prod_id = res["_key"]
-    stock.insert({"producto_id": prod_id, "cantidad": int(cantidad_inicial)})
+    stock.insert({"_key": prod_id, "producto_id": prod_id, "cantidad": int(cantidad_inicial)})
+    catalogo.guardar_item(prod_id, nombre=doc["nombre"], precio=doc["precio"], stock=int(cantidad_inicial))
+    busqueda.guardar("producto", prod_id, *busqueda_global_producto(doc))
     return str(prod_id)
 
 
@@ -65,13 +132,16 @@ def obtener_producto(producto_id):
 def obtener_stock(producto_id):
     """Devuelve el documento de stock para un producto (o None)."""
     try:
+        doc = stock.get(str(producto_id))
+        if doc and doc.get("producto_id") == str(producto_id):
+            return doc
         aql = """
         FOR s IN stock
             FILTER s.producto_id == @producto_id
             LIMIT 1
             RETURN s
         """
-        cursor = db.aql.execute(aql, bind_vars={"producto_id": str(producto_id)})
+        cursor = obtener_db().aql.execute(aql, bind_vars={"producto_id": str(producto_id)})
         resultado = list(cursor)
         return resultado[0] if resultado else None
     except Exception:
@@ -81,22 +151,28 @@ def obtener_stock(producto_id):
 def actualizar_stock(producto_id, delta):
     """
     Incrementa o decrementa el stock (delta puede ser negativo).
+    No valida existencias: para descontar ventas usar descontar_stock.
     Devuelve dict con matched_count y modified_count.
     """
     try:
         aql = """
-        FOR s IN stock
-            FILTER s.producto_id == @producto_id
+        LET directo = DOCUMENT("stock", @producto_id)
+        FOR s IN (directo.producto_id == @producto_id ? [directo] : (
+            FOR x IN stock
+                FILTER x.producto_id == @producto_id
+                RETURN x
+        ))
             UPDATE s WITH {cantidad: s.cantidad + @delta} IN stock
             RETURN NEW
         """
-        cursor = db.aql.execute(aql, bind_vars={
+        cursor = obtener_db().aql.execute(aql, bind_vars={
             "producto_id": str(producto_id),
             "delta": int(delta)
         })
         resultado = list(cursor)
         
         if resultado:
+            catalogo.ajustar_stock({str(producto_id): resultado[0]["cantidad"]})
             return {"matched_count": 1, "modified_count": 1}
         return {"matched_count": 0, "modified_count": 0}
     except Exception as e:
@@ -104,16 +180,156 @@ def actualizar_stock(producto_id, delta):
         return {"matched_count": 0, "modified_count": 0}
 
 
+# Fragmento AQL compartido por descontar_stock y procesar_carrito.
+# Espera una variable 'lineas_pedidas' (lista de {id, cantidad, ...}) y deja
+# 'lineas_stock' (cada línea con su documento de stock y el flag 'ok') y
+# 'descontadas' (las líneas cuyo stock se descontó). La comprobación y el
+# descuento ocurren en la misma transacción y el UPDATE exige la misma _rev
+# leída, así que dos cajas vendiendo las últimas unidades no dejan stock negativo.
+_AQL_DESCUENTO_STOCK = """
+    LET lineas_stock = (
+        FOR l IN lineas_pedidas
+            LET directo = DOCUMENT("stock", l.id)
+            LET s = directo.producto_id == l.id ? directo : FIRST(
+                FOR s IN stock
+                    FILTER s.producto_id == l.id
+                    LIMIT 1
+                    RETURN s
+            )
+            RETURN MERGE(l, {
+                s: s,
+                ok: l.valida != false AND s != null AND s.cantidad >= l.cantidad
+            })
+    )
+    LET descontadas = (
+        FOR l IN lineas_stock
+            FILTER l.ok
+            UPDATE l.s WITH {cantidad: l.s.cantidad - l.cantidad} IN stock
+                OPTIONS {ignoreRevs: false}
+            RETURN MERGE(UNSET(l, "s", "ok"), {restante: NEW.cantidad})
+    )
+"""
+
+# Las escrituras de ventas se reintentan ante conflictos (services/reintentos):
+# el 1210 sólo se da cuando dos ventas del mismo día hacen a la vez el UPSERT
+# de su resumen en ventas_diarias y ambas insertan.
+
+
+def descontar_stock(lineas):
+    """
+    Descuenta stock de varios productos en una sola consulta, pero sólo en
+    las líneas con existencias suficientes (nunca deja stock negativo).
+
+    lineas: lista de dicts {"id": producto_id, "cantidad": int}
+    Las líneas de un mismo producto se suman (como en procesar_carrito): un
+    stock no puede actualizarse dos veces en la misma consulta.
+    Devuelve una lista con el resultado de cada producto:
+      {"id", "cantidad", "ok", "disponible"}
+    donde 'disponible' es el stock que queda (o el que había si no se descontó).
+    """
+    if not lineas:
+        return []
+
+    cantidades = {}
+    for l in lineas:
+        producto_id = str(l["id"])
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + int(l["cantidad"])
+
+    aql = """
+    LET lineas_pedidas = @lineas
+    """ + _AQL_DESCUENTO_STOCK + """
+    FOR l IN lineas_stock
+        RETURN {
+            id: l.id,
+            cantidad: l.cantidad,
+            ok: l.ok,
+            disponible: l.s == null ? 0 : (l.ok ? l.s.cantidad - l.cantidad : l.s.cantidad)
+        }
+    """
+    resultado = ejecutar_con_reintentos(aql, {
+        "lineas": [{"id": k, "cantidad": v} for k, v in cantidades.items()]
+    })
+    catalogo.ajustar_stock({l["id"]: l["disponible"] for l in resultado if l["ok"]})
+    return resultado
+
+
+# Fragmento AQL que suma una venta a su resumen diario en 'ventas_diarias'.
+# Espera 'venta' (documento recién insertado o null) y 'lineas_dia' (lista de
+# {id, nombre, cantidad, subtotal}). Va en la misma consulta que inserta la
+# venta: si otro proceso actualizó el mismo día en paralelo la consulta choca
+# (conflicto) y ejecutar_con_reintentos la repite completa.
+_AQL_ACUMULAR_DIA = """
+    LET acumulado = (
+        FOR v IN (venta ? [venta] : [])
+            LET dia = SUBSTRING(v.fecha, 0, 10)
+            LET previo = DOCUMENT("ventas_diarias", dia)
+            LET vendedor_dia = NOT_NULL(v.vendedor, "N/A")
+            LET pv = previo.por_vendedor[vendedor_dia]
+            LET unidades = SUM(lineas_dia[*].cantidad)
+            LET nuevo = {
+                _key: dia,
+                fecha: dia,
+                total: NOT_NULL(previo.total, 0) + v.total,
+                transacciones: NOT_NULL(previo.transacciones, 0) + 1,
+                unidades: NOT_NULL(previo.unidades, 0) + unidades,
+                por_vendedor: MERGE(NOT_NULL(previo.por_vendedor, {}), {
+                    [vendedor_dia]: {
+                        total: NOT_NULL(pv.total, 0) + v.total,
+                        transacciones: NOT_NULL(pv.transacciones, 0) + 1,
+                        unidades: NOT_NULL(pv.unidades, 0) + unidades
+                    }
+                }),
+                por_producto: MERGE(NOT_NULL(previo.por_producto, {}), ZIP(
+                    lineas_dia[*].id,
+                    (
+                        FOR l IN lineas_dia
+                            LET pp = previo.por_producto[l.id]
+                            RETURN {
+                                nombre: l.nombre,
+                                unidades: NOT_NULL(pp.unidades, 0) + l.cantidad,
+                                total: NOT_NULL(pp.total, 0) + l.subtotal
+                            }
+                    )
+                ))
+            }
+            UPSERT {_key: dia} INSERT nuevo REPLACE nuevo IN ventas_diarias
+            RETURN dia
+    )
+"""
+
+
 # -----------------------
 # Ventas / Facturación
 # -----------------------
+def _busqueda_global_factura(factura):
+    """(textos, datos) de la factura para el buscador del administrador."""
+    cliente = factura.get("cliente") or ""
+    textos = (cliente, factura.get("venta_id") or "")
+    detalle = f"{cliente} · {(factura.get('fecha') or '')[:10]}"
+    # venta_id va aparte: en las facturas antiguas no coincide con su _key
+    return textos, {"titulo": f"Factura {factura.get('venta_id')}", "detalle": detalle, "filtro": None,
+                    "venta_id": str(factura.get("venta_id") or "")}
+
+
+def _entradas_busqueda_facturas():
+    aql = """
+    FOR factura IN historial_facturas
+        RETURN {_key: factura._key, venta_id: factura.venta_id, cliente: factura.cliente, fecha: factura.fecha}
+    """
+    for factura in obtener_db().aql.execute(aql, batch_size=1000, stream=True):
+        yield (factura["_key"], *_busqueda_global_factura(factura))
+
+
+busqueda.registrar_fuente("factura", _entradas_busqueda_facturas)
+
+
 def registrar_venta(cliente, producto_id, cantidad, vendedor=None):
     """
     Registra una venta:
-      - valida existencia de producto y stock
-      - inserta documento en 'ventas'
-      - decrementa el stock
-      - crea un documento en 'historial_facturas'
+      - valida existencia de producto
+      - descuenta el stock de forma atómica (falla si no alcanza)
+      - inserta documento en 'ventas', su factura en 'historial_facturas'
+        y suma la venta al resumen de 'ventas_diarias' (una sola consulta)
     """
     # validaciones mínimas
     if not cliente or not isinstance(cantidad, int) or cantidad <= 0:
@@ -124,179 +340,520 @@ def registrar_venta(cliente, producto_id, cantidad, vendedor=None):
     except Exception:
         prod = None
 
-    stk = obtener_stock(producto_id)
-
     if not prod:
         return None, "Producto inexistente."
-    if not stk or stk.get("cantidad", 0) < cantidad:
+
+    # 1) descontar stock de forma atómica (falla si no alcanza)
+    resultado = descontar_stock([{"id": producto_id, "cantidad": cantidad}])
+    if not resultado or not resultado[0]["ok"]:
         return None, "Stock insuficiente."
 
     total = float(prod.get("precio", 0)) * int(cantidad)
 
-    # 1) insertar venta (GUARDAR FECHA COMO STRING ISO)
-    venta_doc = {
+    # 2) insertar venta, factura y resumen diario en una sola escritura
+    aql = """
+    LET venta = FIRST(
+        INSERT {
+            cliente_id: @cliente_id,
+            producto_id: @producto_id,
+            cantidad: @cantidad,
+            total: @total,
+            fecha: @fecha,
+            vendedor: @vendedor
+        } INTO ventas
+        RETURN NEW
+    )
+    LET factura = FIRST(
+        INSERT {
+            _key: venta._key,
+            venta_id: venta._key,
+            cliente: @cliente,
+            cliente_email: @cliente_email,
+            producto: @producto,
+            cantidad: @cantidad,
+            total: @total,
+            fecha: @fecha,
+            vendedor: @vendedor
+        } INTO historial_facturas
+        RETURN NEW._key
+    )
+    LET lineas_dia = [{id: @producto_id, nombre: @producto, cantidad: @cantidad, subtotal: @total}]
+    """ + _AQL_ACUMULAR_DIA + """
+    RETURN venta._key
+    """
+    bind_vars = {
         "cliente_id": str(cliente.get("_key")),
         "producto_id": str(producto_id),
         "cantidad": int(cantidad),
         "total": total,
         "fecha": datetime.utcnow().isoformat(),  # ✅ CAMBIO: convertir a string ISO
-        "vendedor": str(vendedor) if vendedor else None
+        "vendedor": str(vendedor) if vendedor else None,
+        "cliente": cliente.get("nombre", "") if isinstance(cliente, dict) else "",
+        "cliente_email": cliente.get("email", "") if isinstance(cliente, dict) else "",
+        "producto": prod.get("nombre", "")
     }
-    venta_res = ventas.insert(venta_doc)
-    venta_id = venta_res["_key"]
+    try:
+        venta_id = str(ejecutar_con_reintentos(aql, bind_vars)[0])
+    except Exception as e:
+        # Devolver las unidades reservadas si la venta no se pudo guardar
+        print("❌ registrar_venta error:", e)
+        actualizar_stock(producto_id, int(cantidad))
+        return None, "No se pudo registrar la venta."
 
-    # 2) actualizar stock (-cantidad)
-    actualizar_stock(producto_id, -int(cantidad))
+    busqueda.guardar("factura", venta_id, *_busqueda_global_factura({**bind_vars, "venta_id": venta_id}))
+    return venta_id, None
 
-    # 3) crear factura en historial_facturas (GUARDAR FECHA COMO STRING ISO)
-    factura_doc = {
-        "venta_id": venta_id,
-        "cliente": cliente.get("nombre", "") if isinstance(cliente, dict) else "",
-        "cliente_email": cliente.get("email", "") if isinstance(cliente, dict) else "",
-        "producto": prod.get("nombre", ""),
-        "cantidad": int(cantidad),
-        "total": total,
-        "fecha": datetime.utcnow().isoformat(),  # ✅ CAMBIO: convertir a string ISO
-        "vendedor": str(vendedor) if vendedor else None
+
+def procesar_carrito(cliente_id, carrito, vendedor=None):
+    """
+    Registra una venta de carrito completo en UNA sola consulta AQL:
+      - busca cliente, productos y stock de todas las líneas
+      - toma el precio del producto en la base (ignora el del formulario)
+      - descuenta el stock de las líneas con existencias suficientes
+        (mismo descuento atómico que descontar_stock)
+      - inserta la venta y su factura en 'ventas' / 'historial_facturas'
+      - suma la venta a su resumen diario en 'ventas_diarias'
+    La consulta corre dentro de la transacción de AQL, así que el número de
+    viajes a ArangoDB no depende del tamaño del carrito.
+
+    carrito: lista de dicts {"id": producto_id, "cantidad": int}
+    Devuelve (resultado, error). resultado trae venta_id, factura y
+    'rechazadas' (lista de {"id", "motivo"} con motivo "producto" o "stock").
+    La factura queda con pdf_estado "generando": el PDF se genera aparte.
+    """
+    # Agrupar líneas repetidas: un mismo stock no puede actualizarse dos veces
+    cantidades = {}
+    for item in carrito or []:
+        try:
+            producto_id = str(item["id"])
+            cantidad = int(item["cantidad"])
+        except (KeyError, TypeError, ValueError):
+            return None, "Datos de venta inválidos."
+        if cantidad <= 0:
+            return None, "Datos de venta inválidos."
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+
+    if not cantidades:
+        return None, "El carrito está vacío"
+
+    aql = """
+    LET cliente = DOCUMENT("clientes", @cliente_id)
+    LET lineas_pedidas = (
+        FOR item IN (cliente ? @carrito : [])
+            LET producto = DOCUMENT("productos", item.id)
+            RETURN MERGE(item, {producto: producto, valida: producto != null})
+    )
+    """ + _AQL_DESCUENTO_STOCK + """
+    LET vendidas = (
+        FOR l IN descontadas
+            LET precio = TO_NUMBER(l.producto.precio)
+            RETURN {
+                id: l.id,
+                nombre: NOT_NULL(l.producto.nombre, ""),
+                precio: precio,
+                cantidad: l.cantidad,
+                subtotal: precio * l.cantidad
+            }
+    )
+    LET rechazadas = (
+        FOR l IN lineas_stock
+            FILTER NOT l.ok
+            RETURN {id: l.id, motivo: l.producto == null ? "producto" : "stock"}
+    )
+    LET total = SUM(vendidas[*].subtotal)
+    LET venta = FIRST(
+        FOR x IN (LENGTH(vendidas) > 0 ? [1] : [])
+            INSERT {
+                cliente_id: cliente._key,
+                productos: vendidas,
+                total: total,
+                fecha: @fecha,
+                vendedor: @vendedor
+            } INTO ventas
+            RETURN NEW
+    )
+    LET factura = FIRST(
+        FOR v IN (venta ? [venta] : [])
+            INSERT {
+                _key: v._key,
+                venta_id: v._key,
+                cliente: NOT_NULL(cliente.nombre, ""),
+                cliente_email: NOT_NULL(cliente.email, ""),
+                productos: vendidas,
+                total: total,
+                fecha: @fecha,
+                vendedor: @vendedor,
+                pdf_estado: "generando",
+                pdf_generando_desde: @fecha
+            } INTO historial_facturas
+            RETURN NEW
+    )
+    LET lineas_dia = vendidas
+    """ + _AQL_ACUMULAR_DIA + """
+    RETURN {
+        cliente: cliente != null,
+        venta_id: venta ? venta._key : null,
+        factura: factura,
+        rechazadas: rechazadas,
+        stock: descontadas[* RETURN {id: CURRENT.id, restante: CURRENT.restante}]
     }
-    facturas.insert(factura_doc)
+    """
+    resultado = ejecutar_con_reintentos(aql, {
+        "cliente_id": str(cliente_id),
+        "carrito": [{"id": k, "cantidad": v} for k, v in cantidades.items()],
+        "fecha": datetime.utcnow().isoformat(),
+        "vendedor": str(vendedor) if vendedor else None
+    })[0]
 
-    return str(venta_id), None
+    if not resultado["cliente"]:
+        return None, "Cliente no encontrado"
+    catalogo.ajustar_stock({l["id"]: l["restante"] for l in resultado["stock"]})
+    if resultado["factura"]:
+        factura = resultado["factura"]
+        busqueda.guardar("factura", factura["_key"], *_busqueda_global_factura(factura))
+    return resultado, None
 
 
 def obtener_factura(venta_id):
     """
-    Busca en 'historial_facturas' el documento que tenga venta_id = venta_id.
+    Busca en 'historial_facturas' el documento que tenga venta_id = venta_id
+    (por clave primaria; las facturas antiguas, por el índice de venta_id).
     Devuelve el documento o None.
     """
     try:
+        factura = facturas.get(str(venta_id))
+        if factura and factura.get("venta_id") == str(venta_id):
+            return factura
         aql = """
         FOR factura IN historial_facturas
             FILTER factura.venta_id == @venta_id
             LIMIT 1
             RETURN factura
         """
-        cursor = db.aql.execute(aql, bind_vars={"venta_id": str(venta_id)})
+        cursor = obtener_db().aql.execute(aql, bind_vars={"venta_id": str(venta_id)})
         resultado = list(cursor)
         return resultado[0] if resultado else None
     except Exception:
         return None
 
 
-def listar_facturas():
+def tomar_generacion_pdf(factura_key, pdf_ref=None, vence_segundos=PDF_GENERANDO_VENCE_SEGUNDOS):
     """
-    Devuelve todas las facturas ordenadas por fecha descendente.
+    Marca la factura como "generando" sólo si nadie la está generando (o si
+    quien la tomó lleva más de 'vence_segundos', p. ej. un worker que murió)
+    y su pdf_ref sigue siendo 'pdf_ref' (None, o la referencia perdida que se
+    va a reemplazar). La comprobación y la escritura son una sola consulta:
+    entre varios workers sólo uno la gana.
+    Devuelve la factura actualizada si este proceso debe renderizar el PDF,
+    o None si otro ya lo está haciendo (o ya lo terminó).
     """
+    ahora = datetime.utcnow()
     aql = """
     FOR factura IN historial_facturas
-        SORT factura.fecha DESC
-        RETURN factura
+        FILTER factura._key == @clave
+        FILTER factura.pdf_ref == @pdf_ref
+        FILTER factura.pdf_estado != "generando" OR factura.pdf_generando_desde == null
+            OR factura.pdf_generando_desde < @vencido
+        UPDATE factura WITH {
+            pdf_ref: null,
+            pdf_sha256: null,
+            pdf_estado: "generando",
+            pdf_generando_desde: @ahora
+        } IN historial_facturas
+        RETURN NEW
     """
-    cursor = db.aql.execute(aql)
-    return list(cursor)
+    resultado = ejecutar_con_reintentos(aql, {
+        "clave": str(factura_key),
+        "pdf_ref": pdf_ref,
+        "ahora": ahora.isoformat(),
+        "vencido": (ahora - timedelta(seconds=vence_segundos)).isoformat()
+    })
+    return resultado[0] if resultado else None
+
+
+def listar_facturas(limite=50, cursor=None, fecha_desde=None, fecha_hasta=None,
+                    vendedor=None, cliente=None):
+    """
+    Devuelve una página de facturas ordenadas por fecha descendente.
+
+    Paginación por clave (keyset) sobre (fecha, _key): 'cursor' es el valor
+    devuelto por la página anterior, así cada página cuesta lo mismo sin
+    importar cuántas facturas haya. Sólo trae las columnas del listado
+    (nunca el PDF ni el detalle de productos).
+
+    Filtros opcionales: rango de fechas (inclusive, str ISO o datetime),
+    vendedor (exacto) y cliente (contiene, sin distinguir mayúsculas).
+    Devuelve (facturas, siguiente_cursor); siguiente_cursor es None en la última página.
+    """
+    limite = max(1, min(int(limite), 200))
+    fecha_desde = fecha_desde.isoformat() if isinstance(fecha_desde, datetime) else fecha_desde
+    fecha_hasta = fecha_hasta.isoformat() if isinstance(fecha_hasta, datetime) else fecha_hasta
+
+    filtros = []
+    bind_vars = {"limite": limite + 1}
+    # El cursor llega de la URL: si no tiene la forma "fecha|_key" se empieza desde la primera página
+    partes = cursor.split("|", 1) if isinstance(cursor, str) else []
+    if len(partes) == 2 and all(partes):
+        cursor_fecha, cursor_key = partes
+        # La primera condición usa el índice de fecha; la segunda desempata por _key
+        filtros.append("FILTER factura.fecha <= @cursor_fecha")
+        filtros.append("FILTER factura.fecha < @cursor_fecha OR factura._key < @cursor_key")
+        bind_vars.update({"cursor_fecha": cursor_fecha, "cursor_key": cursor_key})
+    if fecha_desde:
+        filtros.append("FILTER factura.fecha >= @fecha_desde")
+        bind_vars["fecha_desde"] = fecha_desde
+    if fecha_hasta:
+        filtros.append("FILTER factura.fecha <= @fecha_hasta")
+        bind_vars["fecha_hasta"] = fecha_hasta
+    if vendedor:
+        filtros.append("FILTER factura.vendedor == @vendedor")
+        bind_vars["vendedor"] = vendedor
+    if cliente:
+        filtros.append("FILTER CONTAINS(LOWER(factura.cliente), @cliente)")
+        bind_vars["cliente"] = cliente.strip().lower()
+
+    aql = """
+    FOR factura IN historial_facturas
+        """ + "\n        ".join(filtros) + """
+        SORT factura.fecha DESC, factura._key DESC
+        LIMIT @limite
+        RETURN {
+            _key: factura._key,
+            venta_id: factura.venta_id,
+            cliente: factura.cliente,
+            producto: factura.producto,
+            cantidad: factura.cantidad,
+            total: factura.total,
+            vendedor: factura.vendedor,
+            fecha: factura.fecha
+        }
+    """
+    resultado = list(obtener_db().aql.execute(aql, bind_vars=bind_vars))
+
+    siguiente = None
+    if len(resultado) > limite:
+        resultado = resultado[:limite]
+        ultima = resultado[-1]
+        siguiente = f"{ultima['fecha']}|{ultima['_key']}"
+    return resultado, siguiente
 
 
 # -----------------------
 # NUEVO: Reportes de Ventas
 # -----------------------
+def _tramos_periodo(fecha_inicio, fecha_fin):
+    """
+    Parte un periodo [inicio, fin] en días completos (se leen de 'ventas_diarias')
+    y los dos bordes parciales (se leen de 'ventas' por el índice de fecha).
+    Devuelve los bind vars que usan las consultas de reportes.
+    """
+    inicio = fecha_inicio.isoformat() if isinstance(fecha_inicio, datetime) else fecha_inicio
+    fin = fecha_fin.isoformat() if isinstance(fecha_fin, datetime) else fecha_fin
+    dia_inicio, dia_fin = inicio[:10], fin[:10]
+    partido = dia_inicio != dia_fin
+    return {
+        "dia_inicio": dia_inicio,
+        "dia_fin": dia_fin,
+        "borde1_desde": inicio,
+        "borde1_hasta": f"{dia_inicio}T23:59:59.999999" if partido else fin,
+        "partido": partido,
+        "borde2_desde": dia_fin,
+        "borde2_hasta": fin
+    }
+
+
+# Estadísticas del periodo: días completos desde 'ventas_diarias' y sólo
+# los bordes parciales desde 'ventas' (ver _tramos_periodo).
+_AQL_ESTADISTICAS = """
+    LET dias = (
+        FOR d IN ventas_diarias
+            FILTER d.fecha > @dia_inicio AND d.fecha < @dia_fin
+            RETURN {total: d.total, transacciones: d.transacciones}
+    )
+    LET bordes = UNION(
+        (
+            FOR venta IN ventas
+                FILTER venta.fecha >= @borde1_desde AND venta.fecha <= @borde1_hasta
+                RETURN {total: venta.total, transacciones: 1}
+        ),
+        (
+            FOR venta IN ventas
+                FILTER @partido AND venta.fecha >= @borde2_desde AND venta.fecha <= @borde2_hasta
+                RETURN {total: venta.total, transacciones: 1}
+        )
+    )
+    LET filas = APPEND(dias, bordes)
+    LET estadisticas = {
+        total_ventas: SUM(filas[*].total),
+        cantidad_transacciones: SUM(filas[*].transacciones)
+    }
+"""
+
+# Detalle del periodo: una fila por producto vendido. Sirve para ventas de
+# carrito (lista 'productos') y para las antiguas de un solo producto.
+# Cliente y producto se buscan por clave primaria con DOCUMENT().
+_AQL_DETALLE = """
+    LET detalle = (
+        FOR venta IN ventas
+            FILTER venta.fecha >= @borde1_desde AND venta.fecha <= @borde2_hasta
+            SORT venta.fecha DESC
+            LET cliente = DOCUMENT("clientes", venta.cliente_id)
+            LET lineas = venta.productos ? venta.productos : [{
+                nombre: DOCUMENT("productos", venta.producto_id).nombre,
+                cantidad: venta.cantidad,
+                subtotal: venta.total
+            }]
+            FOR linea IN lineas
+                RETURN {
+                    _id: venta._key,
+                    fecha: venta.fecha,
+                    cliente_nombre: cliente ? cliente.nombre : "Cliente no encontrado",
+                    producto_nombre: NOT_NULL(linea.nombre, "Producto no encontrado"),
+                    cantidad: linea.cantidad,
+                    total: linea.subtotal,
+                    vendedor: venta.vendedor ? venta.vendedor : "N/A"
+                }
+    )
+"""
+
+
+def _formatear_estadisticas(stats):
+    """Redondea totales y calcula el promedio por venta."""
+    total = (stats or {}).get("total_ventas", 0) or 0
+    transacciones = (stats or {}).get("cantidad_transacciones", 0) or 0
+    return {
+        "total_ventas": round(total, 2),
+        "cantidad_transacciones": transacciones,
+        "promedio_venta": round(total / transacciones, 2) if transacciones else 0.0
+    }
+
+
 def obtener_ventas_por_periodo(fecha_inicio, fecha_fin):
     """
     Obtiene estadísticas de ventas por periodo específico.
     Retorna un diccionario con total de ventas, cantidad de transacciones, etc.
+    Los días completos se suman desde 'ventas_diarias' (una fila por día) y
+    sólo las horas de los días de los extremos se leen de 'ventas'.
     """
     try:
-        # ✅ CAMBIO: Convertir datetime a string ISO para comparación
-        fecha_inicio_str = fecha_inicio.isoformat() if isinstance(fecha_inicio, datetime) else fecha_inicio
-        fecha_fin_str = fecha_fin.isoformat() if isinstance(fecha_fin, datetime) else fecha_fin
-        
-        aql = """
-        FOR venta IN ventas
-            FILTER venta.fecha >= @fecha_inicio AND venta.fecha <= @fecha_fin
-            COLLECT AGGREGATE 
-                total_ventas = SUM(venta.total),
-                cantidad_transacciones = COUNT(1),
-                promedio_venta = AVG(venta.total)
-            RETURN {
-                total_ventas: total_ventas,
-                cantidad_transacciones: cantidad_transacciones,
-                promedio_venta: promedio_venta
-            }
+        aql = _AQL_ESTADISTICAS + """
+        RETURN estadisticas
         """
-        cursor = db.aql.execute(aql, bind_vars={
-            "fecha_inicio": fecha_inicio_str,
-            "fecha_fin": fecha_fin_str
-        })
+        cursor = obtener_db().aql.execute(aql, bind_vars=_tramos_periodo(fecha_inicio, fecha_fin))
         resultado = list(cursor)
-        
-        if resultado:
-            stats = resultado[0]
-            return {
-                "total_ventas": round(stats.get("total_ventas", 0) or 0, 2),
-                "cantidad_transacciones": stats.get("cantidad_transacciones", 0) or 0,
-                "promedio_venta": round(stats.get("promedio_venta", 0) or 0, 2)
-            }
-        else:
-            return {
-                "total_ventas": 0.0,
-                "cantidad_transacciones": 0,
-                "promedio_venta": 0.0
-            }
+        return _formatear_estadisticas(resultado[0] if resultado else None)
     except Exception as e:
         print(f"❌ Error obtener_ventas_por_periodo: {e}")
-        return {
-            "total_ventas": 0.0,
-            "cantidad_transacciones": 0,
-            "promedio_venta": 0.0
-        }
+        return _formatear_estadisticas(None)
 
 
 def obtener_ventas_detalladas_por_periodo(fecha_inicio, fecha_fin):
     """
     Obtiene lista detallada de ventas por periodo con información de cliente y producto.
+    Devuelve una fila por producto vendido (las ventas de carrito se despliegan).
     """
     try:
-        # ✅ CAMBIO: Convertir datetime a string ISO para comparación
-        fecha_inicio_str = fecha_inicio.isoformat() if isinstance(fecha_inicio, datetime) else fecha_inicio
-        fecha_fin_str = fecha_fin.isoformat() if isinstance(fecha_fin, datetime) else fecha_fin
-        
-        aql = """
-        FOR venta IN ventas
-            FILTER venta.fecha >= @fecha_inicio AND venta.fecha <= @fecha_fin
-            LET cliente = FIRST(
-                FOR c IN clientes
-                    FILTER c._key == venta.cliente_id
-                    RETURN c
-            )
-            LET producto = FIRST(
-                FOR p IN productos
-                    FILTER p._key == venta.producto_id
-                    RETURN p
-            )
-            SORT venta.fecha DESC
-            RETURN {
-                _id: venta._key,
-                fecha: venta.fecha,
-                cliente_nombre: cliente ? cliente.nombre : "Cliente no encontrado",
-                producto_nombre: producto ? producto.nombre : "Producto no encontrado",
-                cantidad: venta.cantidad,
-                total: venta.total,
-                vendedor: venta.vendedor ? venta.vendedor : "N/A"
-            }
+        tramos = _tramos_periodo(fecha_inicio, fecha_fin)
+        aql = _AQL_DETALLE + """
+        FOR fila IN detalle
+            RETURN fila
         """
-        cursor = db.aql.execute(aql, bind_vars={
-            "fecha_inicio": fecha_inicio_str,
-            "fecha_fin": fecha_fin_str
+        cursor = obtener_db().aql.execute(aql, bind_vars={
+            "borde1_desde": tramos["borde1_desde"],
+            "borde2_hasta": tramos["borde2_hasta"]
         })
-        
         return list(cursor)
     except Exception as e:
         print(f"❌ Error obtener_ventas_detalladas_por_periodo: {e}")
         return []
 
 
+def obtener_reporte_ventas(fecha_inicio, fecha_fin):
+    """
+    Estadísticas y detalle del periodo en una sola consulta (un viaje a la base).
+    Devuelve (estadisticas, ventas_detalladas) con el mismo formato que
+    obtener_ventas_por_periodo / obtener_ventas_detalladas_por_periodo.
+    """
+    try:
+        aql = _AQL_ESTADISTICAS + _AQL_DETALLE + """
+        RETURN {estadisticas: estadisticas, detalle: detalle}
+        """
+        cursor = obtener_db().aql.execute(aql, bind_vars=_tramos_periodo(fecha_inicio, fecha_fin))
+        resultado = list(cursor)[0]
+        return _formatear_estadisticas(resultado["estadisticas"]), resultado["detalle"]
+    except Exception as e:
+        print(f"❌ Error obtener_reporte_ventas: {e}")
+        return _formatear_estadisticas(None), []
+
+
 # -----------------------
 # Utilidades / Depuración
 # -----------------------
+def reconstruir_ventas_diarias():
+    """
+    Recalcula 'ventas_diarias' a partir de todas las ventas (para cargar el
+    histórico o corregir desvíos). Reemplaza el resumen de cada día con ventas
+    y borra los días que ya no tienen ninguna; las ventas sin fecha válida
+    (YYYY-MM-DD...) no cuentan. Las dos consultas van en una transacción: si
+    una caja vende mientras corre, choca con esa escritura y aborta sin dejar
+    datos a medias, basta con volver a ejecutarla.
+    Devuelve la cantidad de días escritos.
+    """
+    aql = """
+    FOR venta IN ventas
+        FILTER IS_STRING(venta.fecha) AND REGEX_TEST(venta.fecha, "^[0-9]{4}-[0-9]{2}-[0-9]{2}")
+        LET lineas = venta.productos ? venta.productos : [{
+            id: venta.producto_id,
+            nombre: DOCUMENT("productos", venta.producto_id).nombre,
+            cantidad: venta.cantidad,
+            subtotal: venta.total
+        }]
+        COLLECT dia = SUBSTRING(venta.fecha, 0, 10) INTO grupo = {venta: venta, lineas: lineas}
+        LET por_vendedor = MERGE(
+            FOR g IN grupo
+                COLLECT vendedor = NOT_NULL(g.venta.vendedor, "N/A")
+                AGGREGATE total = SUM(g.venta.total),
+                          transacciones = COUNT(1),
+                          unidades = SUM(SUM(g.lineas[*].cantidad))
+                RETURN {[vendedor]: {total: total, transacciones: transacciones, unidades: unidades}}
+        )
+        LET por_producto = MERGE(
+            FOR g IN grupo
+                FOR l IN g.lineas
+                    COLLECT id = l.id
+                    AGGREGATE unidades = SUM(l.cantidad),
+                              total = SUM(l.subtotal),
+                              nombre = MAX(l.nombre)
+                    RETURN {[id]: {nombre: nombre, unidades: unidades, total: total}}
+        )
+        INSERT {
+            _key: dia,
+            fecha: dia,
+            total: SUM(grupo[*].venta.total),
+            transacciones: LENGTH(grupo),
+            unidades: SUM(FLATTEN(grupo[*].lineas)[*].cantidad),
+            por_vendedor: por_vendedor,
+            por_producto: por_producto
+        } INTO ventas_diarias OPTIONS {overwriteMode: "replace"}
+        RETURN dia
+    """
+    # Una consulta AQL no puede leer ventas_diarias después de escribirla: la limpieza va aparte
+    aql_limpiar = """
+    FOR d IN ventas_diarias
+        FILTER d._key NOT IN @dias
+        REMOVE d IN ventas_diarias
+    """
+    transaccion = obtener_db().begin_transaction(read=["ventas", "productos"], write=["ventas_diarias"])
+    try:
+        dias = list(transaccion.aql.execute(aql))
+        transaccion.aql.execute(aql_limpiar, bind_vars={"dias": dias})
+        transaccion.commit_transaction()
+    except Exception:
+        transaccion.abort_transaction()
+        raise
+    return len(dias)
+
+
 def contar_stock_total():
     """Ejemplo: suma total de stock (helper)."""
     aql = """
@@ -304,6 +861,6 @@ def contar_stock_total():
         COLLECT AGGREGATE total = SUM(s.cantidad)
         RETURN total
     """
-    cursor = db.aql.execute(aql)
+    cursor = obtener_db().aql.execute(aql)
     resultado = list(cursor)
     return resultado[0] if resultado else 0
\ No newline at end of file
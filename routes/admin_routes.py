@@ -0,0 +1,85 @@
+import time
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, session
+from services.busqueda_global import busqueda
+from services.perfil_aql import perfil, AQL_LENTA_MS, AQL_LOG_LENTO
+
+admin_bp = Blueprint("admin", __name__)
+
+# Columnas por las que se puede ordenar el ranking de consultas
+ORDENES_CONSULTAS = ("total_ms", "max_ms", "promedio_ms", "ejecuciones", "scanned_full", "filas")
+
+BUSQUEDA_LIMITE_MAX = 100
+
+
+def _es_administrador():
+    return "usuario" in session and session["usuario"].get("rol") == "administrador"
+
+
+# 🐢 Ranking de consultas AQL de este proceso (por tiempo total, máximo, escaneos...)
+@admin_bp.route("/admin/consultas")
+def consultas_aql():
+    if not _es_administrador():
+        return redirect(url_for("auth.login"))
+
+    orden = request.args.get("orden", "total_ms")
+    if orden not in ORDENES_CONSULTAS:
+        orden = "total_ms"
+    consultas = perfil.top(limite=50, orden=orden)
+    return render_template(
+        "consultas_aql.html",
+        consultas=consultas,
+        orden=orden,
+        ordenes=ORDENES_CONSULTAS,
+        umbral_ms=AQL_LENTA_MS,
+        log_lento=AQL_LOG_LENTO
+    )
+
+
+def _url_resultado(resultado):
+    """Página de la entidad encontrada (filtrada por el resultado cuando se puede)."""
+    tipo = resultado["tipo"]
+    if tipo == "cliente":
+        return url_for("cliente.clientes", q=resultado["filtro"] or None)
+    if tipo == "producto":
+        return url_for("productos.productos")
+    if tipo == "empleado":
+        return url_for("empleado.empleados", q=resultado["filtro"] or None)
+    if tipo == "contrato":
+        return url_for("contrato.contratos", q=resultado["filtro"] or None)
+    if tipo == "factura":
+        return url_for("ventas.ver_factura", venta_id=resultado["venta_id"])
+    return None
+
+
+# 🔎 Búsqueda global: clientes, productos, empleados, contratos y facturas (JSON)
+# ?q=texto[&tipo=cliente&tipo=factura...][&limite=20]
+@admin_bp.route("/admin/buscar")
+def busqueda_global():
+    if not _es_administrador():
+        return jsonify({"error": "No autorizado"}), 401
+
+    tipos = [t for t in request.args.getlist("tipo") if t]
+    desconocidos = [t for t in tipos if t not in busqueda.tipos()]
+    if desconocidos:
+        return jsonify({"error": f"Tipo desconocido: {', '.join(desconocidos)}",
+                        "tipos": list(busqueda.tipos())}), 400
+    try:
+        limite = int(request.args.get("limite", 20))
+    except ValueError:
+        limite = 20
+    limite = max(1, min(limite, BUSQUEDA_LIMITE_MAX))
+
+    q = request.args.get("q", "")
+    inicio = time.perf_counter()
+    try:
+        resultados = busqueda.buscar(q, limite, tipos)
+    except Exception as e:
+        print("❌ Error en la búsqueda global:", e)
+        return jsonify({"error": "No se pudo completar la búsqueda"}), 503
+    ms = (time.perf_counter() - inicio) * 1000
+
+    return jsonify({
+        "q": q,
+        "ms": round(ms, 3),
+        "resultados": [{**r, "url": _url_resultado(r)} for r in resultados]
+    })
@@ -6,6 +6,9 @@ from models.cliente_model import (
 
 cliente_bp = Blueprint("cliente", __name__)
 
+# Resultados que muestra una búsqueda (?q=) en el listado de clientes
+LIMITE_BUSQUEDA = 50
+
 def _usuario_logueado_y_permiso():
     """
     Helper: devuelve True si hay sesión y rol válido para acceder a clientes.
@@ -45,8 +48,8 @@ def clientes():
 
     # GET: listado (con posible búsqueda por querystring ?q=)
     q = request.args.get("q", None)
-    lista = listar_clientes(q)
-    return render_template("clientes.html", clientes=lista, q=q)
+    lista = listar_clientes(q, limite=LIMITE_BUSQUEDA)
+    return render_template("clientes.html", clientes=lista, q=q, limite=LIMITE_BUSQUEDA)
 
 # 📌 Editar cliente (se envía desde la misma página)
 @cliente_bp.route("/clientes/editar/<client_id>", methods=["POST"])
@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, Response
 from models.contrato_model import (
-    crear_contrato, listar_contratos, obtener_contrato_por_id,
+    crear_contrato, listar_contratos_pagina, listar_contratos_empleado, obtener_contrato_por_id,
     actualizar_contrato, eliminar_contrato, contar_contratos_empleado
 )
 from models.empleado_model import listar_empleados, obtener_empleado_por_id
+from services.blob_store import enviar_pdf
+from datetime import datetime
 import base64
 from io import BytesIO
 import openpyxl
@@ -56,11 +58,23 @@ def contratos():
             flash("Ocurrió un error al crear el contrato.")
         return redirect(url_for("contrato.contratos"))
 
-    # GET: listado con posible búsqueda
+    # GET: listado paginado con posible búsqueda
     q = request.args.get("q", None)
-    lista_contratos = listar_contratos(q)
+    lista_contratos, siguiente, total = listar_contratos_pagina(
+        limite=request.args.get("limite", 50, type=int),
+        cursor=request.args.get("cursor") or None,
+        busqueda=q
+    )
     lista_empleados = listar_empleados()
-    return render_template("contratos.html", contratos=lista_contratos, empleados=lista_empleados, q=q)
+    return render_template(
+        "contratos.html",
+        contratos=lista_contratos,
+        empleados=lista_empleados,
+        q=q,
+        total=total,
+        siguiente=siguiente,
+        es_primera=not request.args.get("cursor")
+    )
 
 # 📌 Editar contrato
 @contrato_bp.route("/contratos/editar/<contrato_id>", methods=["POST"])
@@ -118,16 +132,17 @@ def descargar_pdf_contrato(contrato_id):
     
     try:
         contrato = obtener_contrato_por_id(contrato_id)
-        if not contrato or not contrato.get("pdf_base64"):
+        if not contrato or not (contrato.get("pdf_ref") or contrato.get("pdf_base64")):
             flash("❌ No se encontró el PDF del contrato.")
             return redirect(url_for("contrato.contratos"))
         
-        # Decodificar PDF de base64
-        pdf_bytes = base64.b64decode(contrato["pdf_base64"])
-        buffer = BytesIO(pdf_bytes)
-        buffer.seek(0)
-        
         filename = f"Contrato_{contrato.get('id_contrato', 'N/A')}_{contrato.get('tipo_contrato', 'contrato')}.pdf"
+
+        if contrato.get("pdf_ref"):
+            return enviar_pdf(contrato["pdf_ref"], filename)
+
+        # Compatibilidad con contratos aún no migrados (PDF en base64)
+        buffer = BytesIO(base64.b64decode(contrato["pdf_base64"]))
         
         return send_file(
             buffer,
@@ -245,16 +260,16 @@ def contratos_por_empleado(empleado_id):
             flash("❌ Empleado no encontrado.")
             return redirect(url_for("contrato.contratos"))
         
-        # Buscar contratos de este empleado
-        todos_contratos = listar_contratos()
-        contratos_empleado = [c for c in todos_contratos if c.get('empleado_id') == empleado_id]
+        # Contratos de este empleado (por el índice de empleado_id)
+        contratos_empleado = listar_contratos_empleado(empleado_id)
         cantidad = len(contratos_empleado)
         
         return render_template(
             "contratos_empleado.html", 
             empleado=empleado, 
             contratos=contratos_empleado,
-            cantidad=cantidad
+            cantidad=cantidad,
+            now=datetime.now
         )
     except Exception as e:
         print(f"❌ Error contratos_por_empleado: {e}")
@@ -3,6 +3,7 @@ from models.empleado_model import (
     crear_empleado, listar_empleados, obtener_empleado_por_id,
     actualizar_empleado, eliminar_empleado, obtener_empleado_por_documento
 )
+from models.contrato_model import contar_contratos_por_empleado
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
@@ -61,7 +62,8 @@ def empleados():
     # GET: listado con posible búsqueda
     q = request.args.get("q", None)
     lista = listar_empleados(q)
-    return render_template("empleados.html", empleados=lista, q=q)
+    contratos = contar_contratos_por_empleado([e["_key"] for e in lista])
+    return render_template("empleados.html", empleados=lista, q=q, contratos=contratos)
 
 # 📌 Editar empleado
 @empleado_bp.route("/empleados/editar/<empleado_id>", methods=["POST"])
@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from models.producto_model import crear_producto, listar_productos, actualizar_producto, eliminar_producto
+from services.catalogo_cache import catalogo
 
 productos_bp = Blueprint("productos", __name__)
 
@@ -18,12 +19,17 @@ def productos():
         precio = request.form.get("precio")
         categoria = request.form.get("categoria")
         cantidad = request.form.get("cantidad", 0)
+        codigo_barras = request.form.get("codigo_barras")
 
         if not nombre or not precio:
             flash("Nombre y precio son obligatorios.")
             return redirect(url_for("productos.productos"))
 
-        crear_producto(nombre, precio, categoria, cantidad)
+        try:
+            crear_producto(nombre, precio, categoria, cantidad, codigo_barras)
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for("productos.productos"))
         flash("Producto creado correctamente.")
         return redirect(url_for("productos.productos"))
 
@@ -39,8 +45,13 @@ def editar_producto(producto_id):
     precio = request.form.get("precio")
     categoria = request.form.get("categoria")
     cantidad = request.form.get("cantidad")
+    codigo_barras = request.form.get("codigo_barras")
 
-    actualizar_producto(producto_id, nombre, precio, categoria, cantidad)
+    try:
+        actualizar_producto(producto_id, nombre, precio, categoria, cantidad, codigo_barras)
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for("productos.productos"))
     flash("Producto actualizado correctamente.")
     return redirect(url_for("productos.productos"))
 
@@ -51,4 +62,12 @@ def eliminar_producto_route(producto_id):
 
     eliminar_producto(producto_id)
     flash("Producto eliminado correctamente.")
-    return redirect(url_for("productos.productos"))
\ No newline at end of file
+    return redirect(url_for("productos.productos"))
+
+
+@productos_bp.route("/productos/cache/metricas")
+def metricas_catalogo():
+    if "usuario" not in session or session["usuario"].get("rol") != "administrador":
+        return redirect(url_for("auth.login"))
+
+    return jsonify(catalogo.metricas())
@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, jsonify
 from models.ventas_model import (
     listar_productos, obtener_factura, listar_facturas,
-    obtener_ventas_por_periodo, obtener_ventas_detalladas_por_periodo, obtener_stock
+    obtener_reporte_ventas, procesar_carrito, buscar_productos, buscar_por_codigo,
+    tomar_generacion_pdf
 )
-from models.cliente_model import listar_clientes, obtener_cliente_por_id
+from models.cliente_model import buscar_clientes
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
@@ -12,27 +13,23 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from datetime import datetime, timedelta
-from config import db
+from concurrent.futures import TimeoutError as FuturesTimeout
+from services.pdf_pool import pool_facturas
+from services.blob_store import guardar_pdf, enviar_pdf
+from models.schema import coleccion
 import base64
+import os
 
 
 ventas_bp = Blueprint("ventas", __name__)
 
+# Segundos que la descarga espera a que termine un PDF en generación
+PDF_ESPERA_SEGUNDOS = float(os.getenv("PDF_ESPERA_SEGUNDOS", "10"))
 
-# Obtener o crear colecciones
-def get_collection(name):
-    """Helper para obtener o crear una colección"""
-    if db.has_collection(name):
-        return db.collection(name)
-    else:
-        return db.create_collection(name)
 
 
 # Referencias a colecciones
-ventas_collection = get_collection("ventas")
-facturas_collection = get_collection("historial_facturas")
-productos_collection = get_collection("productos")
-stock_collection = get_collection("stock")
+facturas_collection = coleccion("historial_facturas")
 
 
 # -------------------------
@@ -310,6 +307,32 @@ def generar_pdf_factura(factura):
     return buffer.getvalue()
 
 
+# -------------------------
+# Helper: Generación de PDFs en segundo plano
+# -------------------------
+def _renderizar_factura(factura):
+    """Genera el PDF, lo guarda en el almacén de PDFs y devuelve su referencia (corre en el pool)."""
+    try:
+        pdf_bytes = generar_pdf_factura_mejorada(factura)
+        campos_pdf = guardar_pdf(pdf_bytes)
+    except Exception as e:
+        print(f"❌ Error generando PDF de factura {factura.get('_key')}: {e}")
+        facturas_collection.update({"_key": factura["_key"], "pdf_estado": "error"})
+        raise
+
+    facturas_collection.update({
+        "_key": factura["_key"],
+        **campos_pdf,
+        "pdf_estado": "listo"
+    })
+    return campos_pdf["pdf_ref"]
+
+
+def encolar_pdf_factura(factura):
+    """Encola la generación del PDF (si ya está en curso devuelve ese trabajo)."""
+    return pool_facturas.encolar(factura["_key"], _renderizar_factura, factura)
+
+
 # 📌 Registro de ventas (con carrito múltiple - UNA SOLA FACTURA)
 @ventas_bp.route("/ventas", methods=["GET", "POST"])
 def ventas():
@@ -332,102 +355,32 @@ def ventas():
                 flash("El carrito está vacío")
                 return redirect(url_for("ventas.ventas"))
             
-            cliente = obtener_cliente_por_id(cliente_id)
-            if not cliente:
-                flash("Cliente no encontrado")
-                return redirect(url_for("ventas.ventas"))
-            
             vendedor = session["usuario"]["nombre"]
-            
-            # Procesar todos los productos y actualizar stock
-            productos_factura = []
-            total_factura = 0
-            
-            for item in carrito:
-                producto_id = item["id"]
-                cantidad = int(item["cantidad"])
-                
-                # Validar producto y stock
-                try:
-                    prod = productos_collection.get(str(producto_id))
-                except Exception:
-                    prod = None
-                
-                if not prod:
-                    flash(f"Producto {item['nombre']} no encontrado")
-                    continue
-                
-                stk = obtener_stock(producto_id)
-                
-                if not stk or stk.get("cantidad", 0) < cantidad:
-                    flash(f"Stock insuficiente para {item['nombre']}")
-                    continue
-                
-                precio = float(prod.get("precio", 0))
-                subtotal = precio * cantidad
-                total_factura += subtotal
-                
-                # Actualizar stock usando AQL
-                aql = """
-                FOR s IN stock
-                    FILTER s.producto_id == @producto_id
-                    UPDATE s WITH {cantidad: s.cantidad - @cantidad} IN stock
-                """
-                db.aql.execute(aql, bind_vars={
-                    "producto_id": str(producto_id),
-                    "cantidad": int(cantidad)
-                })
-                
-                # Agregar producto a la lista de la factura
-                productos_factura.append({
-                    "id": str(producto_id),
-                    "nombre": prod.get("nombre", ""),
-                    "precio": precio,
-                    "cantidad": cantidad,
-                    "subtotal": subtotal
-                })
-            
-            if len(productos_factura) == 0:
+            nombres = {str(item.get("id")): item.get("nombre", "") for item in carrito}
+
+            # Una sola consulta valida precios, descuenta stock y crea venta + factura
+            resultado, error = procesar_carrito(cliente_id, carrito, vendedor)
+            if error:
+                flash(error)
+                return redirect(url_for("ventas.ventas"))
+
+            for rechazada in resultado["rechazadas"]:
+                nombre = nombres.get(rechazada["id"], rechazada["id"])
+                if rechazada["motivo"] == "producto":
+                    flash(f"Producto {nombre} no encontrado")
+                else:
+                    flash(f"Stock insuficiente para {nombre}")
+
+            factura = resultado["factura"]
+            if not factura:
                 flash("No se pudo procesar ningún producto")
                 return redirect(url_for("ventas.ventas"))
-            
-            # Crear UNA SOLA venta con todos los productos
-            # ✅ CAMBIO: Guardar fecha como string ISO
-            venta_doc = {
-                "cliente_id": str(cliente.get("_key")),
-                "productos": productos_factura,
-                "total": total_factura,
-                "fecha": datetime.utcnow().isoformat(),  # ✅ String ISO
-                "vendedor": str(vendedor)
-            }
-            venta_res = ventas_collection.insert(venta_doc)
-            venta_id = venta_res["_key"]
-            
-            # Crear UNA SOLA factura con todos los productos
-            # ✅ CAMBIO: Guardar fecha como string ISO
-            factura_doc = {
-                "venta_id": venta_id,
-                "cliente": cliente.get("nombre", ""),
-                "cliente_email": cliente.get("email", ""),
-                "productos": productos_factura,
-                "total": total_factura,
-                "fecha": datetime.utcnow().isoformat(),  # ✅ String ISO
-                "vendedor": str(vendedor)
-            }
-            factura_res = facturas_collection.insert(factura_doc)
-            
-            # Generar PDF con todos los productos y guardarlo como base64
-            factura = obtener_factura(str(venta_id))
-            if factura:
-                pdf_bytes = generar_pdf_factura_mejorada(factura)
-                pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-                
-                # Actualizar factura con PDF en base64
-                factura_actualizada = facturas_collection.get(factura["_key"])
-                facturas_collection.update({
-                    **factura_actualizada,
-                    "pdf_data": pdf_base64
-                })
+
+            venta_id = resultado["venta_id"]
+            productos_factura = factura["productos"]
+
+            # El PDF se genera en segundo plano; la venta ya quedó registrada
+            encolar_pdf_factura(factura)
             
             flash(f"✅ Venta procesada exitosamente: {len(productos_factura)} producto(s) vendido(s)")
             return redirect(url_for("ventas.ver_factura", venta_id=venta_id))
@@ -439,10 +392,50 @@ def ventas():
             flash("Ocurrió un error al procesar la venta")
             return redirect(url_for("ventas.ventas"))
     
-    # GET: mostrar formulario
-    productos_list = listar_productos()
-    clientes = listar_clientes()
-    return render_template("ventas.html", productos=productos_list, clientes=clientes)
+    # GET: mostrar formulario (productos y clientes se buscan con /ventas/buscar/...)
+    return render_template("ventas.html")
+
+
+# Cantidad máxima de resultados del buscador
+BUSQUEDA_LIMITE_MAX = 50
+
+
+def _limite_busqueda():
+    try:
+        limite = int(request.args.get("limite", 10))
+    except ValueError:
+        limite = 10
+    return max(1, min(limite, BUSQUEDA_LIMITE_MAX))
+
+
+# 🔎 Buscador de productos para el punto de venta (JSON)
+@ventas_bp.route("/ventas/buscar/productos")
+def buscar_productos_view():
+    if "usuario" not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    return jsonify(buscar_productos(request.args.get("q", ""), _limite_busqueda()))
+
+
+# 🔎 Producto por código de barras (lector del punto de venta, JSON)
+@ventas_bp.route("/ventas/escanear/<path:codigo>")
+def escanear_producto(codigo):
+    if "usuario" not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    producto = buscar_por_codigo(codigo)
+    if not producto:
+        return jsonify({"error": "Código no encontrado"}), 404
+    return jsonify(producto)
+
+
+# 🔎 Buscador de clientes para el punto de venta (JSON)
+@ventas_bp.route("/ventas/buscar/clientes")
+def buscar_clientes_view():
+    if "usuario" not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    return jsonify(buscar_clientes(request.args.get("q", ""), _limite_busqueda()))
 
 
 # 📌 Ver factura en HTML
@@ -459,36 +452,98 @@ def ver_factura(venta_id):
     return render_template("factura.html", factura=factura)
 
 
-# 📌 Descargar factura en PDF (desde base64)
+# 📌 Descargar factura en PDF (desde el almacén de PDFs)
 @ventas_bp.route("/ventas/factura/<venta_id>/pdf")
 def descargar_factura_pdf(venta_id):
     if "usuario" not in session:
         return redirect(url_for("auth.login"))
 
     factura = obtener_factura(venta_id)
-    if not factura or "pdf_data" not in factura:
+    if not factura:
         flash("PDF no disponible para esta factura")
         return redirect(url_for("ventas.ver_factura", venta_id=venta_id))
 
-    # Decodificar base64 a bytes
-    pdf_bytes = base64.b64decode(factura["pdf_data"])
-    
-    return send_file(
-        BytesIO(pdf_bytes),
-        as_attachment=True,
-        download_name=f"factura_{venta_id}.pdf",
-        mimetype="application/pdf"
-    )
+    nombre_archivo = f"factura_{venta_id}.pdf"
+    pdf_perdido = None
+    if factura.get("pdf_ref"):
+        try:
+            return enviar_pdf(factura["pdf_ref"], nombre_archivo)
+        except FileNotFoundError:
+            # El PDF se borró del almacén: hay que generarlo de nuevo
+            pdf_perdido = factura["pdf_ref"]
+            print(f"❌ PDF {pdf_perdido} de la factura {factura['_key']} no encontrado, se regenera")
+
+    if factura.get("pdf_data"):
+        # Compatibilidad con facturas aún no migradas (PDF en base64)
+        return send_file(
+            BytesIO(base64.b64decode(factura["pdf_data"])),
+            as_attachment=True,
+            download_name=nombre_archivo,
+            mimetype="application/pdf"
+        )
+
+    # Aún no está listo (o falló / se perdió): esperar el render de este
+    # proceso o disparar uno. Entre workers, sólo renderiza el que gana
+    # tomar_generacion_pdf; los demás esperan a que aparezca el pdf_ref.
+    futuro = pool_facturas.pendiente(factura["_key"])
+    if futuro is None:
+        tomada = tomar_generacion_pdf(factura["_key"], pdf_ref=pdf_perdido)
+        if tomada is None:
+            actual = obtener_factura(venta_id) or {}
+            if actual.get("pdf_ref") and actual["pdf_ref"] != pdf_perdido:
+                return enviar_pdf(actual["pdf_ref"], nombre_archivo)
+            flash("⏳ El PDF se está generando, intenta de nuevo en unos segundos")
+            return redirect(url_for("ventas.ver_factura", venta_id=venta_id))
+        futuro = encolar_pdf_factura(tomada)
+    try:
+        pdf_ref = futuro.result(timeout=PDF_ESPERA_SEGUNDOS)
+    except FuturesTimeout:
+        flash("⏳ El PDF se está generando, intenta de nuevo en unos segundos")
+        return redirect(url_for("ventas.ver_factura", venta_id=venta_id))
+    except Exception:
+        flash("PDF no disponible para esta factura")
+        return redirect(url_for("ventas.ver_factura", venta_id=venta_id))
+
+    return enviar_pdf(pdf_ref, nombre_archivo)
 
 
-# 📌 Listar todas las facturas
+# 📌 Métricas del pool de PDFs (cola y tiempos de render)
+@ventas_bp.route("/ventas/facturas/pdf/metricas")
+def metricas_pdf():
+    if "usuario" not in session or session["usuario"].get("rol") != "administrador":
+        return redirect(url_for("auth.login"))
+
+    return jsonify(pool_facturas.metricas())
+
+
+# 📌 Listar facturas (paginado por fecha, con filtros)
 @ventas_bp.route("/ventas/facturas")
 def listar_facturas_view():
     if "usuario" not in session:
         return redirect(url_for("auth.login"))
 
-    facturas_list = listar_facturas()
-    return render_template("facturas.html", facturas=facturas_list)
+    filtros = {
+        "desde": request.args.get("desde", "").strip(),
+        "hasta": request.args.get("hasta", "").strip(),
+        "vendedor": request.args.get("vendedor", "").strip(),
+        "cliente": request.args.get("cliente", "").strip()
+    }
+    facturas_list, siguiente = listar_facturas(
+        limite=request.args.get("limite", 50, type=int),
+        cursor=request.args.get("cursor") or None,
+        fecha_desde=filtros["desde"] or None,
+        # 'hasta' llega como fecha (YYYY-MM-DD): incluir el día completo
+        fecha_hasta=f"{filtros['hasta']}T23:59:59.999999" if filtros["hasta"] else None,
+        vendedor=filtros["vendedor"] or None,
+        cliente=filtros["cliente"] or None
+    )
+    return render_template(
+        "facturas.html",
+        facturas=facturas_list,
+        siguiente=siguiente,
+        filtros=filtros,
+        es_primera=not request.args.get("cursor")
+    )
 
 
 # 📌 Mostrar stock actual
@@ -527,9 +582,8 @@ def reporte_ventas():
         titulo_periodo = "Últimos 7 días"
         periodo = 'semanal'
     
-    # Obtener estadísticas y ventas detalladas
-    estadisticas = obtener_ventas_por_periodo(fecha_inicio, hoy)
-    ventas_detalladas = obtener_ventas_detalladas_por_periodo(fecha_inicio, hoy)
+    # Obtener estadísticas y ventas detalladas (una sola consulta)
+    estadisticas, ventas_detalladas = obtener_reporte_ventas(fecha_inicio, hoy)
     
     return render_template(
         'reporte_ventas.html',
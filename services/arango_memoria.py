@@ -0,0 +1,3133 @@
+"""
+Backend de ArangoDB en memoria (ARANGO_BACKEND=memoria).
+
+Implementa el subconjunto de python-arango que usa el proyecto
+(db.collection / create_collection / has_collection / aql.execute /
+aql.explain / begin_transaction / create_analyzer /
+create_arangosearch_view y get/has/insert/update/replace/delete/
+add_index de las colecciones) y un intérprete del subconjunto de AQL de
+los modelos: FOR, FILTER, LET, SORT, LIMIT, COLLECT (INTO, AGGREGATE, WITH COUNT),
+RETURN, INSERT, UPDATE, REPLACE, REMOVE, UPSERT, subconsultas,
+expansiones [*], operadores ALL/ANY/NONE, FOR ... IN vista SEARCH
+y las funciones que aparecen en las consultas.
+
+Sirve para correr la aplicación, benchmarks y pruebas de carga sin red.
+Se comporta como el servidor en lo que importa para medir:
+  - cada consulta corre en una transacción (si falla se deshacen sus escrituras),
+  - los índices persistentes declarados se usan para FILTER por igualdad,
+    IN, rangos y SORT, y los de arreglo ('campo[*]') para 'valor IN
+    doc.campo[*]' (y aparecen así en explain()),
+  - las vistas ArangoSearch mantienen un índice invertido por campo y
+    analizador (identity, norm, ngram, pipeline) y puntúan con BM25;
+    a diferencia del servidor, ven cada escritura al instante,
+  - cursor.statistics() trae scanned_full / scanned_index / filtered,
+  - los mismos códigos de error (1200, 1202, 1203, 1207, 1210, 1501, 1551...),
+  - cada operación se notifica a config.OBSERVADORES_DB como un request.
+Todo ocurre bajo un lock por base: las consultas son serializables.
+"""
+import inspect
+import json
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from itertools import count as contador, islice
+from arango.exceptions import ArangoError, CursorCountError
+from config import notificar_llamada_db
+
+
+# ---------------------------------------------------------------------
+# Errores
+# ---------------------------------------------------------------------
+ERR_CONFLICTO = 1200
+ERR_NO_ENCONTRADO = 1202
+ERR_COLECCION_NO_ENCONTRADA = 1203
+ERR_NOMBRE_DUPLICADO = 1207
+ERR_UNICO = 1210
+ERR_CLAVE_INVALIDA = 1221
+ERR_DOCUMENTO_INVALIDO = 1227
+ERR_SINTAXIS = 1501
+ERR_VARIABLE_DESCONOCIDA = 1512
+ERR_FUNCION_DESCONOCIDA = 1540
+ERR_ARGUMENTOS = 1541
+ERR_BIND_FALTANTE = 1551
+ERR_BIND_SOBRANTE = 1552
+ERR_TRANSACCION_NO_ENCONTRADA = 1655
+ERR_PARAMETRO = 10
+ERR_NO_IMPLEMENTADO = 9
+
+
+class ErrorArangoMemoria(ArangoError):
+    """Error con el mismo error_code / http_code que devolvería el servidor."""
+
+    def __init__(self, error_code, mensaje, http_code=400):
+        super().__init__(f"[HTTP {http_code}][ERR {error_code}] {mensaje}")
+        self.error_code = error_code
+        self.http_code = http_code
+        self.error_message = mensaje
+
+
+# ---------------------------------------------------------------------
+# Valores de AQL
+# ---------------------------------------------------------------------
+def _orden(v):
+    """Clave de orden de AQL: null < bool < número < string < array < objeto."""
+    t = type(v)
+    if t is str:
+        return (3, v)
+    if v is None:
+        return (0,)
+    if t is bool:
+        return (1, v)
+    if t is int or t is float:
+        return (2, v)
+    if t is list:
+        return (4, tuple(_orden(x) for x in v))
+    if t is dict:
+        return (5, tuple((k, _orden(v[k])) for k in sorted(v)))
+    return (3, str(v))
+
+
+def _igual(a, b):
+    ta, tb = type(a), type(b)
+    if ta is tb and (ta is str or ta is int or ta is float or ta is bool or a is None):
+        return a == b
+    return _orden(a) == _orden(b)
+
+
+def _verdad(v):
+    if v is None or v is False:
+        return False
+    t = type(v)
+    if t is bool:
+        return v
+    if t is int or t is float:
+        return v != 0
+    if t is str:
+        return v != ""
+    return True
+
+
+def _num(v):
+    """TO_NUMBER de AQL."""
+    t = type(v)
+    if t is int or t is float:
+        return v
+    if v is None:
+        return 0
+    if t is bool:
+        return 1 if v else 0
+    if t is str:
+        try:
+            return _normalizar_num(float(v.strip())) if v.strip() else 0
+        except ValueError:
+            return 0
+    if t is list:
+        return _num(v[0]) if len(v) == 1 else 0
+    return 0
+
+
+def _normalizar_num(x):
+    """El servidor devuelve los double enteros sin decimales (3.0 -> 3)."""
+    if type(x) is float:
+        if math.isnan(x) or math.isinf(x):
+            return None
+        if x.is_integer() and abs(x) < 2 ** 53:
+            return int(x)
+    return x
+
+
+def _texto(v):
+    """TO_STRING de AQL."""
+    t = type(v)
+    if t is str:
+        return v
+    if v is None:
+        return ""
+    if t is bool:
+        return "true" if v else "false"
+    if t is int or t is float:
+        return str(_normalizar_num(v))
+    return json.dumps(v, separators=(",", ":"), ensure_ascii=False)
+
+
+def _es_numero(v):
+    t = type(v)
+    return t is int or t is float
+
+
+_PATRONES_LIKE = {}
+
+
+def _like(texto, patron, sin_mayusculas=False):
+    clave = (patron, sin_mayusculas)
+    regex = _PATRONES_LIKE.get(clave)
+    if regex is None:
+        partes = []
+        escapado = False
+        for c in patron:
+            if escapado:
+                partes.append(re.escape(c))
+                escapado = False
+            elif c == "\\":
+                escapado = True
+            elif c == "%":
+                partes.append(".*")
+            elif c == "_":
+                partes.append(".")
+            else:
+                partes.append(re.escape(c))
+        regex = re.compile("".join(partes), re.S | (re.I if sin_mayusculas else 0))
+        if len(_PATRONES_LIKE) > 1000:
+            _PATRONES_LIKE.clear()
+        _PATRONES_LIKE[clave] = regex
+    return regex.fullmatch(texto) is not None
+
+
+def _json(valor):
+    """Copia como la haría el viaje por HTTP (falla igual con tipos no JSON)."""
+    return json.loads(json.dumps(valor, separators=(",", ":")))
+
+
+# ---------------------------------------------------------------------
+# Tokens y parser
+# ---------------------------------------------------------------------
+_TOKEN = re.compile(r"""
+    (?P<espacio>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<numero>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<texto>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<bind>@@?[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<nombre>[A-Za-z_][A-Za-z0-9_]*|`[^`]+`)
+  | (?P<op>\[\s*\*|==|!=|<=|>=|&&|\|\||\.\.|=~|!~|[-+*/%<>=!?:.,()\[\]{}])
+""", re.X | re.S)
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+
+_INICIO_SUBCONSULTA = {"FOR", "LET", "RETURN", "INSERT", "UPDATE", "REPLACE", "REMOVE", "UPSERT", "COLLECT"}
+
+
+def _leer_texto(crudo):
+    cuerpo = crudo[1:-1]
+    if "\\" not in cuerpo:
+        return cuerpo
+    salida = []
+    i = 0
+    while i < len(cuerpo):
+        c = cuerpo[i]
+        if c == "\\" and i + 1 < len(cuerpo):
+            sig = cuerpo[i + 1]
+            if sig == "u" and i + 5 < len(cuerpo):
+                salida.append(chr(int(cuerpo[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            salida.append(_ESCAPES.get(sig, sig))
+            i += 2
+            continue
+        salida.append(c)
+        i += 1
+    return "".join(salida)
+
+
+def _tokenizar(query):
+    tokens = []
+    pos = 0
+    while pos < len(query):
+        m = _TOKEN.match(query, pos)
+        if m is None:
+            raise ErrorArangoMemoria(ERR_SINTAXIS, f"syntax error, unexpected '{query[pos]}' near position {pos}")
+        tipo = m.lastgroup
+        valor = m.group()
+        pos = m.end()
+        if tipo == "espacio":
+            continue
+        if tipo == "numero":
+            valor = float(valor) if any(c in valor for c in ".eE") else int(valor)
+        elif tipo == "texto":
+            valor = _leer_texto(valor)
+        elif tipo == "nombre" and valor.startswith("`"):
+            valor = valor[1:-1]
+        elif tipo == "op" and len(valor) > 1 and valor.startswith("["):
+            valor = "[*"
+        tokens.append((tipo, valor, m.start()))
+    tokens.append(("fin", None, len(query)))
+    return tokens
+
+
+class _Parser:
+    """AQL -> árbol de tuplas: ("for", var, expr), ("binario", op, a, b)..."""
+
+    def __init__(self, query):
+        self.tokens = _tokenizar(query)
+        self.i = 0
+        self.binds = set()
+        self._sin_in = False
+
+    # ---- utilidades ----
+    def _ver(self, desplazamiento=0):
+        return self.tokens[min(self.i + desplazamiento, len(self.tokens) - 1)]
+
+    def _es(self, palabra, desplazamiento=0):
+        tipo, valor, _ = self._ver(desplazamiento)
+        return tipo == "nombre" and valor.upper() == palabra
+
+    def _es_op(self, op, desplazamiento=0):
+        tipo, valor, _ = self._ver(desplazamiento)
+        return tipo == "op" and valor == op
+
+    def _avanzar(self):
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def _error(self, esperado=None):
+        tipo, valor, pos = self._ver()
+        encontrado = "end of query" if tipo == "fin" else repr(valor)
+        detalle = f", expecting {esperado}" if esperado else ""
+        raise ErrorArangoMemoria(ERR_SINTAXIS, f"syntax error, unexpected {encontrado}{detalle} near position {pos}")
+
+    def _palabra(self, palabra):
+        if not self._es(palabra):
+            self._error(palabra)
+        self._avanzar()
+
+    def _op(self, op):
+        if not self._es_op(op):
+            self._error(f"'{op}'")
+        self._avanzar()
+
+    def _nombre(self):
+        tipo, valor, _ = self._ver()
+        if tipo != "nombre":
+            self._error("identifier")
+        self._avanzar()
+        return valor
+
+    # ---- sentencias ----
+    def consulta(self):
+        bloque = self._bloque()
+        if self._ver()[0] != "fin":
+            self._error()
+        return bloque
+
+    def _bloque(self):
+        sentencias = []
+        while True:
+            tipo, valor, _ = self._ver()
+            if tipo == "fin" or (tipo == "op" and valor == ")"):
+                break
+            if tipo != "nombre":
+                self._error("statement")
+            sentencia = self._sentencia(valor.upper())
+            sentencias.append(sentencia)
+            if sentencia[0] == "for" and self._es("SEARCH"):
+                # FOR x IN vista SEARCH expr [OPTIONS {...}]
+                self._avanzar()
+                sentencias.append(("search", self._expresion()))
+                if self._es("OPTIONS"):
+                    self._avanzar()
+                    self._expresion()
+            if sentencia[0] == "return":
+                break
+        if not sentencias:
+            self._error("statement")
+        return sentencias
+
+    def _sentencia(self, palabra):
+        self._avanzar()
+        if palabra == "FOR":
+            var = self._nombre()
+            self._palabra("IN")
+            fuente = self._expresion()
+            if self._es("OPTIONS"):
+                self._avanzar()
+                self._expresion()
+            return ("for", var, fuente)
+        if palabra == "FILTER":
+            return ("filter", self._expresion())
+        if palabra == "LET":
+            var = self._nombre()
+            self._op("=")
+            return ("let", var, self._expresion())
+        if palabra == "SORT":
+            criterios = []
+            while True:
+                expr = self._expresion()
+                ascendente = True
+                if self._es("ASC"):
+                    self._avanzar()
+                elif self._es("DESC"):
+                    self._avanzar()
+                    ascendente = False
+                criterios.append((expr, ascendente))
+                if not self._es_op(","):
+                    break
+                self._avanzar()
+            return ("sort", criterios)
+        if palabra == "LIMIT":
+            primero = self._expresion()
+            if self._es_op(","):
+                self._avanzar()
+                return ("limit", primero, self._expresion())
+            return ("limit", ("lit", 0), primero)
+        if palabra == "COLLECT":
+            return self._collect()
+        if palabra == "RETURN":
+            distinto = False
+            if self._es("DISTINCT"):
+                self._avanzar()
+                distinto = True
+            return ("return", self._expresion(), distinto)
+        if palabra == "INSERT":
+            doc = self._expresion(sin_in=True)
+            if self._es("INTO"):
+                self._avanzar()
+            else:
+                self._palabra("IN")
+            return ("insert", doc, self._coleccion(), self._opciones())
+        if palabra in ("UPDATE", "REPLACE"):
+            clave = self._expresion(sin_in=True)
+            cambios = None
+            if self._es("WITH"):
+                self._avanzar()
+                cambios = self._expresion(sin_in=True)
+            self._palabra("IN")
+            return ("update", clave, cambios, self._coleccion(), self._opciones(), palabra == "REPLACE")
+        if palabra == "REMOVE":
+            clave = self._expresion(sin_in=True)
+            self._palabra("IN")
+            return ("remove", clave, self._coleccion(), self._opciones())
+        if palabra == "UPSERT":
+            busqueda = self._expresion(sin_in=True)
+            self._palabra("INSERT")
+            insertar = self._expresion(sin_in=True)
+            if self._es("UPDATE"):
+                reemplazar = False
+            elif self._es("REPLACE"):
+                reemplazar = True
+            else:
+                self._error("UPDATE or REPLACE")
+            self._avanzar()
+            cambios = self._expresion(sin_in=True)
+            self._palabra("IN")
+            return ("upsert", busqueda, insertar, cambios, self._coleccion(), self._opciones(), reemplazar)
+        self.i -= 1
+        self._error("statement")
+
+    def _coleccion(self):
+        tipo, valor, _ = self._ver()
+        if tipo == "bind" and valor.startswith("@@"):
+            self._avanzar()
+            self.binds.add(valor[1:])
+            return ("bind", valor[1:])
+        return ("lit", self._nombre())
+
+    def _opciones(self):
+        if self._es("OPTIONS"):
+            self._avanzar()
+            return self._expresion()
+        return None
+
+    def _collect(self):
+        grupos, agregados, into, cuenta = [], [], None, None
+        if not (self._es("WITH") or self._es("AGGREGATE") or self._es("INTO")):
+            while True:
+                var = self._nombre()
+                self._op("=")
+                grupos.append((var, self._expresion()))
+                if not self._es_op(","):
+                    break
+                self._avanzar()
+        if self._es("AGGREGATE"):
+            self._avanzar()
+            while True:
+                var = self._nombre()
+                self._op("=")
+                expr = self._expresion()
+                if expr[0] != "llamada" or len(expr[2]) != 1:
+                    raise ErrorArangoMemoria(ERR_SINTAXIS, "invalid aggregate expression")
+                agregados.append((var, expr[1], expr[2][0]))
+                if not self._es_op(","):
+                    break
+                self._avanzar()
+        if self._es("INTO"):
+            self._avanzar()
+            var = self._nombre()
+            expr = None
+            if self._es_op("="):
+                self._avanzar()
+                expr = self._expresion()
+            into = (var, expr)
+        if self._es("KEEP"):
+            self._error("WITH COUNT or OPTIONS")
+        if self._es("WITH"):
+            self._avanzar()
+            self._palabra("COUNT")
+            self._palabra("INTO")
+            cuenta = self._nombre()
+        if self._es("OPTIONS"):
+            self._avanzar()
+            self._expresion()
+        return ("collect", grupos, agregados, into, cuenta)
+
+    # ---- expresiones ----
+    def _expresion(self, sin_in=False):
+        previo = self._sin_in
+        self._sin_in = sin_in
+        try:
+            return self._ternario()
+        finally:
+            self._sin_in = previo
+
+    def _anidada(self, funcion):
+        """Dentro de (), [] y {} vuelve a valer el operador IN."""
+        previo = self._sin_in
+        self._sin_in = False
+        try:
+            return funcion()
+        finally:
+            self._sin_in = previo
+
+    def _ternario(self):
+        condicion = self._o()
+        if self._es_op("?"):
+            self._avanzar()
+            if self._es_op(":"):
+                self._avanzar()
+                return ("ternario", condicion, None, self._ternario())
+            si = self._ternario()
+            self._op(":")
+            return ("ternario", condicion, si, self._ternario())
+        return condicion
+
+    def _o(self):
+        izq = self._y()
+        while self._es("OR") or self._es_op("||"):
+            self._avanzar()
+            izq = ("o", izq, self._y())
+        return izq
+
+    def _y(self):
+        izq = self._igualdad()
+        while self._es("AND") or self._es_op("&&"):
+            self._avanzar()
+            izq = ("y", izq, self._igualdad())
+        return izq
+
+    def _cuantificador(self):
+        """'ALL ==', 'ANY IN', 'NONE <'...: (cuantificador, operador) o None."""
+        if not (self._es("ALL") or self._es("ANY") or self._es("NONE")):
+            return None
+        tipo, valor, _ = self._ver(1)
+        if tipo == "op" and valor in ("==", "!=", "<", "<=", ">", ">="):
+            return self._ver()[1].upper(), valor
+        if self._es("IN", 1):
+            return self._ver()[1].upper(), "IN"
+        if self._es("NOT", 1) and self._es("IN", 2):
+            return self._ver()[1].upper(), "NOT IN"
+        return None
+
+    def _igualdad(self):
+        izq = self._pertenencia()
+        while True:
+            cuantificado = self._cuantificador()
+            if cuantificado is not None:
+                cuantificador, op = cuantificado
+                self.i += 3 if op == "NOT IN" else 2
+                izq = ("cuantificado", cuantificador, op, izq, self._pertenencia())
+            elif self._es_op("==") or self._es_op("!="):
+                op = self._avanzar()[1]
+                izq = ("binario", op, izq, self._pertenencia())
+            elif self._es_op("=~") or self._es_op("!~"):
+                op = self._avanzar()[1]
+                izq = ("regex", izq, self._pertenencia(), op == "!~")
+            elif self._es("LIKE"):
+                self._avanzar()
+                izq = ("like", izq, self._pertenencia(), False)
+            elif self._es("NOT") and self._es("LIKE", 1):
+                self.i += 2
+                izq = ("like", izq, self._pertenencia(), True)
+            else:
+                return izq
+
+    def _pertenencia(self):
+        izq = self._comparacion()
+        while not self._sin_in:
+            if self._es("IN"):
+                self._avanzar()
+                izq = ("in", izq, self._comparacion(), False)
+            elif self._es("NOT") and self._es("IN", 1):
+                self.i += 2
+                izq = ("in", izq, self._comparacion(), True)
+            else:
+                break
+        return izq
+
+    def _comparacion(self):
+        izq = self._rango()
+        while self._ver()[0] == "op" and self._ver()[1] in ("<", "<=", ">", ">="):
+            op = self._avanzar()[1]
+            izq = ("binario", op, izq, self._rango())
+        return izq
+
+    def _rango(self):
+        izq = self._suma()
+        if self._es_op(".."):
+            self._avanzar()
+            return ("rango", izq, self._suma())
+        return izq
+
+    def _suma(self):
+        izq = self._producto()
+        while self._es_op("+") or self._es_op("-"):
+            op = self._avanzar()[1]
+            izq = ("binario", op, izq, self._producto())
+        return izq
+
+    def _producto(self):
+        izq = self._unario()
+        while self._es_op("*") or self._es_op("/") or self._es_op("%"):
+            op = self._avanzar()[1]
+            izq = ("binario", op, izq, self._unario())
+        return izq
+
+    def _unario(self):
+        if self._es("NOT") or self._es_op("!"):
+            self._avanzar()
+            return ("no", self._unario())
+        if self._es_op("-"):
+            self._avanzar()
+            return ("negativo", self._unario())
+        if self._es_op("+"):
+            self._avanzar()
+            return ("binario", "+", ("lit", 0), self._unario())
+        return self._postfijo(self._primario())
+
+    def _postfijo(self, nodo):
+        while True:
+            if self._es_op("."):
+                self._avanzar()
+                nodo = ("atributo", nodo, self._nombre())
+            elif self._es_op("[*"):
+                self._avanzar()
+                nodo = self._anidada(lambda: self._expansion(nodo))
+            elif self._es_op("["):
+                self._avanzar()
+                indice = self._anidada(self._ternario)
+                self._op("]")
+                nodo = ("indice", nodo, indice)
+            else:
+                return nodo
+
+    def _expansion(self, base):
+        filtro = limite = retorno = None
+        if self._es("FILTER"):
+            self._avanzar()
+            filtro = self._ternario()
+        if self._es("LIMIT"):
+            self._avanzar()
+            limite = self._ternario()
+        if self._es("RETURN"):
+            self._avanzar()
+            retorno = self._ternario()
+        self._op("]")
+        cola = []
+        while True:
+            if self._es_op("."):
+                self._avanzar()
+                cola.append(("atributo", self._nombre()))
+            elif self._es_op("["):
+                self._avanzar()
+                indice = self._ternario()
+                self._op("]")
+                cola.append(("indice", indice))
+            else:
+                break
+        return ("expansion", base, filtro, limite, retorno, cola)
+
+    def _primario(self):
+        tipo, valor, _ = self._ver()
+        if tipo == "numero" or tipo == "texto":
+            self._avanzar()
+            return ("lit", valor)
+        if tipo == "bind":
+            # @x -> bind var "x"; @@coleccion -> bind var "@coleccion"
+            self._avanzar()
+            self.binds.add(valor[1:])
+            return ("bind", valor[1:])
+        if tipo == "op" and valor == "(":
+            self._avanzar()
+            if self._ver()[0] == "nombre" and self._ver()[1].upper() in _INICIO_SUBCONSULTA:
+                nodo = ("subconsulta", self._anidada(self._bloque))
+            else:
+                nodo = self._anidada(self._ternario)
+            self._op(")")
+            return nodo
+        if tipo == "op" and valor == "[":
+            self._avanzar()
+            return ("arreglo", self._anidada(self._elementos))
+        if tipo == "op" and valor == "{":
+            self._avanzar()
+            return ("objeto", self._anidada(self._atributos))
+        if tipo == "nombre":
+            self._avanzar()
+            if self._es_op("("):
+                self._avanzar()
+                argumentos = self._anidada(lambda: self._elementos(")"))
+                return ("llamada", valor.upper(), argumentos)
+            mayus = valor.upper()
+            if mayus == "NULL":
+                return ("lit", None)
+            if mayus == "TRUE":
+                return ("lit", True)
+            if mayus == "FALSE":
+                return ("lit", False)
+            return ("var", valor)
+        self._error("expression")
+
+    def _elementos(self, cierre="]"):
+        elementos = []
+        while not self._es_op(cierre):
+            if self._ver()[0] == "nombre" and self._ver()[1].upper() in _INICIO_SUBCONSULTA \
+                    and not self._es_op("(", 1) and cierre == ")":
+                # MERGE(FOR ...) / LENGTH(FOR ...): subconsulta sin paréntesis propios
+                elementos.append(("subconsulta", self._bloque()))
+            else:
+                elementos.append(self._ternario())
+            if not self._es_op(","):
+                break
+            self._avanzar()
+        self._op(cierre)
+        return elementos
+
+    def _atributos(self):
+        atributos = []
+        while not self._es_op("}"):
+            tipo, valor, _ = self._ver()
+            if tipo == "op" and valor == "[":
+                self._avanzar()
+                clave = self._ternario()
+                self._op("]")
+            elif tipo == "texto" or tipo == "nombre":
+                self._avanzar()
+                clave = ("lit", valor)
+                if tipo == "nombre" and (self._es_op(",") or self._es_op("}")):
+                    atributos.append((clave, ("var", valor)))
+                    if self._es_op(","):
+                        self._avanzar()
+                    continue
+            elif tipo == "bind":
+                self._avanzar()
+                self.binds.add(valor[1:])
+                clave = ("bind", valor[1:])
+            else:
+                self._error("attribute name")
+            self._op(":")
+            atributos.append((clave, self._ternario()))
+            if not self._es_op(","):
+                break
+            self._avanzar()
+        self._op("}")
+        return atributos
+
+
+def _variables_libres(nodo, salida=None):
+    """Nombres de variables que aparecen en una expresión (para el optimizador)."""
+    if salida is None:
+        salida = set()
+    if isinstance(nodo, tuple):
+        if nodo and nodo[0] == "var":
+            salida.add(nodo[1])
+            return salida
+        for parte in nodo:
+            _variables_libres(parte, salida)
+    elif isinstance(nodo, list):
+        for parte in nodo:
+            _variables_libres(parte, salida)
+    return salida
+
+
+def _conjunciones(expr):
+    if expr[0] == "y":
+        return _conjunciones(expr[1]) + _conjunciones(expr[2])
+    return [expr]
+
+
+def _atributo_de(expr, var):
+    """'v.campo' -> 'campo' si expr es un atributo directo de la variable."""
+    if expr[0] == "atributo" and expr[1] == ("var", var):
+        return expr[2]
+    return None
+
+
+def _arreglo_de(expr, var):
+    """'v.campo[*]' -> 'campo[*]' (el campo de un índice de arreglo)."""
+    if expr[0] == "expansion" and expr[2:5] == (None, None, None) and not expr[5]:
+        campo = _atributo_de(expr[1], var)
+        if campo is not None:
+            return f"{campo}[*]"
+    return None
+
+
+_INVERSO = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "=="}
+
+
+# ---------------------------------------------------------------------
+# Funciones de AQL
+# ---------------------------------------------------------------------
+def _arreglo(v):
+    return v if type(v) is list else []
+
+
+def _f_length(ej, v):
+    t = type(v)
+    if t is list or t is dict or t is str:
+        return len(v)
+    if v is None:
+        return 0
+    if t is bool:
+        return 1 if v else 0
+    return len(_texto(v))
+
+
+def _f_sum(ej, v):
+    total = 0
+    for x in _arreglo(v):
+        if x is not None:
+            total += _num(x)
+    return _normalizar_num(total)
+
+
+def _f_min(ej, v):
+    valores = [x for x in _arreglo(v) if x is not None]
+    return min(valores, key=_orden) if valores else None
+
+
+def _f_max(ej, v):
+    valores = [x for x in _arreglo(v) if x is not None]
+    return max(valores, key=_orden) if valores else None
+
+
+def _f_average(ej, v):
+    valores = [_num(x) for x in _arreglo(v) if x is not None]
+    return _normalizar_num(sum(valores) / len(valores)) if valores else None
+
+
+def _f_unique(ej, v):
+    vistos = set()
+    salida = []
+    for x in _arreglo(v):
+        clave = _orden(x)
+        if clave not in vistos:
+            vistos.add(clave)
+            salida.append(x)
+    return salida
+
+
+def _f_merge(ej, *objetos):
+    if len(objetos) == 1 and type(objetos[0]) is list:
+        objetos = objetos[0]
+    resultado = {}
+    for obj in objetos:
+        if type(obj) is not dict:
+            return None
+        resultado.update(obj)
+    return resultado
+
+
+def _nombres(argumentos):
+    nombres = set()
+    for a in argumentos:
+        if type(a) is list:
+            nombres.update(_texto(x) for x in a)
+        else:
+            nombres.add(_texto(a))
+    return nombres
+
+
+def _f_unset(ej, doc, *nombres):
+    if type(doc) is not dict:
+        return None
+    quitar = _nombres(nombres)
+    return {k: v for k, v in doc.items() if k not in quitar}
+
+
+def _f_keep(ej, doc, *nombres):
+    if type(doc) is not dict:
+        return None
+    dejar = _nombres(nombres)
+    return {k: v for k, v in doc.items() if k in dejar}
+
+
+def _f_zip(ej, claves, valores):
+    if type(claves) is not list or type(valores) is not list or len(claves) != len(valores):
+        return None
+    return {_texto(k): v for k, v in zip(claves, valores)}
+
+
+def _f_not_null(ej, *valores):
+    for v in valores:
+        if v is not None:
+            return v
+    return None
+
+
+def _f_first(ej, v):
+    return v[0] if type(v) is list and v else None
+
+
+def _f_last(ej, v):
+    return v[-1] if type(v) is list and v else None
+
+
+def _f_nth(ej, v, posicion):
+    posicion = int(_num(posicion))
+    return v[posicion] if type(v) is list and 0 <= posicion < len(v) else None
+
+
+def _f_substring(ej, texto, inicio, largo=None):
+    texto = _texto(texto)
+    inicio = int(_num(inicio))
+    if inicio < 0:
+        inicio = max(0, len(texto) + inicio)
+    if largo is None:
+        return texto[inicio:]
+    return texto[inicio:inicio + max(0, int(_num(largo)))]
+
+
+def _f_concat(ej, *valores):
+    partes = []
+    for v in valores:
+        if type(v) is list:
+            partes.extend(_texto(x) for x in v if x is not None)
+        elif v is not None:
+            partes.append(_texto(v))
+    return "".join(partes)
+
+
+def _f_concat_separator(ej, separador, *valores):
+    partes = []
+    for v in valores:
+        if type(v) is list:
+            partes.extend(_texto(x) for x in v if x is not None)
+        elif v is not None:
+            partes.append(_texto(v))
+    return _texto(separador).join(partes)
+
+
+def _f_contains(ej, texto, buscado, devolver_indice=False):
+    posicion = _texto(texto).find(_texto(buscado))
+    return posicion if _verdad(devolver_indice) else posicion >= 0
+
+
+def _f_split(ej, texto, separador=None, limite=None):
+    texto = _texto(texto)
+    if separador is None:
+        partes = [texto]
+    elif separador == "":
+        partes = list(texto)
+    else:
+        partes = texto.split(_texto(separador))
+    if limite is not None and _num(limite) >= 0:
+        partes = partes[:int(_num(limite))]
+    return partes
+
+
+def _f_substitute(ej, texto, buscado, reemplazo=None, limite=None):
+    texto = _texto(texto)
+    if type(buscado) is dict:
+        pares = list(buscado.items())
+    else:
+        buscados = buscado if type(buscado) is list else [buscado]
+        reemplazos = reemplazo if type(reemplazo) is list else [reemplazo] * len(buscados)
+        pares = [(b, reemplazos[i] if i < len(reemplazos) else "") for i, b in enumerate(buscados)]
+    cantidad = -1 if limite is None else int(_num(limite))
+    for b, r in pares:
+        texto = texto.replace(_texto(b), _texto(r), cantidad)
+    return texto
+
+
+def _f_trim(ej, texto, caracteres=None, tipo=0):
+    texto = _texto(texto)
+    quitar = None if caracteres is None or _es_numero(caracteres) else _texto(caracteres)
+    if _es_numero(caracteres):
+        tipo = caracteres
+    if tipo == 1:
+        return texto.lstrip(quitar)
+    if tipo == 2:
+        return texto.rstrip(quitar)
+    return texto.strip(quitar)
+
+
+def _f_to_bool(ej, v):
+    return _verdad(v)
+
+
+def _f_to_array(ej, v):
+    if v is None:
+        return []
+    if type(v) is list:
+        return v
+    if type(v) is dict:
+        return list(v.values())
+    return [v]
+
+
+def _f_union(ej, *arreglos):
+    salida = []
+    for a in arreglos:
+        salida.extend(_arreglo(a))
+    return salida
+
+
+def _f_intersection(ej, *arreglos):
+    if not arreglos:
+        return []
+    comunes = None
+    for a in arreglos:
+        claves = {_orden(x) for x in _arreglo(a)}
+        comunes = claves if comunes is None else comunes & claves
+    return [x for x in _f_unique(ej, arreglos[0]) if _orden(x) in comunes]
+
+
+def _f_minus(ej, base, *otros):
+    quitar = set()
+    for a in otros:
+        quitar.update(_orden(x) for x in _arreglo(a))
+    return [x for x in _f_unique(ej, base) if _orden(x) not in quitar]
+
+
+def _f_append(ej, arreglo, valores, unicos=False):
+    salida = list(_arreglo(arreglo))
+    nuevos = valores if type(valores) is list else [valores]
+    if _verdad(unicos):
+        vistos = {_orden(x) for x in salida}
+        for x in nuevos:
+            if _orden(x) not in vistos:
+                vistos.add(_orden(x))
+                salida.append(x)
+        return salida
+    return salida + nuevos
+
+
+def _f_push(ej, arreglo, valor, unico=False):
+    salida = list(_arreglo(arreglo))
+    if _verdad(unico) and any(_igual(x, valor) for x in salida):
+        return salida
+    salida.append(valor)
+    return salida
+
+
+def _f_flatten(ej, arreglo, profundidad=1):
+    def aplanar(valores, nivel):
+        salida = []
+        for x in valores:
+            if type(x) is list and nivel > 0:
+                salida.extend(aplanar(x, nivel - 1))
+            else:
+                salida.append(x)
+        return salida
+    return aplanar(_arreglo(arreglo), int(_num(profundidad)))
+
+
+def _f_sorted(ej, arreglo):
+    return sorted(_arreglo(arreglo), key=_orden)
+
+
+def _f_reverse(ej, v):
+    if type(v) is str:
+        return v[::-1]
+    return list(reversed(_arreglo(v)))
+
+
+def _f_slice(ej, arreglo, inicio, largo=None):
+    arreglo = _arreglo(arreglo)
+    inicio = int(_num(inicio))
+    if inicio < 0:
+        inicio = max(0, len(arreglo) + inicio)
+    if largo is None:
+        return arreglo[inicio:]
+    largo = int(_num(largo))
+    fin = inicio + largo if largo >= 0 else len(arreglo) + largo
+    return arreglo[inicio:fin]
+
+
+def _f_position(ej, arreglo, valor, devolver_indice=False):
+    for i, x in enumerate(_arreglo(arreglo)):
+        if _igual(x, valor):
+            return i if _verdad(devolver_indice) else True
+    return -1 if _verdad(devolver_indice) else False
+
+
+def _f_range(ej, inicio, fin, paso=None):
+    inicio, fin = _num(inicio), _num(fin)
+    paso = _num(paso) if paso is not None else (1 if fin >= inicio else -1)
+    if paso == 0:
+        return []
+    salida = []
+    x = inicio
+    while (paso > 0 and x <= fin) or (paso < 0 and x >= fin):
+        salida.append(_normalizar_num(x))
+        x += paso
+    return salida
+
+
+def _f_has(ej, doc, atributo):
+    return type(doc) is dict and _texto(atributo) in doc
+
+
+def _f_attributes(ej, doc, sin_internos=False, ordenar=False):
+    if type(doc) is not dict:
+        return None
+    claves = [k for k in doc if not (_verdad(sin_internos) and k.startswith("_"))]
+    return sorted(claves) if _verdad(ordenar) else claves
+
+
+def _f_values(ej, doc, sin_internos=False):
+    if type(doc) is not dict:
+        return None
+    return [v for k, v in doc.items() if not (_verdad(sin_internos) and k.startswith("_"))]
+
+
+def _f_round(ej, v):
+    return _normalizar_num(math.floor(_num(v) + 0.5))
+
+
+def _f_date_now(ej):
+    return int(time.time() * 1000)
+
+
+def _f_date_iso8601(ej, fecha):
+    if _es_numero(fecha):
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(fecha / 1000)) + ".%03dZ" % (int(fecha) % 1000)
+    return _texto(fecha)
+
+
+def _f_document(ej, coleccion, clave=None):
+    if clave is None:
+        ids = coleccion
+        if type(ids) is list:
+            return [d for d in (_f_document(ej, i) for i in ids) if d is not None]
+        if type(ids) is not str or "/" not in ids:
+            return None
+        coleccion, clave = ids.split("/", 1)
+        return ej.db._documento(coleccion, clave, ej)
+    if type(clave) is list:
+        return [d for d in (ej.db._documento(coleccion, _texto(c), ej) for c in clave) if d is not None]
+    if type(clave) is not str:
+        return None
+    if "/" in clave:
+        coleccion, clave = clave.split("/", 1)
+    return ej.db._documento(_texto(coleccion), clave, ej)
+
+
+def _f_collections(ej):
+    return [{"_id": n, "name": n} for n in sorted(ej.db._colecciones)]
+
+
+def _f_like(ej, texto, patron, sin_mayusculas=False):
+    return _like(_texto(texto), _texto(patron), _verdad(sin_mayusculas))
+
+
+def _f_regex_test(ej, texto, patron, sin_mayusculas=False):
+    return re.search(_texto(patron), _texto(texto), re.I if _verdad(sin_mayusculas) else 0) is not None
+
+
+def _f_tokens(ej, texto, analizador="identity"):
+    if type(texto) is list:
+        return [_f_tokens(ej, t, analizador) for t in texto]
+    if type(texto) is not str:
+        return []
+    return _analizar(ej.db._analizador(analizador), texto)
+
+
+def _f_bm25(ej, doc, k=1.2, b=0.75):
+    # El puntaje lo calcula el SEARCH de la vista (con k = 1.2 y b = 0.75)
+    return ej.puntajes.get(doc.get("_id"), 0.0) if type(doc) is dict else 0.0
+
+
+def _tipo(comprobar):
+    return lambda ej, v: comprobar(v)
+
+
+_FUNCIONES = {
+    "LENGTH": _f_length, "COUNT": _f_length, "CHAR_LENGTH": lambda ej, v: len(_texto(v)),
+    "SUM": _f_sum, "MIN": _f_min, "MAX": _f_max, "AVERAGE": _f_average, "AVG": _f_average,
+    "UNIQUE": _f_unique, "SORTED_UNIQUE": lambda ej, v: _f_sorted(ej, _f_unique(ej, v)),
+    "COUNT_DISTINCT": lambda ej, v: len(_f_unique(ej, v)), "COUNT_UNIQUE": lambda ej, v: len(_f_unique(ej, v)),
+    "MERGE": _f_merge, "UNSET": _f_unset, "KEEP": _f_keep, "ZIP": _f_zip,
+    "NOT_NULL": _f_not_null, "FIRST_LIST": lambda ej, *v: next((x for x in v if type(x) is list and x), None),
+    "FIRST": _f_first, "LAST": _f_last, "NTH": _f_nth,
+    "SUBSTRING": _f_substring, "CONCAT": _f_concat, "CONCAT_SEPARATOR": _f_concat_separator,
+    "LOWER": lambda ej, v: _texto(v).lower(), "UPPER": lambda ej, v: _texto(v).upper(),
+    "CONTAINS": _f_contains, "STARTS_WITH": lambda ej, t, p: _texto(t).startswith(_texto(p)),
+    "LEFT": lambda ej, t, n: _texto(t)[:int(_num(n))],
+    "RIGHT": lambda ej, t, n: _texto(t)[-int(_num(n)):] if int(_num(n)) > 0 else "",
+    "SPLIT": _f_split, "SUBSTITUTE": _f_substitute, "TRIM": _f_trim,
+    "LTRIM": lambda ej, t, c=None: _f_trim(ej, t, c, 1), "RTRIM": lambda ej, t, c=None: _f_trim(ej, t, c, 2),
+    "LIKE": _f_like, "REGEX_TEST": _f_regex_test,
+    "TO_NUMBER": lambda ej, v: _num(v), "TO_STRING": lambda ej, v: _texto(v),
+    "TO_BOOL": _f_to_bool, "TO_ARRAY": _f_to_array, "TO_LIST": _f_to_array,
+    "IS_NULL": _tipo(lambda v: v is None), "IS_BOOL": _tipo(lambda v: type(v) is bool),
+    "IS_NUMBER": _tipo(_es_numero), "IS_STRING": _tipo(lambda v: type(v) is str),
+    "IS_ARRAY": _tipo(lambda v: type(v) is list), "IS_LIST": _tipo(lambda v: type(v) is list),
+    "IS_OBJECT": _tipo(lambda v: type(v) is dict), "IS_DOCUMENT": _tipo(lambda v: type(v) is dict),
+    "UNION": _f_union, "UNION_DISTINCT": lambda ej, *a: _f_unique(ej, _f_union(ej, *a)),
+    "INTERSECTION": _f_intersection, "MINUS": _f_minus,
+    "APPEND": _f_append, "PUSH": _f_push, "FLATTEN": _f_flatten,
+    "SORTED": _f_sorted, "REVERSE": _f_reverse, "SLICE": _f_slice, "POSITION": _f_position,
+    "RANGE": _f_range, "HAS": _f_has, "ATTRIBUTES": _f_attributes, "VALUES": _f_values,
+    "ROUND": _f_round, "FLOOR": lambda ej, v: _normalizar_num(math.floor(_num(v))),
+    "CEIL": lambda ej, v: _normalizar_num(math.ceil(_num(v))), "ABS": lambda ej, v: abs(_num(v)),
+    "DATE_NOW": _f_date_now, "DATE_ISO8601": _f_date_iso8601,
+    "DOCUMENT": _f_document, "COLLECTIONS": _f_collections,
+    "TOKENS": _f_tokens, "BM25": _f_bm25,
+    # Fuera de SEARCH sólo devuelven la expresión
+    "ANALYZER": lambda ej, v, analizador: v, "BOOST": lambda ej, v, factor: v,
+}
+
+# Funciones válidas en COLLECT ... AGGREGATE (reciben la lista del grupo)
+_AGREGADOS = {
+    "SUM": _f_sum, "MIN": _f_min, "MAX": _f_max, "AVERAGE": _f_average, "AVG": _f_average,
+    "COUNT": lambda ej, v: len(v), "LENGTH": lambda ej, v: len(v),
+    "UNIQUE": _f_unique, "SORTED_UNIQUE": lambda ej, v: _f_sorted(ej, _f_unique(ej, v)),
+    "COUNT_DISTINCT": lambda ej, v: len(_f_unique(ej, v)), "COUNT_UNIQUE": lambda ej, v: len(_f_unique(ej, v)),
+    "PUSH": lambda ej, v: list(v),
+}
+
+
+# ---------------------------------------------------------------------
+# Compilación a funciones de Python
+# ---------------------------------------------------------------------
+class _Ejecucion:
+    """Estado de una ejecución: bind vars, estadísticas y registro para deshacer."""
+
+    def __init__(self, db, bind_vars):
+        self.db = db
+        self.bind = bind_vars
+        self.scanned_full = 0
+        self.scanned_index = 0
+        self.filtered = 0
+        self.modified = 0
+        self.ignored = 0
+        self.deshacer = []
+        self.puntajes = {}
+
+
+class _Extremo:
+    """Mayor que cualquier clave (para buscar el final de un rango)."""
+
+    def __lt__(self, otro):
+        return False
+
+    def __gt__(self, otro):
+        return True
+
+    def __eq__(self, otro):
+        return False
+
+    __hash__ = object.__hash__
+
+
+_MAYOR = _Extremo()
+
+
+class _Compilador:
+    def __init__(self, db):
+        self.db = db
+        self.nodos = []
+        self.colecciones = {}
+
+    def _nodo(self, tipo, **datos):
+        nodo = {"type": tipo, "id": len(self.nodos) + 1, **datos}
+        self.nodos.append(nodo)
+        return nodo
+
+    # ---- bloques ----
+    def bloque(self, sentencias, alcance):
+        alcance = set(alcance)
+        if not self.nodos:
+            self._nodo("SingletonNode")
+        pasos = []
+        retorna = False
+        primer_for = True
+        i = 0
+        while i < len(sentencias):
+            s = sentencias[i]
+            tipo = s[0]
+            if tipo == "for" and self._vista(s[2], alcance) is not None:
+                busqueda = None
+                if i + 1 < len(sentencias) and sentencias[i + 1][0] == "search":
+                    busqueda = sentencias[i + 1][1]
+                pasos.append(self._for_vista(s, busqueda, alcance, primer_for))
+                primer_for = False
+                alcance.add(s[1])
+                i += 1 if busqueda is None else 2
+                continue
+            if tipo == "for":
+                paso, omitir = self._for(s, sentencias[i + 1:], alcance, primer_for)
+                primer_for = False
+                alcance.add(s[1])
+                pasos.append(paso)
+                if omitir is not None:
+                    # El índice ya entrega las filas en el orden del SORT: se omite
+                    for intermedia in sentencias[i + 1:i + 1 + omitir]:
+                        pasos.append(self._sentencia(intermedia, alcance))
+                    i += omitir + 2
+                    continue
+            elif tipo == "collect":
+                pasos.append(self._collect(s, alcance))
+                alcance = self._alcance_collect(s, alcance)
+            else:
+                pasos.append(self._sentencia(s, alcance))
+                if tipo == "return":
+                    retorna = True
+            i += 1
+
+        def ejecutar(env, ej):
+            ctx = {"base": env, "base_claves": frozenset(env)}
+            filas = iter((env,))
+            for paso in pasos:
+                filas = paso(filas, ej, ctx)
+            if retorna:
+                return list(filas)
+            for _ in filas:
+                pass
+            return []
+        return ejecutar
+
+    def _alcance_collect(self, s, alcance):
+        _, grupos, agregados, into, cuenta = s
+        nuevo = set(self._alcance_base)
+        nuevo.update(v for v, _ in grupos)
+        nuevo.update(v for v, _, _ in agregados)
+        if into:
+            nuevo.add(into[0])
+        if cuenta:
+            nuevo.add(cuenta)
+        return nuevo
+
+    def _sentencia(self, s, alcance):
+        tipo = s[0]
+        if tipo == "filter":
+            self._nodo("FilterNode")
+            condicion = self.expr(s[1], alcance)
+
+            def filtrar(filas, ej, ctx):
+                for env in filas:
+                    if _verdad(condicion(env, ej)):
+                        yield env
+                    else:
+                        ej.filtered += 1
+            return filtrar
+        if tipo == "let":
+            self._nodo("CalculationNode", outVariable={"name": s[1]})
+            valor = self.expr(s[2], alcance)
+            var = s[1]
+            alcance.add(var)
+
+            def asignar(filas, ej, ctx):
+                for env in filas:
+                    nuevo = dict(env)
+                    nuevo[var] = valor(env, ej)
+                    yield nuevo
+            return asignar
+        if tipo == "sort":
+            self._nodo("SortNode")
+            criterios = [(self.expr(e, alcance), asc) for e, asc in s[1]]
+
+            def ordenar(filas, ej, ctx):
+                filas = list(filas)
+                # Ordenamientos estables del último criterio al primero
+                for criterio, asc in reversed(criterios):
+                    filas.sort(key=lambda env: _orden(criterio(env, ej)), reverse=not asc)
+                return iter(filas)
+            return ordenar
+        if tipo == "limit":
+            self._nodo("LimitNode")
+            desde = self.expr(s[1], alcance)
+            cantidad = self.expr(s[2], alcance)
+
+            def limitar(filas, ej, ctx):
+                inicio = int(_num(desde(ctx["base"], ej)))
+                total = int(_num(cantidad(ctx["base"], ej)))
+                return islice(filas, inicio, inicio + total)
+            return limitar
+        if tipo == "return":
+            self._nodo("ReturnNode")
+            valor = self.expr(s[1], alcance)
+            distinto = s[2]
+
+            def devolver(filas, ej, ctx):
+                vistos = set()
+                for env in filas:
+                    v = valor(env, ej)
+                    if distinto:
+                        clave = _orden(v)
+                        if clave in vistos:
+                            continue
+                        vistos.add(clave)
+                    yield v
+            return devolver
+        if tipo in ("insert", "update", "remove", "upsert"):
+            return self._modificacion(s, alcance)
+        if tipo == "search":
+            raise ErrorArangoMemoria(ERR_SINTAXIS, "SEARCH is only allowed right after FOR over a view")
+        raise ErrorArangoMemoria(ERR_SINTAXIS, f"unsupported statement {tipo}")
+
+    # ---- FOR y elección de índice ----
+    def _for(self, s, siguientes, alcance, primer_for):
+        """Devuelve el paso del FOR y, si el SORT que sigue lo resuelve el índice, su posición."""
+        _, var, fuente = s
+        if primer_for:
+            self._alcance_base = set(alcance)
+        nombre = None
+        if fuente[0] == "var" and fuente[1] not in alcance:
+            nombre = fuente[1]
+        elif fuente[0] == "bind" and fuente[1].startswith("@"):
+            nombre = fuente
+        omitir = None
+        if nombre is not None:
+            acceso = self._elegir_indice(nombre, var, siguientes)
+            descendente = False
+            if acceso is not None and acceso["orden"] is not None:
+                omitir, descendente = self._sort_resuelto(siguientes, var, acceso["orden"])
+            datos = {"collection": nombre if isinstance(nombre, str) else None, "outVariable": {"name": var}}
+            if acceso is not None:
+                self._nodo("IndexNode", indexes=[acceso["indice"].describir()], reverse=descendente, **datos)
+            else:
+                self._nodo("EnumerateCollectionNode", **datos)
+            if isinstance(nombre, str):
+                self.colecciones.setdefault(nombre, "read")
+            obtener = self._fuente_coleccion(nombre, acceso, descendente, alcance)
+        else:
+            self._nodo("EnumerateListNode", outVariable={"name": var})
+            valor = self.expr(fuente, alcance)
+
+            def obtener(env, ej):
+                v = valor(env, ej)
+                return v if type(v) is list else []
+
+        def recorrer(filas, ej, ctx):
+            for env in filas:
+                if primer_for:
+                    ctx["base"] = env
+                    ctx["base_claves"] = frozenset(env)
+                for x in obtener(env, ej):
+                    nuevo = dict(env)
+                    nuevo[var] = x
+                    yield nuevo
+        return recorrer, omitir
+
+    def _elegir_indice(self, nombre, var, siguientes):
+        """
+        Busca en los FILTER que siguen al FOR condiciones sobre un atributo
+        indexado: igualdad, IN o rango. Sin ellas, un SORT por un atributo
+        indexado también se resuelve recorriendo el índice en orden.
+        """
+        col = self.db._colecciones.get(nombre) if isinstance(nombre, str) else None
+        if col is None:
+            return None
+        condiciones = []
+        for s in siguientes:
+            if s[0] != "filter":
+                break
+            condiciones.extend(_conjunciones(s[1]))
+
+        def independiente(expr):
+            return var not in _variables_libres(expr)
+
+        igualdades, inclusiones, rangos = {}, {}, {}
+        for c in condiciones:
+            if c[0] == "binario" and c[1] in _INVERSO:
+                op, izq, der = c[1], c[2], c[3]
+                campo = _atributo_de(izq, var)
+                if campo is None:
+                    campo = _atributo_de(der, var)
+                    izq, der, op = der, izq, _INVERSO[op]
+                if campo is None or not independiente(der):
+                    continue
+                if op == "==":
+                    igualdades.setdefault(campo, der)
+                else:
+                    rangos.setdefault(campo, []).append((op, der))
+            elif c[0] == "in" and not c[3]:
+                campo = _atributo_de(c[1], var)
+                if campo is not None and independiente(c[2]):
+                    inclusiones.setdefault(campo, c[2])
+                # 'valor IN v.campo[*]': igualdad sobre un índice de arreglo
+                campo = _arreglo_de(c[2], var)
+                if campo is not None and independiente(c[1]):
+                    igualdades.setdefault(campo, c[1])
+
+        if "_key" in igualdades:
+            return {"indice": col.primario, "modo": "igual", "expr": igualdades["_key"], "orden": None}
+        if "_key" in inclusiones:
+            return {"indice": col.primario, "modo": "in", "expr": inclusiones["_key"], "orden": None}
+        for modo, candidatos in (("igual", igualdades), ("in", inclusiones)):
+            for indice in col.indices:
+                if indice.campo in candidatos:
+                    return {"indice": indice, "modo": modo, "expr": candidatos[indice.campo], "orden": None}
+        for indice in col.indices:
+            if indice.campo in rangos and not indice.sparse and not indice.arreglo:
+                return {"indice": indice, "modo": "rango", "expr": rangos[indice.campo],
+                        "orden": indice.campo}
+        for s in siguientes:
+            if s[0] in ("filter", "let"):
+                continue
+            if s[0] == "sort":
+                campo = _atributo_de(s[1][0][0], var)
+                for indice in col.indices:
+                    if campo is not None and indice.campo == campo and not indice.sparse and not indice.arreglo:
+                        return {"indice": indice, "modo": "todo", "expr": None, "orden": campo}
+            break
+        return None
+
+    @staticmethod
+    def _sort_resuelto(siguientes, var, campo):
+        """
+        Posición del SORT (tras FILTER/LET) si pide 'v.campo' o 'v.campo, v._key'
+        en una sola dirección, que es el orden del índice; y si es descendente.
+        """
+        for j, s in enumerate(siguientes):
+            if s[0] in ("filter", "let"):
+                continue
+            if s[0] != "sort":
+                break
+            criterios = s[1]
+            direcciones = {asc for _, asc in criterios}
+            if _atributo_de(criterios[0][0], var) != campo or len(direcciones) != 1:
+                break
+            if len(criterios) == 1 or (len(criterios) == 2 and _atributo_de(criterios[1][0], var) == "_key"):
+                return j, not criterios[0][1]
+            break
+        return None, False
+
+    def _fuente_coleccion(self, nombre, acceso, descendente, alcance):
+        nombre_fijo = nombre if isinstance(nombre, str) else None
+        bind_coleccion = None if nombre_fijo else nombre[1]
+
+        def coleccion(ej):
+            return ej.db._coleccion(nombre_fijo or _texto(ej.bind[bind_coleccion]))
+
+        def recorrido_completo(col, ej):
+            for doc in list(col.docs.values()):
+                ej.scanned_full += 1
+                yield doc
+
+        if acceso is None:
+            return lambda env, ej: recorrido_completo(coleccion(ej), ej)
+
+        indice = acceso["indice"]
+        modo = acceso["modo"]
+        if modo in ("igual", "in"):
+            valor = self.expr(acceso["expr"], alcance)
+        elif modo == "rango":
+            cotas = [(op, self.expr(e, alcance)) for op, e in acceso["expr"]]
+
+        def claves_indice(env, ej, col):
+            if modo == "igual":
+                return indice.buscar(col, valor(env, ej))
+            if modo == "in":
+                valores = valor(env, ej)
+                claves = []
+                vistas = set()
+                for v in (valores if type(valores) is list else []):
+                    for clave in indice.buscar(col, v) or ():
+                        if clave not in vistas:
+                            vistas.add(clave)
+                            claves.append(clave)
+                return claves
+            desde = hasta = None
+            desde_incl = hasta_incl = True
+            if modo == "rango":
+                for op, cota in cotas:
+                    v = _orden(cota(env, ej))
+                    if op in (">", ">="):
+                        if desde is None or v > desde or (v == desde and op == ">"):
+                            desde, desde_incl = v, op == ">="
+                    elif hasta is None or v < hasta or (v == hasta and op == "<"):
+                        hasta, hasta_incl = v, op == "<="
+            return indice.rango(desde, desde_incl, hasta, hasta_incl)
+
+        def por_indice(env, ej):
+            col = coleccion(ej)
+            claves = claves_indice(env, ej, col)
+            if claves is None:
+                # p. ej. igualdad con null sobre un índice sparse
+                yield from recorrido_completo(col, ej)
+                return
+            if descendente:
+                claves = reversed(claves)
+            docs = col.docs
+            for clave in claves:
+                doc = docs.get(clave)
+                if doc is not None:
+                    ej.scanned_index += 1
+                    yield doc
+        return por_indice
+
+    # ---- FOR sobre vistas (SEARCH) ----
+    def _vista(self, fuente, alcance):
+        if fuente[0] == "var" and fuente[1] not in alcance:
+            return self.db._vistas.get(fuente[1])
+        return None
+
+    def _for_vista(self, s, busqueda, alcance, primer_for):
+        """FOR x IN vista [SEARCH ...]: recorre los documentos que da el índice invertido."""
+        _, var, fuente = s
+        vista = self._vista(fuente, alcance)
+        self._nodo("EnumerateViewNode", view=vista.nombre, outVariable={"name": var})
+        for nombre in vista.enlaces:
+            self.colecciones.setdefault(nombre, "read")
+        condicion = self._busqueda(busqueda, var, vista, alcance, "identity") if busqueda is not None else None
+
+        def recorrer(filas, ej, ctx):
+            for env in filas:
+                if primer_for:
+                    ctx["base"] = env
+                    ctx["base_claves"] = frozenset(env)
+                puntajes = condicion(env, ej) if condicion is not None else vista.todos()
+                for (nombre, clave), puntaje in sorted(puntajes.items()):
+                    col = ej.db._colecciones.get(nombre)
+                    doc = col.docs.get(clave) if col is not None else None
+                    if doc is None:
+                        continue
+                    ej.scanned_index += 1
+                    ej.puntajes[doc["_id"]] = puntaje
+                    nuevo = dict(env)
+                    nuevo[var] = doc
+                    yield nuevo
+        return recorrer
+
+    def _busqueda(self, n, var, vista, alcance, analizador):
+        """
+        Compila una condición de SEARCH a una función que devuelve
+        {(colección, clave): puntaje} de los documentos que la cumplen.
+        """
+        tipo = n[0]
+        if tipo == "llamada" and n[1] in ("ANALYZER", "BOOST") and len(n[2]) == 2:
+            if n[1] == "ANALYZER":
+                if n[2][1][0] != "lit":
+                    raise ErrorArangoMemoria(ERR_NO_IMPLEMENTADO, "ANALYZER() needs a literal analyzer name")
+                self.db._analizador(n[2][1][1])
+                return self._busqueda(n[2][0], var, vista, alcance, _nombre_analizador(n[2][1][1]))
+            interna, factor = self._busqueda(n[2][0], var, vista, alcance, analizador), self.expr(n[2][1], alcance)
+
+            def potenciar(env, ej):
+                f = _num(factor(env, ej))
+                return {d: p * f for d, p in interna(env, ej).items()}
+            return potenciar
+        if tipo in ("y", "o"):
+            a = self._busqueda(n[1], var, vista, alcance, analizador)
+            b = self._busqueda(n[2], var, vista, alcance, analizador)
+            return (lambda env, ej: _interseccion([a(env, ej), b(env, ej)])) if tipo == "y" \
+                else (lambda env, ej: _union([a(env, ej), b(env, ej)]))
+        if tipo == "no":
+            a = self._busqueda(n[1], var, vista, alcance, analizador)
+            return lambda env, ej: _excluir(vista.todos(), a(env, ej))
+        campo, valores, modo = None, None, None
+        if tipo == "binario" and n[1] == "==":
+            campo, otro = _atributo_de(n[2], var), n[3]
+            if campo is None:
+                campo, otro = _atributo_de(n[3], var), n[2]
+            modo = "ANY"
+            if campo is not None:
+                f_otro = self.expr(otro, alcance)
+                valores = lambda env, ej: [f_otro(env, ej)]
+        elif tipo == "in":
+            campo = _atributo_de(n[1], var)
+            modo = "NONE" if n[3] else "ANY"
+            if campo is not None:
+                f_lista = self.expr(n[2], alcance)
+                valores = lambda env, ej: _arreglo(f_lista(env, ej))
+        elif tipo == "cuantificado" and n[2] in ("==", "IN"):
+            campo = _atributo_de(n[4], var)
+            modo = n[1]
+            if campo is not None:
+                f_lista = self.expr(n[3], alcance)
+                valores = lambda env, ej: _arreglo(f_lista(env, ej))
+        elif tipo == "llamada" and n[1] == "STARTS_WITH" and len(n[2]) == 2:
+            campo = _atributo_de(n[2][0], var)
+            if campo is not None:
+                f_prefijo = self.expr(n[2][1], alcance)
+                return lambda env, ej: vista.prefijo(campo, analizador, _texto(f_prefijo(env, ej)))
+        elif tipo == "llamada" and n[1] == "LIKE" and len(n[2]) == 2:
+            campo = _atributo_de(n[2][0], var)
+            if campo is not None:
+                f_patron = self.expr(n[2][1], alcance)
+                return lambda env, ej: vista.like(campo, analizador, _texto(f_patron(env, ej)))
+        if campo is not None and valores is not None:
+            def terminos(env, ej):
+                conjuntos = [vista.termino(campo, analizador, v) for v in valores(env, ej)]
+                if modo == "ALL":
+                    return _interseccion(conjuntos) if conjuntos else vista.todos()
+                if modo == "ANY":
+                    return _union(conjuntos)
+                return _excluir(vista.todos(), _union(conjuntos))
+            return terminos
+        if var not in _variables_libres(n):
+            constante = self.expr(n, alcance)
+            return lambda env, ej: vista.todos() if _verdad(constante(env, ej)) else {}
+        raise ErrorArangoMemoria(ERR_NO_IMPLEMENTADO, "unsupported SEARCH condition")
+
+    # ---- COLLECT ----
+    def _collect(self, s, alcance):
+        _, grupos, agregados, into, cuenta = s
+        self._nodo("CollectNode")
+        f_grupos = [(v, self.expr(e, alcance)) for v, e in grupos]
+        f_agregados = []
+        for var, funcion, arg in agregados:
+            if funcion not in _AGREGADOS:
+                raise ErrorArangoMemoria(ERR_FUNCION_DESCONOCIDA, f"unknown aggregate function '{funcion}'")
+            f_agregados.append((var, _AGREGADOS[funcion], self.expr(arg, alcance)))
+        f_into = None
+        if into is not None:
+            f_into = (into[0], self.expr(into[1], alcance) if into[1] is not None else None)
+
+        def agrupar(filas, ej, ctx):
+            orden = []
+            tabla = {}
+            for env in filas:
+                valores = [f(env, ej) for _, f in f_grupos]
+                clave = tuple(_orden(v) for v in valores)
+                grupo = tabla.get(clave)
+                if grupo is None:
+                    grupo = tabla[clave] = {"valores": valores, "filas": 0,
+                                            "agregados": [[] for _ in f_agregados], "into": []}
+                    orden.append(clave)
+                grupo["filas"] += 1
+                for lista, (_, _, arg) in zip(grupo["agregados"], f_agregados):
+                    lista.append(arg(env, ej))
+                if f_into is not None:
+                    if f_into[1] is not None:
+                        grupo["into"].append(f_into[1](env, ej))
+                    else:
+                        base = ctx["base_claves"]
+                        grupo["into"].append({k: v for k, v in env.items() if k not in base})
+            if not f_grupos and not tabla:
+                tabla[()] = {"valores": [], "filas": 0, "agregados": [[] for _ in f_agregados], "into": []}
+                orden.append(())
+            base = ctx["base"]
+            for clave in sorted(orden):
+                grupo = tabla[clave]
+                nuevo = dict(base)
+                for (var, _), v in zip(f_grupos, grupo["valores"]):
+                    nuevo[var] = v
+                for (var, funcion, _), lista in zip(f_agregados, grupo["agregados"]):
+                    nuevo[var] = funcion(ej, lista)
+                if f_into is not None:
+                    nuevo[f_into[0]] = grupo["into"]
+                if cuenta:
+                    nuevo[cuenta] = grupo["filas"]
+                yield nuevo
+        return agrupar
+
+    # ---- escrituras ----
+    def _modificacion(self, s, alcance):
+        tipo = s[0]
+        if tipo == "insert":
+            _, doc, coleccion, opciones = s
+            self._nodo("InsertNode")
+        elif tipo == "update":
+            _, doc, cambios, coleccion, opciones, reemplazar = s
+            self._nodo("ReplaceNode" if reemplazar else "UpdateNode")
+        elif tipo == "remove":
+            _, doc, coleccion, opciones = s
+            self._nodo("RemoveNode")
+        else:
+            _, busqueda, doc, cambios, coleccion, opciones, reemplazar = s
+            self._nodo("UpsertNode")
+        if coleccion[0] == "lit":
+            self.colecciones[coleccion[1]] = "write"
+        f_coleccion = self.expr(coleccion, alcance) if coleccion[0] == "bind" else (lambda env, ej, n=coleccion[1]: n)
+        f_opciones = self.expr(opciones, alcance) if opciones is not None else (lambda env, ej: None)
+        f_doc = self.expr(doc, alcance)
+        alcance.update({"NEW", "OLD"})
+        alcance_old = set(alcance)
+        f_cambios = self.expr(cambios, alcance_old) if tipo in ("update", "upsert") and cambios is not None else None
+        f_busqueda = self.expr(busqueda, alcance) if tipo == "upsert" else None
+
+        def escribir(filas, ej, ctx):
+            for env in filas:
+                col = ej.db._coleccion(_texto(f_coleccion(env, ej)))
+                op = f_opciones(env, ej) or {}
+                valor = f_doc(env, ej)
+                try:
+                    if tipo == "insert":
+                        viejo, nuevo = col._insertar(valor, op.get("overwriteMode") or
+                                                     ("replace" if op.get("overwrite") else None),
+                                                     op.get("keepNull", True) is not False,
+                                                     op.get("mergeObjects", True) is not False, ej)
+                    elif tipo == "update":
+                        if f_cambios is None:
+                            if type(valor) is not dict:
+                                raise ErrorArangoMemoria(ERR_DOCUMENTO_INVALIDO, "invalid document type")
+                            datos = {k: v for k, v in valor.items() if k not in ("_id", "_rev")}
+                        else:
+                            datos = f_cambios(env, ej)
+                        viejo, nuevo = col._actualizar(
+                            valor, datos, reemplazar,
+                            op.get("keepNull", True) is not False,
+                            op.get("mergeObjects", True) is not False,
+                            op.get("ignoreRevs", True) is False, ej)
+                    elif tipo == "remove":
+                        viejo, nuevo = col._eliminar(valor, op.get("ignoreRevs", True) is False, ej), None
+                    else:
+                        encontrado = col._buscar_ejemplo(f_busqueda(env, ej), ej)
+                        if encontrado is None:
+                            viejo, nuevo = col._insertar(valor, None, True, True, ej)
+                        else:
+                            datos = f_cambios({**env, "OLD": encontrado}, ej)
+                            viejo, nuevo = col._actualizar(
+                                encontrado, datos, reemplazar,
+                                op.get("keepNull", True) is not False,
+                                op.get("mergeObjects", True) is not False, False, ej)
+                except ErrorArangoMemoria:
+                    if op.get("ignoreErrors"):
+                        ej.ignored += 1
+                        continue
+                    raise
+                ej.modified += 1
+                fila = dict(env)
+                fila["OLD"] = viejo
+                fila["NEW"] = nuevo
+                yield fila
+        return escribir
+
+    # ---- expresiones ----
+    def expr(self, n, alcance):
+        tipo = n[0]
+        if tipo == "lit":
+            valor = n[1]
+            return lambda env, ej: valor
+        if tipo == "bind":
+            nombre = n[1]
+            return lambda env, ej: ej.bind[nombre]
+        if tipo == "var":
+            nombre = n[1]
+
+            def variable(env, ej):
+                try:
+                    return env[nombre]
+                except KeyError:
+                    return ej.db._como_valor(nombre, ej)
+            return variable
+        if tipo == "atributo":
+            base = self.expr(n[1], alcance)
+            nombre = n[2]
+
+            def atributo(env, ej):
+                v = base(env, ej)
+                return v.get(nombre) if type(v) is dict else None
+            return atributo
+        if tipo == "indice":
+            base = self.expr(n[1], alcance)
+            indice = self.expr(n[2], alcance)
+            return lambda env, ej: _indexar(base(env, ej), indice(env, ej))
+        if tipo == "expansion":
+            return self._expr_expansion(n, alcance)
+        if tipo == "llamada":
+            return self._expr_llamada(n, alcance)
+        if tipo == "arreglo":
+            elementos = [self.expr(e, alcance) for e in n[1]]
+            return lambda env, ej: [e(env, ej) for e in elementos]
+        if tipo == "objeto":
+            pares = [(self.expr(k, alcance), self.expr(v, alcance)) for k, v in n[1]]
+
+            def objeto(env, ej):
+                resultado = {}
+                for k, v in pares:
+                    clave = k(env, ej)
+                    resultado[clave if type(clave) is str else _texto(clave)] = v(env, ej)
+                return resultado
+            return objeto
+        if tipo == "subconsulta":
+            self._nodo("SubqueryStartNode")
+            alcance_base = getattr(self, "_alcance_base", None)
+            bloque = self.bloque(n[1], alcance)
+            self._alcance_base = alcance_base
+            self._nodo("SubqueryEndNode")
+            return bloque
+        if tipo == "y":
+            a, b = self.expr(n[1], alcance), self.expr(n[2], alcance)
+
+            def y(env, ej):
+                x = a(env, ej)
+                return b(env, ej) if _verdad(x) else x
+            return y
+        if tipo == "o":
+            a, b = self.expr(n[1], alcance), self.expr(n[2], alcance)
+
+            def o(env, ej):
+                x = a(env, ej)
+                return x if _verdad(x) else b(env, ej)
+            return o
+        if tipo == "no":
+            a = self.expr(n[1], alcance)
+            return lambda env, ej: not _verdad(a(env, ej))
+        if tipo == "negativo":
+            a = self.expr(n[1], alcance)
+            return lambda env, ej: _normalizar_num(-_num(a(env, ej)))
+        if tipo == "ternario":
+            c = self.expr(n[1], alcance)
+            si = self.expr(n[2], alcance) if n[2] is not None else None
+            no = self.expr(n[3], alcance)
+
+            def ternario(env, ej):
+                x = c(env, ej)
+                if _verdad(x):
+                    return si(env, ej) if si is not None else x
+                return no(env, ej)
+            return ternario
+        if tipo == "in":
+            a, b, negado = self.expr(n[1], alcance), self.expr(n[2], alcance), n[3]
+
+            def pertenece(env, ej):
+                x, lista = a(env, ej), b(env, ej)
+                if type(lista) is not list:
+                    return negado
+                if type(x) is str:
+                    return (x in lista) != negado
+                return any(_igual(x, y) for y in lista) != negado
+            return pertenece
+        if tipo == "like":
+            a, b, negado = self.expr(n[1], alcance), self.expr(n[2], alcance), n[3]
+            return lambda env, ej: _like(_texto(a(env, ej)), _texto(b(env, ej))) != negado
+        if tipo == "regex":
+            a, b, negado = self.expr(n[1], alcance), self.expr(n[2], alcance), n[3]
+            return lambda env, ej: (re.search(_texto(b(env, ej)), _texto(a(env, ej))) is not None) != negado
+        if tipo == "rango":
+            a, b = self.expr(n[1], alcance), self.expr(n[2], alcance)
+            return lambda env, ej: _f_range(ej, int(_num(a(env, ej))), int(_num(b(env, ej))))
+        if tipo == "binario":
+            return self._expr_binaria(n[1], self.expr(n[2], alcance), self.expr(n[3], alcance))
+        if tipo == "cuantificado":
+            cuantificador, op = n[1], n[2]
+            a, b = self.expr(n[3], alcance), self.expr(n[4], alcance)
+
+            def cuantificado(env, ej):
+                valores, otro = a(env, ej), b(env, ej)
+                if type(valores) is not list:
+                    return False
+                cumplen = (_cumple(op, x, otro) for x in valores)
+                if cuantificador == "ALL":
+                    return all(cumplen)
+                if cuantificador == "ANY":
+                    return any(cumplen)
+                return not any(cumplen)
+            return cuantificado
+        raise ErrorArangoMemoria(ERR_SINTAXIS, f"unsupported expression {tipo}")
+
+    def _expr_binaria(self, op, a, b):
+        if op == "==":
+            return lambda env, ej: _igual(a(env, ej), b(env, ej))
+        if op == "!=":
+            return lambda env, ej: not _igual(a(env, ej), b(env, ej))
+        if op in ("<", "<=", ">", ">="):
+            comparar = {"<": lambda x, y: x < y, "<=": lambda x, y: x <= y,
+                        ">": lambda x, y: x > y, ">=": lambda x, y: x >= y}[op]
+
+            def comparacion(env, ej):
+                x, y = a(env, ej), b(env, ej)
+                tx, ty = type(x), type(y)
+                if (tx is ty and (tx is str or tx is int or tx is float)) or \
+                        ((tx is int or tx is float) and (ty is int or ty is float)):
+                    return comparar(x, y)
+                return comparar(_orden(x), _orden(y))
+            return comparacion
+
+        def aritmetica(env, ej):
+            x, y = a(env, ej), b(env, ej)
+            if not _es_numero(x):
+                x = _num(x)
+            if not _es_numero(y):
+                y = _num(y)
+            if op == "+":
+                return _normalizar_num(x + y)
+            if op == "-":
+                return _normalizar_num(x - y)
+            if op == "*":
+                return _normalizar_num(x * y)
+            if y == 0:
+                return None
+            if op == "/":
+                return _normalizar_num(x / y)
+            return _normalizar_num(math.fmod(x, y))
+        return aritmetica
+
+    def _expr_llamada(self, n, alcance):
+        nombre, argumentos = n[1], n[2]
+        funcion = _FUNCIONES.get(nombre)
+        if funcion is None:
+            raise ErrorArangoMemoria(ERR_FUNCION_DESCONOCIDA, f"usage of unknown function '{nombre}()'")
+        try:
+            inspect.signature(funcion).bind(None, *argumentos)
+        except TypeError:
+            raise ErrorArangoMemoria(ERR_ARGUMENTOS, f"invalid number of arguments for function '{nombre}()'")
+        f_args = [self.expr(a, alcance) for a in argumentos]
+        if len(f_args) == 1:
+            unico = f_args[0]
+            return lambda env, ej: funcion(ej, unico(env, ej))
+        return lambda env, ej: funcion(ej, *[a(env, ej) for a in f_args])
+
+    def _expr_expansion(self, n, alcance):
+        _, base, filtro, limite, retorno, cola = n
+        f_base = self.expr(base, alcance)
+        interno = set(alcance) | {"CURRENT"}
+        f_filtro = self.expr(filtro, interno) if filtro is not None else None
+        f_limite = self.expr(limite, interno) if limite is not None else None
+        f_retorno = self.expr(retorno, interno) if retorno is not None else None
+        f_cola = []
+        for op in cola:
+            if op[0] == "atributo":
+                f_cola.append((op[1], None))
+            else:
+                f_cola.append((None, self.expr(op[1], interno)))
+
+        def expandir(env, ej):
+            v = f_base(env, ej)
+            if type(v) is not list:
+                return []
+            tope = int(_num(f_limite(env, ej))) if f_limite is not None else None
+            salida = []
+            for x in v:
+                if f_filtro is not None or f_retorno is not None:
+                    interno_env = dict(env)
+                    interno_env["CURRENT"] = x
+                    if f_filtro is not None and not _verdad(f_filtro(interno_env, ej)):
+                        continue
+                    if f_retorno is not None:
+                        x = f_retorno(interno_env, ej)
+                for nombre, indice in f_cola:
+                    if nombre is not None:
+                        x = x.get(nombre) if type(x) is dict else None
+                    else:
+                        x = _indexar(x, indice(env, ej))
+                salida.append(x)
+                if tope is not None and len(salida) >= tope:
+                    break
+            return salida
+        return expandir
+
+
+def _cumple(op, x, y):
+    """Operador de comparación de AQL aplicado a dos valores (para ALL/ANY/NONE)."""
+    if op == "==":
+        return _igual(x, y)
+    if op == "!=":
+        return not _igual(x, y)
+    if op in ("IN", "NOT IN"):
+        dentro = type(y) is list and any(_igual(x, z) for z in y)
+        return dentro if op == "IN" else not dentro
+    x, y = _orden(x), _orden(y)
+    return {"<": x < y, "<=": x <= y, ">": x > y, ">=": x >= y}[op]
+
+
+def _indexar(v, i):
+    if type(v) is dict:
+        return v.get(i) if type(i) is str else None
+    if type(v) is list and _es_numero(i) and type(i) is not bool:
+        i = int(i)
+        if -len(v) <= i < len(v):
+            return v[i]
+    return None
+
+
+class _Plan:
+    """Consulta parseada y compilada (se reutiliza mientras no cambien los índices)."""
+
+    def __init__(self, query, db):
+        parser = _Parser(query)
+        arbol = parser.consulta()
+        self.binds = parser.binds
+        compilador = _Compilador(db)
+        compilador._alcance_base = set()
+        self.ejecutar = compilador.bloque(arbol, set())
+        self.nodos = compilador.nodos
+        self.colecciones = compilador.colecciones
+
+
+# ---------------------------------------------------------------------
+# Índices
+# ---------------------------------------------------------------------
+class _IndicePrimario:
+    campo = "_key"
+    sparse = False
+
+    def describir(self):
+        return {"id": "0", "name": "primary", "type": "primary", "fields": ["_key"],
+                "unique": True, "sparse": False}
+
+    def buscar(self, col, valor):
+        return [valor] if type(valor) is str and valor in col.docs else []
+
+    def rango(self, *args):
+        return None
+
+
+class _IndicePersistente:
+    """
+    Índice persistente: mapa valor del primer campo -> claves (igualdad / IN)
+    y lista ordenada [(orden(valor), clave)] para rangos y SORT.
+    Si es unique verifica la combinación completa de campos.
+    Un campo 'nombre[*]' (índice de arreglo) indexa cada elemento distinto
+    del arreglo y sólo sirve para 'valor IN doc.nombre[*]'.
+    """
+
+    def __init__(self, definicion, id_indice):
+        self.id = id_indice
+        self.nombre = definicion.get("name") or f"idx_{id_indice}"
+        self.campos = list(definicion["fields"])
+        self.campo = self.campos[0]
+        self.arreglo = self.campo.endswith("[*]")
+        self.unique = bool(definicion.get("unique", False))
+        self.sparse = bool(definicion.get("sparse", False))
+        self.tipo = definicion.get("type", "persistent")
+        self.mapa = {}
+        self.ordenado = []
+        self.unicos = {}
+
+    def describir(self):
+        return {"id": self.id, "name": self.nombre, "type": self.tipo, "fields": list(self.campos),
+                "unique": self.unique, "sparse": self.sparse}
+
+    def igual_a(self, definicion):
+        return (list(definicion.get("fields", [])) == self.campos
+                and bool(definicion.get("unique", False)) == self.unique
+                and bool(definicion.get("sparse", False)) == self.sparse)
+
+    def _valores(self, doc):
+        return [doc.get(c[:-3] if c.endswith("[*]") else c) for c in self.campos]
+
+    def _ordenes(self, valores):
+        """Entradas del índice para el primer campo (una por elemento si es de arreglo)."""
+        if not self.arreglo:
+            return [_orden(valores[0])]
+        return list(dict.fromkeys(_orden(x) for x in _arreglo(valores[0])))
+
+    def _incluye(self, valores):
+        return not (self.sparse and any(v is None for v in valores))
+
+    def verificar(self, doc, clave):
+        if not self.unique or self.arreglo:
+            return
+        valores = self._valores(doc)
+        if not self._incluye(valores):
+            return
+        duenio = self.unicos.get(_orden(valores))
+        if duenio is not None and duenio != clave:
+            raise ErrorArangoMemoria(
+                ERR_UNICO, f"unique constraint violated - in index {self.nombre} of type "
+                           f"persistent over '{', '.join(self.campos)}'; conflicting key: {duenio}", 409)
+
+    def agregar(self, doc, clave):
+        valores = self._valores(doc)
+        if not self._incluye(valores):
+            return
+        for orden in self._ordenes(valores):
+            self.mapa.setdefault(orden, set()).add(clave)
+            if not self.arreglo:
+                insort(self.ordenado, (orden, clave))
+        if self.unique and not self.arreglo:
+            self.unicos[_orden(valores)] = clave
+
+    def quitar(self, doc, clave):
+        valores = self._valores(doc)
+        if not self._incluye(valores):
+            return
+        for orden in self._ordenes(valores):
+            claves = self.mapa.get(orden)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self.mapa[orden]
+            if self.arreglo:
+                continue
+            pos = bisect_left(self.ordenado, (orden, clave))
+            if pos < len(self.ordenado) and self.ordenado[pos] == (orden, clave):
+                del self.ordenado[pos]
+        if self.unique and not self.arreglo and self.unicos.get(_orden(valores)) == clave:
+            del self.unicos[_orden(valores)]
+
+    def buscar(self, col, valor):
+        if valor is None and self.sparse:
+            return None
+        return sorted(self.mapa.get(_orden(valor), ()))
+
+    def rango(self, desde, desde_incl, hasta, hasta_incl):
+        inicio = 0
+        fin = len(self.ordenado)
+        if desde is not None:
+            inicio = bisect_left(self.ordenado, (desde,)) if desde_incl else bisect_right(self.ordenado, (desde, _MAYOR))
+        if hasta is not None:
+            fin = bisect_right(self.ordenado, (hasta, _MAYOR)) if hasta_incl else bisect_left(self.ordenado, (hasta,))
+        return [clave for _, clave in self.ordenado[inicio:fin]]
+
+
+# ---------------------------------------------------------------------
+# Analizadores y vistas ArangoSearch
+# ---------------------------------------------------------------------
+_TIPOS_ANALIZADOR = ("identity", "norm", "ngram", "pipeline")
+_ANALIZADOR_IDENTITY = {"name": "identity", "type": "identity", "properties": {},
+                        "features": ["frequency", "norm"]}
+
+
+def _nombre_analizador(nombre):
+    """'minimarket_db::clientes_ngram' -> 'clientes_ngram'."""
+    return _texto(nombre).split("::", 1)[-1]
+
+
+def _validar_analizador(tipo, propiedades):
+    if tipo not in _TIPOS_ANALIZADOR:
+        raise ErrorArangoMemoria(ERR_PARAMETRO, f"analyzer type not supported: {tipo}")
+    if tipo == "ngram" and not (1 <= int(propiedades.get("min", 0)) <= int(propiedades.get("max", 0))):
+        raise ErrorArangoMemoria(ERR_PARAMETRO, "ngram analyzer needs 1 <= min <= max")
+    if tipo == "pipeline":
+        for etapa in propiedades.get("pipeline") or []:
+            _validar_analizador(etapa.get("type"), etapa.get("properties") or {})
+
+
+def _analizar(definicion, texto):
+    """Tokens de un texto según un analizador {type, properties}."""
+    tipo = definicion["type"]
+    propiedades = definicion.get("properties") or {}
+    if tipo == "norm":
+        if propiedades.get("accent") is False:
+            texto = "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c))
+        if propiedades.get("case") == "lower":
+            texto = texto.lower()
+        elif propiedades.get("case") == "upper":
+            texto = texto.upper()
+        return [texto]
+    if tipo == "ngram":
+        minimo, maximo = int(propiedades["min"]), int(propiedades["max"])
+        tokens = [texto[i:i + n] for i in range(len(texto)) for n in range(minimo, maximo + 1)
+                  if i + n <= len(texto)]
+        if propiedades.get("preserveOriginal") and not (minimo <= len(texto) <= maximo):
+            tokens.append(texto)
+        return tokens
+    if tipo == "pipeline":
+        tokens = [texto]
+        for etapa in propiedades.get("pipeline") or []:
+            tokens = [t for x in tokens for t in _analizar(etapa, x)]
+        return tokens
+    return [texto]
+
+
+def _union(conjuntos):
+    resultado = {}
+    for conjunto in conjuntos:
+        for doc, puntaje in conjunto.items():
+            resultado[doc] = resultado.get(doc, 0.0) + puntaje
+    return resultado
+
+
+def _interseccion(conjuntos):
+    conjuntos = sorted(conjuntos, key=len)
+    resultado = dict(conjuntos[0])
+    for conjunto in conjuntos[1:]:
+        resultado = {doc: puntaje + conjunto[doc] for doc, puntaje in resultado.items() if doc in conjunto}
+    return resultado
+
+
+def _excluir(todos, conjunto):
+    return {doc: puntaje for doc, puntaje in todos.items() if doc not in conjunto}
+
+
+class VistaMemoria:
+    """
+    Vista ArangoSearch: por cada (colección, campo, analizador) enlazado
+    guarda token -> {clave: frecuencia} y el largo en tokens del campo de
+    cada documento (para BM25). Se actualiza con cada escritura de las
+    colecciones enlazadas. Sólo se indexan textos (o arreglos de textos)
+    de atributos de primer nivel declarados en 'fields'.
+    """
+
+    _ids = contador(1)
+
+    def __init__(self, db, nombre):
+        self.db = db
+        self.nombre = nombre
+        self.id = str(next(self._ids))
+        self.links = {}
+        self.enlaces = {}
+        self._terminos = {}
+        self._largos = {}
+        self._vocabulario = {}
+
+    def describir(self):
+        return {"id": self.id, "name": self.nombre, "type": "arangosearch", "links": json.loads(json.dumps(self.links))}
+
+    def configurar(self, links, reemplazar):
+        """Aplica 'links' (reemplazando los anteriores o fusionándolos) y reindexa todo."""
+        nuevos = {} if reemplazar else dict(self.links)
+        for nombre, link in (links or {}).items():
+            if link is None:
+                nuevos.pop(nombre, None)
+                continue
+            if nombre not in self.db._colecciones:
+                raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA, f"collection or view not found: {nombre}", 404)
+            nuevos[nombre] = link
+        enlaces = {}
+        for nombre, link in nuevos.items():
+            base = link.get("analyzers") or ["identity"]
+            campos = {}
+            for campo, definicion in (link.get("fields") or {}).items():
+                analizadores = (definicion or {}).get("analyzers") or base
+                campos[campo] = [_nombre_analizador(a) for a in analizadores]
+                for analizador in campos[campo]:
+                    self.db._analizador(analizador)
+            enlaces[nombre] = campos
+        for nombre, col in self.db._colecciones.items():
+            if self in col.vistas and nombre not in enlaces:
+                col.vistas.remove(self)
+            elif nombre in enlaces and self not in col.vistas:
+                col.vistas.append(self)
+        self.links, self.enlaces = nuevos, enlaces
+        self._terminos, self._largos, self._vocabulario = {}, {}, {}
+        for nombre in enlaces:
+            for clave, doc in self.db._colecciones[nombre].docs.items():
+                self.actualizar(nombre, clave, None, doc)
+
+    def _tokens(self, analizador, valor):
+        definicion = self.db._analizadores[analizador]
+        valores = valor if type(valor) is list else [valor]
+        return [t for v in valores if type(v) is str for t in _analizar(definicion, v)]
+
+    def actualizar(self, nombre, clave, previo, doc):
+        """Reindexa un documento de la colección 'nombre' (previo/doc None = no existía / borrado)."""
+        for campo, analizadores in self.enlaces.get(nombre, {}).items():
+            for analizador in analizadores:
+                indice = (nombre, campo, analizador)
+                terminos = self._terminos.setdefault(indice, {})
+                largos = self._largos.setdefault(indice, {})
+                if previo is not None:
+                    for token in set(self._tokens(analizador, previo.get(campo))):
+                        claves = terminos.get(token)
+                        if claves is not None:
+                            claves.pop(clave, None)
+                            if not claves:
+                                del terminos[token]
+                                self._vocabulario.pop(indice, None)
+                    largos.pop(clave, None)
+                if doc is not None:
+                    tokens = self._tokens(analizador, doc.get(campo))
+                    if tokens:
+                        for token in tokens:
+                            claves = terminos.get(token)
+                            if claves is None:
+                                claves = terminos[token] = {}
+                                self._vocabulario.pop(indice, None)
+                            claves[clave] = claves.get(clave, 0) + 1
+                        largos[clave] = len(tokens)
+
+    def todos(self):
+        return {(nombre, clave): 0.0 for nombre in self.enlaces for clave in self.db._colecciones[nombre].docs}
+
+    def _bm25(self, indice, claves, k=1.2, b=0.75):
+        largos = self._largos.get(indice, {})
+        total = len(largos)
+        if not total:
+            return {}
+        promedio = sum(largos.values()) / total
+        idf = math.log(1 + (total - len(claves) + 0.5) / (len(claves) + 0.5))
+        return {(indice[0], clave): idf * tf * (k + 1) / (tf + k * (1 - b + b * largos.get(clave, 0) / promedio))
+                for clave, tf in claves.items()}
+
+    def termino(self, campo, analizador, token):
+        """Documentos cuyo campo (con ese analizador) tiene el token, con su puntaje BM25."""
+        if type(token) is not str:
+            return {}
+        return _union([self._bm25(indice, self._terminos.get(indice, {}).get(token, {}))
+                       for indice in self._indices(campo, analizador)])
+
+    def prefijo(self, campo, analizador, prefijo):
+        """Documentos con algún token que empieza con 'prefijo' (puntaje: el mejor de esos tokens)."""
+        resultado = {}
+        for indice in self._indices(campo, analizador):
+            vocabulario = self._vocabulario.get(indice)
+            if vocabulario is None:
+                vocabulario = self._vocabulario[indice] = sorted(self._terminos.get(indice, {}))
+            for token in islice(vocabulario, bisect_left(vocabulario, prefijo), None):
+                if not token.startswith(prefijo):
+                    break
+                for doc, puntaje in self._bm25(indice, self._terminos[indice][token]).items():
+                    resultado[doc] = max(resultado.get(doc, 0.0), puntaje)
+        return resultado
+
+    def like(self, campo, analizador, patron):
+        """Documentos con algún token que cumple el patrón LIKE (puntaje: el mejor de esos tokens)."""
+        resultado = {}
+        for indice in self._indices(campo, analizador):
+            for token, docs in self._terminos.get(indice, {}).items():
+                if not _like(token, patron):
+                    continue
+                for doc, puntaje in self._bm25(indice, docs).items():
+                    resultado[doc] = max(resultado.get(doc, 0.0), puntaje)
+        return resultado
+
+    def _indices(self, campo, analizador):
+        return [(nombre, campo, analizador) for nombre, campos in self.enlaces.items()
+                if analizador in campos.get(campo, ())]
+
+
+# ---------------------------------------------------------------------
+# Colecciones, cursor y base
+# ---------------------------------------------------------------------
+class ColeccionMemoria:
+    """Subconjunto de arango.collection.StandardCollection."""
+
+    def __init__(self, db, nombre):
+        self._db = db
+        self.name = nombre
+        self.docs = {}
+        self.primario = _IndicePrimario()
+        self.indices = []
+        self.vistas = []
+        self._ids = contador(1)
+
+    def __repr__(self):
+        return f"<ColeccionMemoria {self.name}>"
+
+    # ---- internas (bajo el lock de la base) ----
+    def _clave(self, documento):
+        if type(documento) is dict:
+            if documento.get("_key") is not None:
+                return _texto(documento["_key"])
+            documento = documento.get("_id")
+        if type(documento) is not str:
+            raise ErrorArangoMemoria(ERR_CLAVE_INVALIDA, "illegal document key")
+        if "/" in documento:
+            coleccion, documento = documento.split("/", 1)
+            if coleccion != self.name:
+                raise ErrorArangoMemoria(ERR_CLAVE_INVALIDA, "illegal document identifier")
+        return documento
+
+    def _poner(self, clave, doc):
+        previo = self.docs.get(clave)
+        for vista in self.vistas:
+            vista.actualizar(self.name, clave, previo, doc)
+        if previo is not None:
+            for indice in self.indices:
+                indice.quitar(previo, clave)
+        if doc is None:
+            self.docs.pop(clave, None)
+            return
+        for indice in self.indices:
+            indice.agregar(doc, clave)
+        self.docs[clave] = doc
+
+    def _escribir(self, clave, doc, ej):
+        for indice in self.indices:
+            indice.verificar(doc, clave)
+        self._db._anotar((self, clave, self.docs.get(clave)), ej)
+        self._poner(clave, doc)
+
+    def _nueva_rev(self):
+        return self._db._nueva_rev()
+
+    def _insertar(self, valor, modo, keep_null, merge, ej):
+        if type(valor) is not dict:
+            raise ErrorArangoMemoria(ERR_DOCUMENTO_INVALIDO, "invalid document type")
+        doc = dict(valor)
+        if doc.get("_key") is not None:
+            clave = _texto(doc["_key"])
+        else:
+            clave = str(self._db._nueva_clave())
+            while clave in self.docs:
+                clave = str(self._db._nueva_clave())
+        previo = self.docs.get(clave)
+        if previo is not None:
+            if modo == "ignore":
+                return previo, previo
+            if modo == "update":
+                return self._actualizar(previo, doc, False, keep_null, merge, False, ej)
+            if modo != "replace":
+                raise ErrorArangoMemoria(
+                    ERR_UNICO, f"unique constraint violated - in index primary of type primary "
+                               f"over '_key'; conflicting key: {clave}", 409)
+        doc.pop("_rev", None)
+        doc["_key"] = clave
+        doc["_id"] = f"{self.name}/{clave}"
+        doc["_rev"] = self._nueva_rev()
+        self._escribir(clave, doc, ej)
+        return previo, doc
+
+    def _actualizar(self, valor, cambios, reemplazar, keep_null, merge, verificar_rev, ej):
+        clave = self._clave(valor)
+        previo = self.docs.get(clave)
+        if previo is None:
+            raise ErrorArangoMemoria(ERR_NO_ENCONTRADO, "document not found", 404)
+        if verificar_rev and type(valor) is dict and valor.get("_rev") and valor["_rev"] != previo["_rev"]:
+            raise ErrorArangoMemoria(ERR_CONFLICTO, "conflict, _rev values do not match", 409)
+        if type(cambios) is not dict:
+            raise ErrorArangoMemoria(ERR_DOCUMENTO_INVALIDO, "invalid document type")
+        cambios = {k: v for k, v in cambios.items() if k not in ("_key", "_id", "_rev")}
+        if reemplazar:
+            doc = cambios
+        else:
+            doc = _fusionar(previo, cambios, keep_null, merge)
+        doc["_key"] = clave
+        doc["_id"] = previo["_id"]
+        doc["_rev"] = self._nueva_rev()
+        self._escribir(clave, doc, ej)
+        return previo, doc
+
+    def _eliminar(self, valor, verificar_rev, ej):
+        clave = self._clave(valor)
+        previo = self.docs.get(clave)
+        if previo is None:
+            raise ErrorArangoMemoria(ERR_NO_ENCONTRADO, "document not found", 404)
+        if verificar_rev and type(valor) is dict and valor.get("_rev") and valor["_rev"] != previo["_rev"]:
+            raise ErrorArangoMemoria(ERR_CONFLICTO, "conflict, _rev values do not match", 409)
+        self._db._anotar((self, clave, previo), ej)
+        self._poner(clave, None)
+        return previo
+
+    def _buscar_ejemplo(self, ejemplo, ej):
+        if type(ejemplo) is not dict:
+            raise ErrorArangoMemoria(ERR_DOCUMENTO_INVALIDO, "invalid document type")
+        if type(ejemplo.get("_key")) is str:
+            candidatos = [ejemplo["_key"]]
+        else:
+            candidatos = None
+            for indice in self.indices:
+                if indice.campo in ejemplo:
+                    candidatos = indice.buscar(self, ejemplo[indice.campo])
+                    break
+            if candidatos is None:
+                candidatos = list(self.docs)
+        for clave in candidatos:
+            doc = self.docs.get(clave)
+            if doc is not None and all(_igual(doc.get(k), v) for k, v in ejemplo.items()):
+                if ej is not None:
+                    ej.scanned_index += 1
+                return doc
+        return None
+
+    def _meta(self, doc, previo=None, devolver_nuevo=False, devolver_viejo=False):
+        meta = {"_id": doc["_id"], "_key": doc["_key"], "_rev": doc["_rev"]}
+        if previo is not None:
+            meta["_old_rev"] = previo["_rev"]
+        if devolver_nuevo:
+            meta["new"] = _json(doc)
+        if devolver_viejo and previo is not None:
+            meta["old"] = _json(previo)
+        return meta
+
+    # ---- API de python-arango ----
+    def get(self, document, rev=None, check_rev=True, allow_dirty_read=False):
+        with self._db._operacion("get", f"/_api/document/{self.name}"):
+            doc = self.docs.get(self._clave(document))
+            if doc is not None and rev is not None and check_rev and doc["_rev"] != rev:
+                raise ErrorArangoMemoria(ERR_CONFLICTO, "conflict, _rev values do not match", 412)
+            return _json(doc) if doc is not None else None
+
+    def has(self, document, rev=None, check_rev=True, allow_dirty_read=False):
+        with self._db._operacion("head", f"/_api/document/{self.name}"):
+            return self._clave(document) in self.docs
+
+    def __contains__(self, document):
+        return self.has(document)
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        with self._db._operacion("get", f"/_api/collection/{self.name}/count"):
+            return len(self.docs)
+
+    def insert(self, document, return_new=False, sync=None, silent=False, overwrite=False,
+               return_old=False, overwrite_mode=None, keep_none=None, merge=None, **kwargs):
+        with self._db._operacion("post", f"/_api/document/{self.name}"):
+            modo = overwrite_mode or ("replace" if overwrite else None)
+            previo, doc = self._insertar(_json(document), modo, keep_none is not False,
+                                         merge is not False, None)
+            if silent:
+                return True
+            return self._meta(doc, previo if previo is not doc else None, return_new, return_old)
+
+    def insert_many(self, documents, return_new=False, sync=None, silent=False, overwrite=False,
+                    return_old=False, overwrite_mode=None, keep_none=None, merge=None, **kwargs):
+        with self._db._operacion("post", f"/_api/document/{self.name}"):
+            resultados = []
+            modo = overwrite_mode or ("replace" if overwrite else None)
+            for documento in documents:
+                try:
+                    previo, doc = self._insertar(_json(documento), modo, keep_none is not False,
+                                                 merge is not False, None)
+                    resultados.append(self._meta(doc, previo, return_new, return_old))
+                except ErrorArangoMemoria as e:
+                    resultados.append(e)
+            return True if silent else resultados
+
+    def update(self, document, check_rev=True, merge=True, keep_none=True, return_new=False,
+               return_old=False, sync=None, silent=False, **kwargs):
+        with self._db._operacion("patch", f"/_api/document/{self.name}"):
+            document = _json(document)
+            previo, doc = self._actualizar(document, document, False, keep_none, merge, check_rev, None)
+            return True if silent else self._meta(doc, previo, return_new, return_old)
+
+    def update_many(self, documents, check_rev=True, merge=True, keep_none=True, return_new=False,
+                    return_old=False, sync=None, silent=False, **kwargs):
+        with self._db._operacion("patch", f"/_api/document/{self.name}"):
+            resultados = []
+            for documento in documents:
+                documento = _json(documento)
+                try:
+                    previo, doc = self._actualizar(documento, documento, False, keep_none, merge,
+                                                   check_rev, None)
+                    resultados.append(self._meta(doc, previo, return_new, return_old))
+                except ErrorArangoMemoria as e:
+                    resultados.append(e)
+            return True if silent else resultados
+
+    def replace(self, document, check_rev=True, return_new=False, return_old=False,
+                sync=None, silent=False, **kwargs):
+        with self._db._operacion("put", f"/_api/document/{self.name}"):
+            document = _json(document)
+            previo, doc = self._actualizar(document, document, True, True, True, check_rev, None)
+            return True if silent else self._meta(doc, previo, return_new, return_old)
+
+    def delete(self, document, rev=None, check_rev=True, ignore_missing=False, return_old=False,
+               sync=None, silent=False, **kwargs):
+        with self._db._operacion("delete", f"/_api/document/{self.name}"):
+            if rev is not None and type(document) is not dict:
+                document = {"_key": document, "_rev": rev}
+            try:
+                previo = self._eliminar(document if type(document) is not dict else _json(document),
+                                        check_rev, None)
+            except ErrorArangoMemoria as e:
+                if ignore_missing and e.error_code == ERR_NO_ENCONTRADO:
+                    return False
+                raise
+            return True if silent else self._meta_eliminado(previo, return_old)
+
+    def delete_many(self, documents, return_old=False, check_rev=True, sync=None, silent=False, **kwargs):
+        with self._db._operacion("delete", f"/_api/document/{self.name}"):
+            resultados = []
+            for documento in documents:
+                try:
+                    previo = self._eliminar(documento if type(documento) is not dict else _json(documento),
+                                            check_rev, None)
+                    resultados.append(self._meta_eliminado(previo, return_old))
+                except ErrorArangoMemoria as e:
+                    resultados.append(e)
+            return True if silent else resultados
+
+    @staticmethod
+    def _meta_eliminado(previo, return_old):
+        meta = {"_id": previo["_id"], "_key": previo["_key"], "_rev": previo["_rev"]}
+        if return_old:
+            meta["old"] = _json(previo)
+        return meta
+
+    def all(self, skip=None, limit=None, **kwargs):
+        with self._db._operacion("put", "/_api/cursor"):
+            docs = list(self.docs.values())[skip or 0:]
+            if limit is not None:
+                docs = docs[:limit]
+            return CursorMemoria(_json(docs), {"scanned_full": len(docs)})
+
+    def find(self, filters, skip=None, limit=None, **kwargs):
+        with self._db._operacion("put", "/_api/cursor"):
+            docs = [d for d in self.docs.values() if all(_igual(d.get(k), v) for k, v in filters.items())]
+            docs = docs[skip or 0:]
+            if limit is not None:
+                docs = docs[:limit]
+            return CursorMemoria(_json(docs), {"scanned_full": len(self.docs)})
+
+    def truncate(self):
+        with self._db._operacion("put", f"/_api/collection/{self.name}/truncate"):
+            for clave in list(self.docs):
+                self._poner(clave, None)
+            return True
+
+    def indexes(self):
+        with self._db._operacion("get", "/_api/index"):
+            return [self.primario.describir()] + [i.describir() for i in self.indices]
+
+    def add_index(self, data, formatter=False):
+        with self._db._operacion("post", "/_api/index"):
+            for indice in self.indices:
+                if indice.nombre == data.get("name") or indice.igual_a(data):
+                    return {**indice.describir(), "new": False}
+            indice = _IndicePersistente(data, f"{self.name}/{next(self._ids)}")
+            for clave, doc in self.docs.items():
+                indice.verificar(doc, clave)
+                indice.agregar(doc, clave)
+            self.indices.append(indice)
+            return {**indice.describir(), "new": True}
+
+    def add_persistent_index(self, fields, unique=None, sparse=None, name=None, **kwargs):
+        return self.add_index({"type": "persistent", "fields": fields, "unique": bool(unique),
+                               "sparse": bool(sparse), **({"name": name} if name else {})})
+
+    def add_hash_index(self, fields, unique=None, sparse=None, name=None, **kwargs):
+        return self.add_persistent_index(fields, unique, sparse, name)
+
+    def delete_index(self, index_id, ignore_missing=False):
+        with self._db._operacion("delete", "/_api/index"):
+            for indice in self.indices:
+                if index_id in (indice.id, indice.nombre, indice.id.split("/")[-1]):
+                    self.indices.remove(indice)
+                    return True
+            if ignore_missing:
+                return False
+            raise ErrorArangoMemoria(1212, "index not found", 404)
+
+
+def _fusionar(previo, cambios, keep_null, merge):
+    doc = dict(previo)
+    for clave, valor in cambios.items():
+        if valor is None and not keep_null:
+            doc.pop(clave, None)
+        elif merge and type(valor) is dict and type(doc.get(clave)) is dict:
+            doc[clave] = _fusionar(doc[clave], valor, keep_null, merge)
+        else:
+            doc[clave] = valor
+    return doc
+
+
+class CursorMemoria:
+    """Subconjunto de arango.cursor.Cursor (los resultados ya están calculados)."""
+
+    def __init__(self, resultados, estadisticas, perfil=None, contar=False):
+        self._resultados = resultados
+        self._pos = 0
+        self._estadisticas = estadisticas
+        self._perfil = perfil
+        self._contar = contar
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pos >= len(self._resultados):
+            raise StopIteration
+        fila = self._resultados[self._pos]
+        self._pos += 1
+        return fila
+
+    next = __next__
+
+    def __len__(self):
+        if not self._contar:
+            # Igual que python-arango (es TypeError: list(cursor) lo ignora)
+            raise CursorCountError("cursor count not enabled")
+        return len(self._resultados)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def count(self):
+        return len(self._resultados) if self._contar else None
+
+    def batch(self):
+        return self._resultados[self._pos:]
+
+    def has_more(self):
+        return False
+
+    def empty(self):
+        return self._pos >= len(self._resultados)
+
+    def pop(self):
+        return self.__next__()
+
+    def statistics(self):
+        return self._estadisticas
+
+    def profile(self):
+        return self._perfil
+
+    def warnings(self):
+        return []
+
+    def cached(self):
+        return False
+
+    def close(self, ignore_missing=False):
+        return None
+
+
+class AQLMemoria:
+    """Subconjunto de arango.aql.AQL: execute() y explain()."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def execute(self, query, count=False, batch_size=None, ttl=None, bind_vars=None,
+                profile=None, **kwargs):
+        with self._db._operacion("post", "/_api/cursor"):
+            inicio = time.perf_counter()
+            plan = self._db._plan(query)
+            bind = self._db._validar_binds(plan, bind_vars)
+            compilado = time.perf_counter()
+            ej = _Ejecucion(self._db, bind)
+            try:
+                resultados = plan.ejecutar({}, ej)
+                resultados = _json(resultados)
+            except Exception:
+                for col, clave, previo in reversed(ej.deshacer):
+                    col._poner(clave, previo)
+                raise
+            fin = time.perf_counter()
+            estadisticas = {
+                "modified": ej.modified, "ignored": ej.ignored,
+                "scanned_full": ej.scanned_full, "scanned_index": ej.scanned_index,
+                "filtered": ej.filtered, "http_requests": 0,
+                "execution_time": fin - inicio
+            }
+            perfil = {"parsing": compilado - inicio, "executing": fin - compilado} if profile else None
+            return CursorMemoria(resultados, estadisticas, perfil, count)
+
+    def explain(self, query, all_plans=False, max_plans=None, opt_rules=None, bind_vars=None, **kwargs):
+        with self._db._operacion("post", "/_api/explain"):
+            plan = self._db._plan(query)
+            self._db._validar_binds(plan, bind_vars)
+            resultado = {
+                "nodes": [dict(n) for n in plan.nodos],
+                "rules": ["use-indexes"] if any(n["type"] == "IndexNode" for n in plan.nodos) else [],
+                "collections": [{"name": n, "type": t} for n, t in sorted(plan.colecciones.items())],
+                "variables": [],
+                "estimatedCost": float(len(plan.nodos)),
+                "estimatedNrItems": 0,
+                "isModificationQuery": any(t == "write" for t in plan.colecciones.values())
+            }
+            return [resultado] if all_plans else resultado
+
+    def validate(self, query):
+        with self._db._operacion("post", "/_api/query"):
+            plan = self._db._plan(query)
+            return {"bind_vars": sorted(plan.binds), "collections": sorted(plan.colecciones), "parsed": True}
+
+
+class BaseDatosMemoria:
+    """Subconjunto de arango.database.StandardDatabase, todo en memoria."""
+
+    def __init__(self, nombre="minimarket_db"):
+        self.name = nombre
+        self._colecciones = {}
+        self._vistas = {}
+        self._analizadores = {"identity": _ANALIZADOR_IDENTITY}
+        self._version_vistas = 0
+        self._lock = threading.RLock()
+        self._claves = contador(1)
+        self._revs = contador(1)
+        self._planes = {}
+        self.aql = AQLMemoria(self)
+        self._transacciones = threading.local()
+        self.requests = 0
+        self.duracion_total = 0.0
+
+    def __repr__(self):
+        return f"<BaseDatosMemoria {self.name}>"
+
+    # ---- internas ----
+    class _Operacion:
+        def __init__(self, db, metodo, url):
+            self.db, self.metodo, self.url = db, metodo, url
+
+        def __enter__(self):
+            self.db._lock.acquire()
+            self.inicio = time.perf_counter()
+
+        def __exit__(self, tipo, error, traza):
+            duracion = time.perf_counter() - self.inicio
+            self.db.requests += 1
+            self.db.duracion_total += duracion
+            self.db._lock.release()
+            notificar_llamada_db(self.metodo, self.url, duracion, tipo is None)
+            return False
+
+    def _operacion(self, metodo, url):
+        return self._Operacion(self, metodo, url)
+
+    def _anotar(self, entrada, ej):
+        """Registra (coleccion, clave, documento previo) para deshacer la consulta y/o la transacción."""
+        if ej is not None:
+            ej.deshacer.append(entrada)
+        transaccion = getattr(self._transacciones, "actual", None)
+        if transaccion is not None:
+            transaccion.deshacer.append(entrada)
+
+    def _nueva_clave(self):
+        return next(self._claves)
+
+    def _nueva_rev(self):
+        return "_" + format(next(self._revs), "x").rjust(10, "0")
+
+    def _coleccion(self, nombre):
+        col = self._colecciones.get(nombre)
+        if col is None:
+            raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA,
+                                     f"collection or view not found: {nombre}", 404)
+        return col
+
+    def _documento(self, nombre, clave, ej):
+        col = self._colecciones.get(nombre)
+        if col is None:
+            raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA,
+                                     f"collection or view not found: {nombre}", 404)
+        doc = col.docs.get(clave)
+        if doc is not None:
+            ej.scanned_index += 1
+        return doc
+
+    def _como_valor(self, nombre, ej):
+        col = self._colecciones.get(nombre)
+        if col is None:
+            raise ErrorArangoMemoria(ERR_VARIABLE_DESCONOCIDA, f"variable '{nombre}' is not defined")
+        ej.scanned_full += len(col.docs)
+        return list(col.docs.values())
+
+    def _plan(self, query):
+        # Los planes dependen de los índices existentes: se cachean por
+        # texto de la consulta y se descartan al crear/borrar índices.
+        firma = (query, tuple((n, id(c), len(c.indices)) for n, c in sorted(self._colecciones.items())),
+                 self._version_vistas)
+        plan = self._planes.get(firma)
+        if plan is None:
+            plan = _Plan(query, self)
+            if len(self._planes) > 500:
+                self._planes.clear()
+            self._planes[firma] = plan
+        return plan
+
+    def _analizador(self, nombre):
+        definicion = self._analizadores.get(_nombre_analizador(nombre))
+        if definicion is None:
+            raise ErrorArangoMemoria(ERR_PARAMETRO, f"analyzer not found: {nombre}")
+        return definicion
+
+    def _describir_analizador(self, definicion):
+        nombre = definicion["name"] if definicion["type"] == "identity" else f"{self.name}::{definicion['name']}"
+        return {**json.loads(json.dumps(definicion)), "name": nombre}
+
+    def _validar_binds(self, plan, bind_vars):
+        bind = dict(bind_vars or {})
+        for nombre in plan.binds:
+            if nombre not in bind:
+                raise ErrorArangoMemoria(ERR_BIND_FALTANTE,
+                                         f"no value specified for declared bind parameter '{nombre}'")
+        for nombre in bind:
+            if nombre not in plan.binds:
+                raise ErrorArangoMemoria(ERR_BIND_SOBRANTE,
+                                         f"bind parameter '{nombre}' was not declared in the query")
+        return _json(bind)
+
+    # ---- API de python-arango ----
+    def collection(self, name):
+        with self._lock:
+            col = self._colecciones.get(name)
+            # python-arango no consulta al servidor aquí: la colección puede no existir aún
+            return col if col is not None else _ColeccionPendiente(self, name)
+
+    def has_collection(self, name):
+        with self._operacion("get", "/_api/collection"):
+            return name in self._colecciones
+
+    def collections(self):
+        with self._operacion("get", "/_api/collection"):
+            return [{"id": n, "name": n, "system": False, "type": "document", "status": "loaded"}
+                    for n in sorted(self._colecciones)]
+
+    def create_collection(self, name, **kwargs):
+        with self._operacion("post", "/_api/collection"):
+            if name in self._colecciones:
+                raise ErrorArangoMemoria(ERR_NOMBRE_DUPLICADO, f"duplicate name: {name}", 409)
+            if name in self._vistas:
+                raise ErrorArangoMemoria(ERR_NOMBRE_DUPLICADO, f"duplicate name: {name}", 409)
+            col = self._colecciones[name] = ColeccionMemoria(self, name)
+            return col
+
+    def delete_collection(self, name, ignore_missing=False, system=None):
+        with self._operacion("delete", "/_api/collection"):
+            if name not in self._colecciones:
+                if ignore_missing:
+                    return False
+                raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA,
+                                         f"collection or view not found: {name}", 404)
+            for vista in list(self._colecciones[name].vistas):
+                vista.configurar({name: None}, reemplazar=False)
+            del self._colecciones[name]
+            self._version_vistas += 1
+            return True
+
+    def analyzers(self):
+        with self._operacion("get", "/_api/analyzer"):
+            return [self._describir_analizador(d) for _, d in sorted(self._analizadores.items())]
+
+    def analyzer(self, name):
+        with self._operacion("get", "/_api/analyzer"):
+            return self._describir_analizador(self._analizador(name))
+
+    def create_analyzer(self, name, analyzer_type, properties=None, features=None):
+        with self._operacion("post", "/_api/analyzer"):
+            nombre = _nombre_analizador(name)
+            definicion = {"name": nombre, "type": analyzer_type, "properties": dict(properties or {}),
+                          "features": sorted(features or [])}
+            _validar_analizador(analyzer_type, definicion["properties"])
+            existente = self._analizadores.get(nombre)
+            if existente is not None:
+                # Igual que el servidor: mismo nombre y definición devuelve el existente
+                if existente != definicion:
+                    raise ErrorArangoMemoria(ERR_PARAMETRO, f"Name collision detected for analyzer '{nombre}'")
+                return self._describir_analizador(existente)
+            self._analizadores[nombre] = definicion
+            return self._describir_analizador(definicion)
+
+    def delete_analyzer(self, name, force=False, ignore_missing=False):
+        with self._operacion("delete", "/_api/analyzer"):
+            nombre = _nombre_analizador(name)
+            if nombre not in self._analizadores or nombre == "identity":
+                if ignore_missing:
+                    return False
+                raise ErrorArangoMemoria(ERR_NO_ENCONTRADO, f"analyzer not found: {name}", 404)
+            del self._analizadores[nombre]
+            return True
+
+    def views(self):
+        with self._operacion("get", "/_api/view"):
+            return [{"id": v.id, "name": n, "type": "arangosearch"} for n, v in sorted(self._vistas.items())]
+
+    def view(self, name):
+        with self._operacion("get", "/_api/view"):
+            return self._vista(name).describir()
+
+    def _vista(self, nombre):
+        vista = self._vistas.get(nombre)
+        if vista is None:
+            raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA, f"collection or view not found: {nombre}", 404)
+        return vista
+
+    def create_arangosearch_view(self, name, properties=None):
+        with self._operacion("post", "/_api/view"):
+            if name in self._vistas or name in self._colecciones:
+                raise ErrorArangoMemoria(ERR_NOMBRE_DUPLICADO, f"duplicate name: {name}", 409)
+            vista = VistaMemoria(self, name)
+            vista.configurar((properties or {}).get("links"), reemplazar=True)
+            self._vistas[name] = vista
+            self._version_vistas += 1
+            return vista.describir()
+
+    def create_view(self, name, view_type, properties=None):
+        if view_type != "arangosearch":
+            raise ErrorArangoMemoria(ERR_PARAMETRO, f"view type not supported: {view_type}")
+        return self.create_arangosearch_view(name, properties)
+
+    def update_arangosearch_view(self, name, properties):
+        with self._operacion("patch", "/_api/view"):
+            vista = self._vista(name)
+            vista.configurar(properties.get("links"), reemplazar=False)
+            self._version_vistas += 1
+            return vista.describir()
+
+    def replace_arangosearch_view(self, name, properties):
+        with self._operacion("put", "/_api/view"):
+            vista = self._vista(name)
+            vista.configurar(properties.get("links"), reemplazar=True)
+            self._version_vistas += 1
+            return vista.describir()
+
+    def delete_view(self, name, ignore_missing=False):
+        with self._operacion("delete", "/_api/view"):
+            if name not in self._vistas:
+                if ignore_missing:
+                    return False
+                raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA, f"collection or view not found: {name}", 404)
+            self._vistas.pop(name).configurar({}, reemplazar=True)
+            self._version_vistas += 1
+            return True
+
+    def begin_transaction(self, read=None, write=None, exclusive=None, sync=None, allow_implicit=None,
+                          lock_timeout=None, max_size=None, **kwargs):
+        with self._operacion("post", "/_api/transaction/begin"):
+            return TransaccionMemoria(self)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "duracion_ms_promedio": round(self.duracion_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "colecciones": len(self._colecciones),
+                "documentos": sum(len(c.docs) for c in self._colecciones.values())
+            }
+
+
+class TransaccionMemoria:
+    """
+    Transacción de streaming (db.begin_transaction). Toma el lock de la base
+    hasta commit/abort, así que es exclusiva sobre todas las colecciones: los
+    demás hilos esperan. Las escrituras del hilo que la abrió se anotan para
+    revertirlas en abort_transaction().
+    """
+
+    _ids = contador(1)
+
+    def __init__(self, db):
+        self._db = db
+        self.transaction_id = str(next(self._ids))
+        self.deshacer = []
+        self.estado = "running"
+        db._lock.acquire()
+        db._transacciones.actual = self
+
+    def __getattr__(self, atributo):
+        return getattr(self._db, atributo)
+
+    def transaction_status(self):
+        return self.estado
+
+    def _terminar(self, estado):
+        if self.estado != "running":
+            raise ErrorArangoMemoria(ERR_TRANSACCION_NO_ENCONTRADA,
+                                     f"transaction '{self.transaction_id}' not found", 404)
+        self.estado = estado
+        self.deshacer = []
+        self._db._transacciones.actual = None
+        self._db._lock.release()
+
+    def commit_transaction(self):
+        self._terminar("committed")
+        return True
+
+    def abort_transaction(self):
+        for col, clave, previo in reversed(self.deshacer):
+            col._poner(clave, previo)
+        self._terminar("aborted")
+        return True
+
+
+class _ColeccionPendiente:
+    """Colección pedida con db.collection() que todavía no existe (error al usarla)."""
+
+    def __init__(self, db, nombre):
+        self._db = db
+        self.name = nombre
+
+    def __getattr__(self, atributo):
+        col = self._db._colecciones.get(self.name)
+        if col is None:
+            raise ErrorArangoMemoria(ERR_COLECCION_NO_ENCONTRADA,
+                                     f"collection or view not found: {self.name}", 404)
+        return getattr(col, atributo)
+
+
+# Una base por proceso: los workers creados por fork heredan una copia
+_bases = {}
+_lock_bases = threading.Lock()
+
+
+def base_memoria(nombre="minimarket_db"):
+    """Base en memoria del proceso (la misma en cada apertura de config.GestorConexion)."""
+    with _lock_bases:
+        if nombre not in _bases:
+            _bases[nombre] = BaseDatosMemoria(nombre)
+        return _bases[nombre]
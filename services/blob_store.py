@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from flask import send_file
+
+
+# Directorio por defecto para los PDFs (relativo a la raíz del proyecto)
+DIRECTORIO_DEFECTO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "pdfs")
+
+
+def calcular_hash(contenido):
+    """SHA-256 (hex) del contenido; es la dirección del blob."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+class AlmacenArchivos:
+    """
+    Almacén direccionado por contenido en el sistema de archivos local.
+    Cada PDF queda en <directorio>/<aa>/<bb>/<sha256>.pdf; guardar el mismo
+    contenido dos veces no duplica el archivo.
+    """
+    nombre = "archivos"
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or os.getenv("PDF_BLOB_DIR", DIRECTORIO_DEFECTO)
+
+    def ruta(self, sha256):
+        return os.path.join(self.directorio, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+    def guardar(self, contenido):
+        sha256 = calcular_hash(contenido)
+        destino = self.ruta(sha256)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # Escribir en temporal y renombrar: nunca queda un archivo a medias
+            fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(contenido)
+                os.replace(temporal, destino)
+            except Exception:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+                raise
+        return sha256
+
+    def existe(self, sha256):
+        return os.path.exists(self.ruta(sha256))
+
+    def leer(self, sha256):
+        with open(self.ruta(sha256), "rb") as f:
+            return f.read()
+
+    def enviar(self, sha256, download_name):
+        return send_file(
+            self.ruta(sha256),
+            as_attachment=True,
+            download_name=download_name,
+            mimetype="application/pdf",
+            conditional=True,
+            etag=sha256
+        )
+
+
+class AlmacenArango:
+    """
+    Almacén en una colección aparte de ArangoDB (_key = sha256).
+    Útil cuando el disco del servidor es efímero; los documentos de facturas
+    y contratos siguen guardando sólo la referencia.
+    """
+    nombre = "arango"
+
+    def __init__(self, coleccion="pdf_blobs"):
+        self.nombre_coleccion = coleccion
+        self._coleccion = None
+
+    def _col(self):
+        if self._coleccion is None:
+            from models.schema import coleccion
+            self._coleccion = coleccion(self.nombre_coleccion)
+        return self._coleccion
+
+    def guardar(self, contenido):
+        sha256 = calcular_hash(contenido)
+        self._col().insert({
+            "_key": sha256,
+            "bytes": len(contenido),
+            "data": base64.b64encode(contenido).decode("utf-8")
+        }, overwrite_mode="ignore")
+        return sha256
+
+    def existe(self, sha256):
+        return self._col().has(sha256)
+
+    def leer(self, sha256):
+        doc = self._col().get(sha256)
+        if not doc:
+            raise FileNotFoundError(sha256)
+        return base64.b64decode(doc["data"])
+
+    def enviar(self, sha256, download_name):
+        return send_file(
+            BytesIO(self.leer(sha256)),
+            as_attachment=True,
+            download_name=download_name,
+            mimetype="application/pdf",
+            conditional=True,
+            etag=sha256
+        )
+
+
+_ALMACENES = {"archivos": AlmacenArchivos, "arango": AlmacenArango}
+_instancias = {}
+
+
+def obtener_almacen(nombre=None):
+    """Devuelve el almacén indicado o el configurado en PDF_BLOB_BACKEND."""
+    nombre = nombre or os.getenv("PDF_BLOB_BACKEND", "archivos")
+    if nombre not in _instancias:
+        _instancias[nombre] = _ALMACENES[nombre]()
+    return _instancias[nombre]
+
+
+def guardar_pdf(contenido):
+    """
+    Guarda un PDF en el almacén configurado.
+    Devuelve los campos a guardar en el documento: {"pdf_ref", "pdf_sha256"}.
+    """
+    almacen = obtener_almacen()
+    sha256 = almacen.guardar(contenido)
+    return {"pdf_ref": f"{almacen.nombre}:{sha256}", "pdf_sha256": sha256}
+
+
+def _resolver(pdf_ref):
+    nombre, sha256 = pdf_ref.split(":", 1)
+    return obtener_almacen(nombre), sha256
+
+
+def leer_pdf(pdf_ref):
+    """Devuelve los bytes del PDF referenciado."""
+    almacen, sha256 = _resolver(pdf_ref)
+    return almacen.leer(sha256)
+
+
+def enviar_pdf(pdf_ref, download_name):
+    """
+    Respuesta Flask que transmite el PDF referenciado, con ETag (el hash),
+    GET condicional (304) y soporte de Range.
+    """
+    almacen, sha256 = _resolver(pdf_ref)
+    return almacen.enviar(sha256, download_name)
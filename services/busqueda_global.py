@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from services.indice_busqueda import IndiceTrigramas
+
+# Reconstrucción periódica: cubre lo que escriben los otros workers
+BUSQUEDA_GLOBAL_TTL = float(os.getenv("BUSQUEDA_GLOBAL_TTL_SEGUNDOS", "600"))
+# Construir el índice en el maestro de gunicorn (when_ready) para que los
+# workers lo hereden; con 0 (o sin gunicorn) se construye en la primera búsqueda
+BUSQUEDA_GLOBAL_AL_INICIO = os.getenv("BUSQUEDA_GLOBAL_AL_INICIO", "1") != "0"
+
+
+class BusquedaGlobal:
+    """
+    Buscador del administrador sobre todas las entidades (clientes, productos,
+    empleados, contratos, facturas) con un solo índice de trigramas en memoria.
+
+    - Cada modelo registra una fuente: tipo + función que recorre su colección
+      con un cursor en lotes y devuelve tuplas (_key, textos, datos).
+    - Los ids del índice son "tipo:_key" y cada resultado trae tipo, _key,
+      titulo, detalle y filtro (texto para filtrar el listado de la entidad).
+    - Los modelos lo parchan al crear/editar/eliminar; pasado el TTL se
+      reconstruye en un hilo aparte y mientras tanto responde el índice anterior.
+    """
+
+    def __init__(self, ttl=BUSQUEDA_GLOBAL_TTL):
+        self.ttl = ttl
+        self.indice = IndiceTrigramas(medir_memoria=True)
+        self._fuentes = {}
+        self._lock = threading.Lock()
+        self._construido_en = None
+        self._reconstruyendo = False
+        self.construcciones = 0
+        self.busquedas = 0
+        self.errores = 0
+
+    def registrar_fuente(self, tipo, cargador):
+        self._fuentes[tipo] = cargador
+
+    def tipos(self):
+        return tuple(self._fuentes)
+
+    # ---- Carga ----
+    def _entradas(self):
+        for tipo, cargador in list(self._fuentes.items()):
+            for clave, textos, datos in cargador():
+                yield f"{tipo}:{clave}", textos, {"tipo": tipo, "_key": str(clave), **datos}
+
+    def construir(self):
+        """Recorre todas las fuentes y reemplaza el índice. Devuelve la cantidad de documentos."""
+        try:
+            self.indice.construir(self._entradas())
+        except Exception:
+            with self._lock:
+                self.errores += 1
+            raise
+        with self._lock:
+            self._construido_en = time.monotonic()
+            self.construcciones += 1
+        return len(self.indice)
+
+    def construir_al_inicio(self):
+        """construir() informando el resultado por consola (no lanza errores)."""
+        try:
+            documentos = self.construir()
+            print(f"✅ Índice de búsqueda global: {documentos} documentos en "
+                  f"{self.indice.ms_construccion:.0f} ms (~{self.indice.bytes_estimados / 1048576:.1f} MB)")
+        except Exception as e:
+            print("❌ Error construyendo el índice de búsqueda global:", e)
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.construir()
+        except Exception as e:
+            print("❌ Error reconstruyendo el índice de búsqueda global:", e)
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+
+    def _asegurar(self):
+        with self._lock:
+            construido_en = self._construido_en
+            vencido = construido_en is not None and (time.monotonic() - construido_en) >= self.ttl
+            if vencido and not self._reconstruyendo:
+                self._reconstruyendo = True
+                threading.Thread(target=self._reconstruir_en_segundo_plano, daemon=True).start()
+        if construido_en is None:
+            self.construir()
+
+    # ---- Escrituras (las llaman los modelos) ----
+    def guardar(self, tipo, clave, textos, datos):
+        """Indexa (o reindexa) un documento si el índice ya está construido."""
+        self.indice.agregar(f"{tipo}:{clave}", textos, {"tipo": tipo, "_key": str(clave), **datos})
+
+    def quitar(self, tipo, clave):
+        self.indice.quitar(f"{tipo}:{clave}")
+
+    # ---- Consultas ----
+    def buscar(self, consulta, limite=20, tipos=None):
+        """Resultados ordenados por relevancia; 'tipos' restringe las entidades."""
+        self._asegurar()
+        with self._lock:
+            self.busquedas += 1
+        filtro = None
+        if tipos:
+            prefijos = tuple(f"{tipo}:" for tipo in tipos)
+            filtro = lambda doc_id: doc_id.startswith(prefijos)
+        return self.indice.buscar(consulta, limite, filtro)
+
+    def metricas(self):
+        with self._lock:
+            construido_en = self._construido_en
+            valores = {
+                "documentos": len(self.indice),
+                "bytes_estimados": self.indice.bytes_estimados,
+                "ms_construccion": round(self.indice.ms_construccion, 3),
+                "construcciones": self.construcciones,
+                "busquedas": self.busquedas,
+                "errores": self.errores,
+                "ttl_segundos": self.ttl
+            }
+        valores["edad_segundos"] = round(time.monotonic() - construido_en, 1) if construido_en is not None else -1
+        return valores
+
+
+# Índice compartido por los modelos y /admin/buscar
+busqueda = BusquedaGlobal()
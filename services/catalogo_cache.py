@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+from services.indice_busqueda import IndiceTrigramas
+
+
+class ItemCatalogo:
+    """
+    Producto + precio + stock en un objeto compacto (sin __dict__).
+    Se usa igual que el documento en las plantillas (p._key, p.nombre,
+    p.stock, p.stock_info.cantidad...).
+    """
+    __slots__ = ("_key", "nombre", "precio", "categoria", "fecha_registro", "codigo_barras",
+                 "stock", "tiene_stock")
+
+    def __init__(self, _key, nombre="", precio=0.0, categoria="", fecha_registro=None,
+                 codigo_barras=None, stock=0, tiene_stock=False):
+        self._key = _key
+        self.nombre = nombre
+        self.precio = precio
+        self.categoria = categoria
+        self.fecha_registro = fecha_registro
+        self.codigo_barras = codigo_barras
+        self.stock = stock
+        self.tiene_stock = tiene_stock
+
+    @property
+    def stock_info(self):
+        return {"cantidad": self.stock} if self.tiene_stock else None
+
+    def get(self, campo, defecto=None):
+        valor = getattr(self, campo, None)
+        return defecto if valor is None else valor
+
+    def __getitem__(self, campo):
+        return getattr(self, campo)
+
+    def a_dict(self):
+        return {
+            "_key": self._key,
+            "nombre": self.nombre,
+            "precio": self.precio,
+            "categoria": self.categoria,
+            "codigo_barras": self.codigo_barras,
+            "stock": self.stock
+        }
+
+
+class CatalogoCache:
+    """
+    Copia en memoria del catálogo (productos + stock) por proceso.
+
+    - Se carga con una sola consulta que cruza productos y stock sin
+      subconsultas por producto.
+    - Los modelos la parchan al escribir (crear/actualizar/eliminar producto,
+      descuentos de stock); el TTL cubre los cambios hechos por otros workers.
+    - Mantiene un índice de trigramas por nombre y categoría para el
+      buscador del punto de venta.
+    - Vencido el TTL recarga una sola petición a la vez (las demás siguen con
+      la copia anterior); las escrituras que llegan mientras tanto se anotan
+      y se vuelven a aplicar sobre la copia nueva antes de publicarla.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOGO_TTL_SEGUNDOS", "60"))
+        self._lock = threading.Lock()
+        self._recarga = threading.Lock()
+        self._registro = None    # escrituras durante la recarga en curso (None = no hay recarga)
+        self._items = None
+        self._ordenados = None
+        self._por_codigo = {}
+        self._cargado_en = 0.0
+        self.indice = IndiceTrigramas()
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+
+    def _cargar(self):
+        from config import obtener_db
+        aql = """
+        LET existencias = (
+            FOR s IN stock
+                FILTER s.producto_id != null
+                RETURN {id: s.producto_id, cantidad: s.cantidad}
+        )
+        LET mapa_stock = ZIP(existencias[*].id, existencias[*].cantidad)
+        FOR p IN productos
+            RETURN {
+                _key: p._key,
+                nombre: p.nombre,
+                precio: p.precio,
+                categoria: p.categoria,
+                fecha_registro: p.fecha_registro,
+                codigo_barras: p.codigo_barras,
+                stock: mapa_stock[p._key]
+            }
+        """
+        items = {}
+        for p in obtener_db().aql.execute(aql):
+            items[p["_key"]] = ItemCatalogo(
+                p["_key"],
+                p.get("nombre") or "",
+                float(p.get("precio") or 0),
+                p.get("categoria") or "",
+                p.get("fecha_registro"),
+                p.get("codigo_barras"),
+                int(p["stock"]) if p.get("stock") is not None else 0,
+                p.get("stock") is not None
+            )
+        return items
+
+    def _vigente(self):
+        return self._items is not None and (time.monotonic() - self._cargado_en) < self.ttl
+
+    def _asegurar(self):
+        """Devuelve el dict de items, recargando si no hay copia vigente."""
+        with self._lock:
+            if self._vigente():
+                self.aciertos += 1
+                return self._items
+            self.fallos += 1
+            if self._registro is not None and self._items is not None:
+                # Otra petición ya está recargando: mientras tanto, la copia anterior
+                return self._items
+        with self._recarga:
+            with self._lock:
+                if self._vigente():
+                    return self._items
+                registro = self._registro = []
+            try:
+                items = self._cargar()
+                self.indice.construir((k, (i.nombre, i.categoria), i) for k, i in items.items())
+            except Exception:
+                with self._lock:
+                    self._registro = None
+                raise
+            with self._lock:
+                self._registro = None
+                self._items = items
+                self._ordenados = None
+                self._por_codigo = {i.codigo_barras: i for i in items.values() if i.codigo_barras}
+                self._cargado_en = time.monotonic()
+                self.recargas += 1
+                # La carga pudo leer la base antes que estas escrituras
+                for operacion, producto_id, valor in registro:
+                    if operacion == "guardar":
+                        self._guardar(producto_id, valor)
+                    elif operacion == "quitar":
+                        self._quitar(producto_id)
+                    else:
+                        self._ajustar(producto_id, valor)
+                return self._items
+
+    def listar(self):
+        """Lista de ItemCatalogo, más recientes primero."""
+        items = self._asegurar()
+        with self._lock:
+            if self._ordenados is None or items is not self._items:
+                self._ordenados = sorted(items.values(), key=lambda i: i.fecha_registro or "", reverse=True)
+            return self._ordenados
+
+    def obtener(self, producto_id):
+        """ItemCatalogo de un producto (o None)."""
+        return self._asegurar().get(str(producto_id))
+
+    def por_codigo(self, codigo_barras):
+        """
+        ItemCatalogo con ese código de barras si la copia está vigente.
+        Devuelve (encontrado, item): encontrado=False indica que no hay copia
+        vigente y hay que leer de la base (no se fuerza una recarga completa).
+        """
+        with self._lock:
+            if not self._vigente():
+                self.fallos += 1
+                return False, None
+            self.aciertos += 1
+            return True, self._por_codigo.get(codigo_barras)
+
+    def buscar(self, consulta, limite=10):
+        """ItemCatalogo cuyo nombre o categoría coincide con la consulta."""
+        self._asegurar()
+        return self.indice.buscar(consulta, limite)
+
+    # ---- Escrituras (las llaman los modelos) ----
+    def guardar_item(self, producto_id, **campos):
+        """Crea o actualiza un item si la copia está cargada."""
+        with self._lock:
+            if self._registro is not None:
+                self._registro.append(("guardar", str(producto_id), campos))
+            self._guardar(str(producto_id), campos)
+
+    def quitar(self, producto_id):
+        with self._lock:
+            if self._registro is not None:
+                self._registro.append(("quitar", str(producto_id), None))
+            self._quitar(str(producto_id))
+
+    def ajustar_stock(self, restantes):
+        """restantes: dict {producto_id: stock actual} (tras descontar ventas)."""
+        with self._lock:
+            for producto_id, cantidad in restantes.items():
+                if self._registro is not None:
+                    self._registro.append(("stock", str(producto_id), int(cantidad)))
+                self._ajustar(str(producto_id), int(cantidad))
+
+    # Las tres siguientes se llaman con self._lock tomado
+    def _guardar(self, producto_id, campos):
+        if self._items is None:
+            return
+        item = self._items.get(producto_id)
+        if item is None:
+            item = ItemCatalogo(producto_id)
+            self._items[item._key] = item
+            self._ordenados = None
+        if "codigo_barras" in campos and item.codigo_barras:
+            self._por_codigo.pop(item.codigo_barras, None)
+        for campo, valor in campos.items():
+            setattr(item, campo, valor)
+        if item.codigo_barras:
+            self._por_codigo[item.codigo_barras] = item
+        if "stock" in campos:
+            item.tiene_stock = True
+        if "fecha_registro" in campos:
+            self._ordenados = None
+        if "nombre" in campos or "categoria" in campos:
+            self.indice.agregar(item._key, (item.nombre, item.categoria), item)
+
+    def _quitar(self, producto_id):
+        item = self._items.pop(producto_id, None) if self._items is not None else None
+        if item is not None:
+            self._ordenados = None
+            if item.codigo_barras:
+                self._por_codigo.pop(item.codigo_barras, None)
+        self.indice.quitar(producto_id)
+
+    def _ajustar(self, producto_id, cantidad):
+        item = self._items.get(producto_id) if self._items is not None else None
+        if item is not None:
+            item.stock = cantidad
+            item.tiene_stock = True
+
+    def invalidar(self):
+        with self._lock:
+            self._items = None
+            self._ordenados = None
+        self.indice.invalidar()
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "recargas": self.recargas,
+                "productos": len(self._items) if self._items is not None else 0,
+                "indexados": len(self.indice),
+                "ttl_segundos": self.ttl
+            }
+
+
+# Catálogo compartido por los modelos de productos y ventas
+catalogo = CatalogoCache()
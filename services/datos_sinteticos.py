@@ -0,0 +1,279 @@
+import os
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from models.contrato_model import campos_busqueda
+from models.schema import coleccion
+from services.secuencias import reservar_ids
+
+# Datos de prueba para la base en memoria (ARANGO_BACKEND=memoria).
+# Con la misma semilla y escala se generan siempre los mismos documentos,
+# así dos corridas de un benchmark trabajan sobre los mismos datos.
+ARANGO_MEMORIA_DATOS = os.getenv("ARANGO_MEMORIA_DATOS", "chico")   # escala (ver parametros_escala), o "0"
+SEMILLA = int(os.getenv("ARANGO_MEMORIA_SEMILLA", "42"))
+# Fecha de referencia (hoy, o ARANGO_MEMORIA_FECHA=AAAA-MM-DD): las ventas
+# generadas ocupan los días anteriores, así los reportes "últimos N días" tienen datos
+FECHA_BASE = datetime.fromisoformat(
+    os.getenv("ARANGO_MEMORIA_FECHA") or datetime.utcnow().date().isoformat()
+)
+
+ESCALAS = {
+    "chico": {"productos": 200, "clientes": 300, "empleados": 20, "dias": 30, "ventas_por_dia": 20},
+    "mediano": {"productos": 2000, "clientes": 5000, "empleados": 100, "dias": 180, "ventas_por_dia": 100},
+    "grande": {"productos": 10000, "clientes": 50000, "empleados": 400, "dias": 365, "ventas_por_dia": 400},
+}
+
+# (nombre, email, contraseña, rol): cuentas para entrar a la app sin servidor
+USUARIOS_DEMO = [
+    ("Administrador", "admin@minimarket.local", "admin123", "administrador"),
+    ("Vendedor Uno", "vendedor1@minimarket.local", "vendedor123", "vendedor"),
+    ("Vendedor Dos", "vendedor2@minimarket.local", "vendedor123", "vendedor"),
+]
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Camila", "Andrés", "Valentina", "Jorge", "Lucía",
+           "Carlos", "Sofía", "Miguel", "Daniela", "Julián", "Paula", "Sebastián", "Laura", "Óscar"]
+APELLIDOS = ["Gómez", "Rodríguez", "Martínez", "López", "García", "Pérez", "Sánchez", "Ramírez",
+             "Torres", "Díaz", "Vargas", "Castro", "Rojas", "Muñoz", "Ortiz", "Peña"]
+CIUDADES = [("Villavicencio", "Colombia"), ("Bogotá", "Colombia"), ("Medellín", "Colombia"),
+            ("Cali", "Colombia"), ("Quito", "Ecuador"), ("Lima", "Perú")]
+CATEGORIAS = {
+    "Lácteos": ["Leche", "Yogur", "Queso", "Mantequilla", "Kumis"],
+    "Panadería": ["Pan tajado", "Mogolla", "Croissant", "Tostadas", "Galletas"],
+    "Bebidas": ["Gaseosa", "Jugo", "Agua", "Té frío", "Café"],
+    "Aseo": ["Jabón", "Detergente", "Shampoo", "Crema dental", "Papel higiénico"],
+    "Despensa": ["Arroz", "Fríjol", "Lenteja", "Aceite", "Azúcar", "Sal", "Pasta"],
+    "Snacks": ["Papas", "Maní", "Chocolatina", "Platanitos", "Chicles"],
+}
+MARCAS = ["Alpina", "Colanta", "Ramo", "Postobón", "Diana", "Roa", "Nestlé", "Zenú", "Familia", "Fruco"]
+CARGOS = ["Cajero", "Vendedor", "Bodeguero", "Supervisor", "Auxiliar de aseo"]
+TIPOS_CONTRATO = ["Término fijo", "Término indefinido", "Prestación de servicios"]
+
+_LOTE = 1000
+_SUFIJOS = {"k": 1000, "m": 1000000}
+
+
+def parametros_escala(escala):
+    """
+    Cantidades a generar para una escala: un nombre de ESCALAS o una
+    cantidad de clientes/ventas ("10000", "10k", "1M"). Con una cantidad N
+    se generan N clientes, N ventas en 90 días, N/10 productos y N/100
+    empleados (cada uno con su contrato).
+    """
+    if escala in ESCALAS:
+        return ESCALAS[escala]
+    texto = str(escala).strip().lower()
+    multiplicador = _SUFIJOS.get(texto[-1:], 1)
+    try:
+        cantidad = int(float(texto.rstrip("km")) * multiplicador)
+    except ValueError:
+        raise ValueError(f"Escala desconocida: {escala} (opciones: {', '.join(ESCALAS)} o una cantidad como 10k)")
+    if cantidad <= 0:
+        raise ValueError(f"Escala inválida: {escala}")
+    return {
+        "productos": max(50, cantidad // 10),
+        "clientes": cantidad,
+        "empleados": max(10, cantidad // 100),
+        "dias": 90,
+        "ventas_por_dia": max(1, cantidad // 90),
+    }
+
+
+def _codigo_ean13(numero):
+    """Código de barras EAN-13 válido (prefijo 770) a partir de un número."""
+    base = f"770{numero:09d}"
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(base))
+    return base + str((10 - suma % 10) % 10)
+
+
+def _insertar(nombre, documentos):
+    col = coleccion(nombre)
+    for i in range(0, len(documentos), _LOTE):
+        col.insert_many(documentos[i:i + _LOTE])
+    return len(documentos)
+
+
+def _usuarios(ahora):
+    return [{
+        "_key": str(i),
+        "nombre": nombre,
+        "email": email,
+        "password": generate_password_hash(password),
+        "rol": rol,
+        "estado": "activo",
+        "fecha_registro": ahora.isoformat()
+    } for i, (nombre, email, password, rol) in enumerate(USUARIOS_DEMO, 1)]
+
+
+def _clientes(azar, cantidad, ahora):
+    clientes = []
+    for i in range(1, cantidad + 1):
+        nombre = f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}"
+        ciudad, pais = azar.choice(CIUDADES)
+        clientes.append({
+            "_key": f"c{i}",
+            "nombre": nombre,
+            "email": f"cliente{i}@correo.local",
+            "telefono": f"3{azar.randrange(10**9):09d}",
+            "direccion": f"Calle {azar.randint(1, 120)} # {azar.randint(1, 90)}-{azar.randint(1, 99)}",
+            "ciudad": ciudad,
+            "pais": pais,
+            "fecha_registro": (ahora - timedelta(days=azar.randint(0, 720))).isoformat()
+        })
+    return clientes
+
+
+def _productos(azar, cantidad, ahora):
+    productos, stock = [], []
+    categorias = list(CATEGORIAS)
+    for i in range(1, cantidad + 1):
+        categoria = azar.choice(categorias)
+        nombre = f"{azar.choice(CATEGORIAS[categoria])} {azar.choice(MARCAS)} {azar.choice([250, 500, 1000])}"
+        fecha = (ahora - timedelta(days=azar.randint(0, 365))).isoformat()
+        productos.append({
+            "_key": f"p{i}",
+            "nombre": nombre,
+            "precio": float(azar.randint(10, 400) * 100),
+            "categoria": categoria,
+            "codigo_barras": _codigo_ean13(i),
+            "fecha_registro": fecha
+        })
+        stock.append({
+            "_key": f"p{i}",
+            "producto_id": f"p{i}",
+            "cantidad": azar.randint(0, 500),
+            "ultima_actualizacion": fecha
+        })
+    return productos, stock
+
+
+def _empleados(azar, cantidad, ahora):
+    empleados, contratos = [], []
+    for i in range(1, cantidad + 1):
+        cargo = azar.choice(CARGOS)
+        empleados.append({
+            "_key": f"e{i}",
+            "nro_documento": str(10**9 + i),
+            "nombre": azar.choice(NOMBRES),
+            "apellido": azar.choice(APELLIDOS),
+            "edad": azar.randint(18, 60),
+            "genero": azar.choice(["Masculino", "Femenino"]),
+            "cargo": cargo,
+            "correo": f"empleado{i}@minimarket.local",
+            "nro_contacto": f"3{azar.randrange(10**9):09d}",
+            "estado": "activo" if azar.random() < 0.9 else "inactivo",
+            "observaciones": "",
+            "fecha_registro": (ahora - timedelta(days=azar.randint(0, 720))).isoformat()
+        })
+        inicio = ahora - timedelta(days=azar.randint(30, 700))
+        contrato = {
+            "empleado_id": f"e{i}",
+            "tipo_contrato": azar.choice(TIPOS_CONTRATO),
+            "fecha_inicio": inicio.date().isoformat(),
+            "fecha_fin": (inicio + timedelta(days=365)).date().isoformat(),
+            "salario": float(azar.randint(13, 40) * 100000),
+            "cargo": cargo,
+            "observaciones": "",
+            "fecha_registro": inicio.isoformat(),
+            "pdf_ref": None
+        }
+        contratos.append({**contrato, **campos_busqueda(contrato, empleados[-1])})
+    return empleados, contratos
+
+
+def _ventas(azar, escala, clientes, productos, ahora):
+    """Ventas de carrito y sus facturas con la misma forma que procesar_carrito."""
+    ventas, facturas = [], []
+    vendedores = [nombre for nombre, _, _, _ in USUARIOS_DEMO]
+    numero = 0
+    for dia in range(escala["dias"], 0, -1):
+        inicio_dia = (ahora - timedelta(days=dia)).replace(hour=8, minute=0, second=0, microsecond=0)
+        for _ in range(escala["ventas_por_dia"]):
+            numero += 1
+            cliente = azar.choice(clientes)
+            lineas = []
+            for producto in azar.sample(productos, azar.randint(1, 5)):
+                cantidad = azar.randint(1, 4)
+                lineas.append({
+                    "id": producto["_key"],
+                    "nombre": producto["nombre"],
+                    "precio": producto["precio"],
+                    "cantidad": cantidad,
+                    "subtotal": producto["precio"] * cantidad
+                })
+            total = sum(l["subtotal"] for l in lineas)
+            fecha = (inicio_dia + timedelta(seconds=azar.randint(0, 12 * 3600))).isoformat()
+            vendedor = azar.choice(vendedores)
+            ventas.append({
+                "_key": f"v{numero}",
+                "cliente_id": cliente["_key"],
+                "productos": lineas,
+                "total": total,
+                "fecha": fecha,
+                "vendedor": vendedor
+            })
+            facturas.append({
+                "_key": f"v{numero}",
+                "venta_id": f"v{numero}",
+                "cliente": cliente["nombre"],
+                "cliente_email": cliente["email"],
+                "productos": lineas,
+                "total": total,
+                "fecha": fecha,
+                "vendedor": vendedor,
+                "pdf_estado": "pendiente"
+            })
+    return ventas, facturas
+
+
+def poblar(escala="chico", semilla=SEMILLA):
+    """
+    Carga datos sintéticos en todas las colecciones del esquema
+    (escala: ver parametros_escala).
+    Pensado para la base en memoria; contra un servidor real agrega los
+    documentos a los existentes (y falla si las claves ya están).
+    Devuelve {coleccion: documentos insertados}.
+    """
+    from models.ventas_model import reconstruir_ventas_diarias
+
+    parametros = parametros_escala(escala)
+    azar = random.Random(semilla)
+    ahora = FECHA_BASE
+
+    clientes = _clientes(azar, parametros["clientes"], ahora)
+    productos, stock = _productos(azar, parametros["productos"], ahora)
+    empleados, contratos = _empleados(azar, parametros["empleados"], ahora)
+    ventas, facturas = _ventas(azar, parametros, clientes, productos, ahora)
+
+    usuarios = _usuarios(ahora)
+
+    # Números visibles (id_cliente, ...): un bloque por secuencia, en un solo viaje cada uno
+    for nombre, campo, documentos in (("usuarios", "id_usuario", usuarios), ("clientes", "id_cliente", clientes),
+                                      ("empleado", "id_empleado", empleados), ("contrato", "id_contrato", contratos)):
+        for documento, numero in zip(documentos, reservar_ids(nombre, len(documentos))):
+            documento[campo] = numero
+
+    insertados = {
+        "usuarios": _insertar("usuarios", usuarios),
+        "clientes": _insertar("clientes", clientes),
+        "productos": _insertar("productos", productos),
+        "stock": _insertar("stock", stock),
+        "empleados": _insertar("empleados", empleados),
+        "contratos": _insertar("contratos", contratos),
+        "ventas": _insertar("ventas", ventas),
+        "historial_facturas": _insertar("historial_facturas", facturas),
+    }
+    insertados["ventas_diarias"] = reconstruir_ventas_diarias()
+    return insertados
+
+
+def poblar_si_vacia():
+    """
+    Puebla la base según ARANGO_MEMORIA_DATOS si todavía no tiene usuarios.
+    Devuelve lo insertado, o None si no hizo nada.
+    """
+    if ARANGO_MEMORIA_DATOS in ("", "0") or coleccion("usuarios").count() > 0:
+        return None
+    insertados = poblar(ARANGO_MEMORIA_DATOS)
+    resumen = ", ".join(f"{n}={c}" for n, c in insertados.items())
+    print(f"✅ Datos sintéticos ({ARANGO_MEMORIA_DATOS}): {resumen}")
+    return insertados
@@ -0,0 +1,341 @@
+import heapq
+import os
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ("Café Orgánico" -> "cafe organico")."""
+    texto = unicodedata.normalize("NFKD", str(texto or "")).lower()
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def claves_texto(textos):
+    """
+    Claves de búsqueda de textos ya normalizados: sus trigramas y los
+    prefijos de 1 y 2 letras de cada palabra. Devuelve (trigramas, prefijos).
+    """
+    trigramas = set()
+    prefijos = set()
+    for texto in textos:
+        trigramas |= _trigramas(texto)
+        for palabra in texto.split():
+            prefijos.add(palabra[:1])
+            prefijos.add(palabra[:2])
+    return trigramas, prefijos
+
+
+def _claves_indice(textos):
+    """
+    Claves de un documento en IndiceTrigramas: (trigramas, prefijos de 1 a 3
+    letras de cada palabra, prefijos de 1 a 3 letras de cada texto).
+    """
+    trigramas = set()
+    palabras = set()
+    inicios = set()
+    for texto in textos:
+        trigramas |= _trigramas(texto)
+        inicios.update(texto[:n] for n in (1, 2, 3) if len(texto) >= n)
+        for palabra in texto.split():
+            palabras.update(palabra[:n] for n in (1, 2, 3) if len(palabra) >= n)
+    return trigramas, palabras, inicios
+
+
+def _tamanio_estructuras(docs, numeros, indices):
+    """
+    Bytes aproximados (sys.getsizeof) de las estructuras de un índice. Los
+    números de documento son los mismos objetos en docs y numeros: se cuentan
+    una vez. Las listas de números de cada clave son arrays (4 bytes por número).
+    """
+    total = sys.getsizeof(docs) + sys.getsizeof(numeros)
+    for numero, (doc_id, textos, datos) in docs.items():
+        total += sys.getsizeof(numero) + sys.getsizeof(doc_id)
+        total += sys.getsizeof(textos) + sum(sys.getsizeof(t) for t in textos)
+        total += sys.getsizeof(datos)
+        if isinstance(datos, dict):
+            total += sum(sys.getsizeof(v) for v in datos.values())
+    for indice in indices:
+        total += sys.getsizeof(indice)
+        for clave, numeros_clave in indice.items():
+            total += sys.getsizeof(clave) + sys.getsizeof(numeros_clave)
+    return total
+
+
+# Posiciones de cada tipo de clave en _indices / _agregados
+TRIGRAMAS, PALABRAS, INICIOS = 0, 1, 2
+
+
+class IndiceTrigramas:
+    """
+    Índice en memoria para búsqueda por prefijo y por subcadena.
+
+    - Cada documento se indexa por los trigramas de sus textos, por los
+      prefijos de 1 a 3 letras de cada palabra y por los de cada texto.
+    - Una consulta con varias palabras exige que estén todas (AND).
+    - Orden: primero los que empiezan con el término, luego los que tienen
+      una palabra que empieza con él y al final las coincidencias internas;
+      a igual rango, el texto principal más corto (y alfabético).
+    - Los documentos se numeran en ese orden secundario al construir, así una
+      consulta que coincide con miles de documentos sólo calcula el rango de
+      los primeros de cada grupo (los prefijos separan los grupos). Los que se
+      agregan después quedan al final de su rango hasta la próxima construcción.
+    - Cada clave guarda los números de sus documentos en un array compacto;
+      lo que agregan los modelos va a conjuntos aparte y lo que quitan sólo
+      sale de _docs (sus números se saltean) hasta la próxima construcción.
+    - Las escrituras que llegan mientras corre una construcción se anotan y
+      se vuelven a aplicar sobre el índice nuevo al reemplazar el anterior
+      (la carga pudo haber leído la colección antes que ellas).
+    - Si se le pasa un 'cargador' (función que devuelve tuplas
+      (id, textos, datos)) se carga en la primera búsqueda y se recarga
+      pasado el TTL; si no, lo alimenta su dueño con construir().
+    - Con medir_memoria=True cada construcción estima cuánta memoria ocupa
+      (bytes_estimados) y cuánto tardó (ms_construccion).
+    """
+
+    def __init__(self, cargador=None, ttl=None, medir_memoria=False):
+        self.cargador = cargador
+        self.medir_memoria = medir_memoria
+        self.bytes_estimados = 0
+        self.ms_construccion = 0.0
+        self.ttl = ttl if ttl is not None else float(os.getenv("INDICE_BUSQUEDA_TTL_SEGUNDOS", "300"))
+        self._lock = threading.Lock()
+        self._docs = {}          # número -> (id, textos, datos)
+        self._numeros = {}       # id -> número
+        self._indices = ({}, {}, {})
+        self._agregados = (defaultdict(set), defaultdict(set), defaultdict(set))
+        self._construidos = 0
+        self._siguiente = 0
+        self._cargado_en = None
+        self._registros = []     # una lista de escrituras por construcción en curso
+
+    # ---- Carga ----
+    def construir(self, entradas):
+        """Reemplaza el contenido con las tuplas (id, textos, datos) dadas."""
+        inicio = time.perf_counter()
+        registro = []
+        with self._lock:
+            self._registros.append(registro)
+        try:
+            docs, numeros, indices = self._estructuras(entradas)
+        except Exception:
+            with self._lock:
+                self._quitar_registro(registro)
+            raise
+        if self.medir_memoria:
+            self.bytes_estimados = _tamanio_estructuras(docs, numeros, indices)
+        self.ms_construccion = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self._quitar_registro(registro)
+            self._docs = docs
+            self._numeros = numeros
+            self._indices = indices
+            self._agregados = (defaultdict(set), defaultdict(set), defaultdict(set))
+            self._construidos = self._siguiente = len(docs)
+            self._cargado_en = time.monotonic()
+            for doc_id, textos, datos in registro:
+                if textos is None:
+                    self._desindexar(doc_id)
+                else:
+                    self._indexar(doc_id, textos, datos)
+
+    def _quitar_registro(self, registro):
+        # Por identidad: dos registros vacíos son iguales con ==
+        self._registros = [r for r in self._registros if r is not registro]
+
+    @staticmethod
+    def _estructuras(entradas):
+        """(docs, numeros, indices) de las tuplas (id, textos, datos)."""
+        leidos = {}
+        for doc_id, textos, datos in entradas:
+            textos = tuple(normalizar(t) for t in textos) or ("",)
+            leidos[str(doc_id)] = (textos, datos)
+        orden = sorted(leidos, key=lambda d: (len(leidos[d][0][0]), leidos[d][0][0], d))
+        docs = {}
+        numeros = {}
+        indices = tuple(defaultdict(lambda: array("I")) for _ in range(3))
+        for numero, doc_id in enumerate(orden):
+            textos, datos = leidos.pop(doc_id)
+            docs[numero] = (doc_id, textos, datos)
+            numeros[doc_id] = numero
+            for indice, claves in zip(indices, _claves_indice(textos)):
+                for clave in claves:
+                    indice[clave].append(numero)
+        return docs, numeros, tuple(dict(indice) for indice in indices)
+
+    def _asegurar(self):
+        if self.cargador is None:
+            return
+        if self._cargado_en is None or (time.monotonic() - self._cargado_en) >= self.ttl:
+            self.construir(self._entradas_cargador())
+
+    def _entradas_cargador(self):
+        # Generador: el cargador lee la base recién cuando construir() ya anota las escrituras
+        yield from self.cargador()
+
+    def _desindexar(self, doc_id):
+        numero = self._numeros.pop(doc_id, None)
+        if numero is None:
+            return
+        _, textos, _ = self._docs.pop(numero)
+        if numero < self._construidos:
+            return
+        for agregados, claves in zip(self._agregados, _claves_indice(textos)):
+            for clave in claves:
+                numeros = agregados.get(clave)
+                if numeros is not None:
+                    numeros.discard(numero)
+                    if not numeros:
+                        del agregados[clave]
+
+    def _indexar(self, doc_id, textos, datos):
+        self._desindexar(doc_id)
+        numero = self._siguiente
+        self._siguiente += 1
+        self._docs[numero] = (doc_id, textos, datos)
+        self._numeros[doc_id] = numero
+        for agregados, claves in zip(self._agregados, _claves_indice(textos)):
+            for clave in claves:
+                agregados[clave].add(numero)
+
+    # ---- Escrituras (las llaman los modelos) ----
+    def agregar(self, doc_id, textos, datos):
+        """Indexa (o reindexa) un documento si el índice ya está cargado o construyéndose."""
+        doc_id = str(doc_id)
+        textos = tuple(normalizar(t) for t in textos) or ("",)
+        with self._lock:
+            for registro in self._registros:
+                registro.append((doc_id, textos, datos))
+            if self._cargado_en is not None:
+                self._indexar(doc_id, textos, datos)
+
+    def quitar(self, doc_id):
+        doc_id = str(doc_id)
+        with self._lock:
+            for registro in self._registros:
+                registro.append((doc_id, None, None))
+            self._desindexar(doc_id)
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    # ---- Consultas ----
+    def _cantidad(self, tipo, clave):
+        return len(self._indices[tipo].get(clave, ())) + len(self._agregados[tipo].get(clave, ()))
+
+    def _conjunto(self, tipo, clave):
+        numeros = set(self._indices[tipo].get(clave, ()))
+        numeros.update(self._agregados[tipo].get(clave, ()))
+        return numeros
+
+    def _filtrar(self, numeros, tipo, clave):
+        """Los de 'numeros' que tienen la clave."""
+        if not numeros:
+            return set()
+        resultado = numeros.intersection(self._indices[tipo].get(clave, ()))
+        agregados = self._agregados[tipo].get(clave)
+        if agregados:
+            resultado |= numeros & agregados
+        return resultado
+
+    def _candidatos(self, termino):
+        if len(termino) < 3:
+            return self._conjunto(PALABRAS, termino)
+        claves = sorted(_trigramas(termino), key=lambda t: self._cantidad(TRIGRAMAS, t))
+        numeros = self._conjunto(TRIGRAMAS, claves[0])
+        for clave in claves[1:]:
+            numeros = self._filtrar(numeros, TRIGRAMAS, clave)
+        return numeros
+
+    @staticmethod
+    def _rango(terminos, textos):
+        """0 = empieza con el término, 1 = palabra que empieza, 2 = subcadena."""
+        total = 0
+        for termino in terminos:
+            mejor = None
+            for texto in textos:
+                if texto.startswith(termino):
+                    mejor = 0
+                    break
+                if any(p.startswith(termino) for p in texto.split()):
+                    mejor = 1
+                elif mejor is None and termino in texto:
+                    mejor = 2
+            if mejor is None:
+                return None
+            total += mejor
+        return total
+
+    def _grupos(self, terminos, candidatos):
+        """
+        Reparte los candidatos en (rango mínimo, números): los que tienen un
+        texto que empieza con el prefijo de cada término (rango >= 0), los que
+        tienen una palabra que empieza con él (>= 1) y el resto (>= 2).
+        """
+        palabras = candidatos
+        for termino in terminos:
+            palabras = self._filtrar(palabras, PALABRAS, termino[:3])
+        primeros = palabras
+        for termino in terminos:
+            primeros = self._filtrar(primeros, INICIOS, termino[:3])
+        return ((0, primeros), (1, palabras - primeros), (2, candidatos - palabras))
+
+    def buscar(self, consulta, limite=10, filtro=None):
+        """
+        Devuelve los 'datos' de los mejores 'limite' documentos.
+        filtro(doc_id) opcional descarta documentos antes de ordenarlos.
+        """
+        terminos = normalizar(consulta).split()
+        if not terminos or limite <= 0:
+            return []
+        self._asegurar()
+        with self._lock:
+            candidatos = None
+            for termino in sorted(terminos, key=len, reverse=True):
+                numeros = self._candidatos(termino)
+                candidatos = numeros if candidatos is None else candidatos & numeros
+                if not candidatos:
+                    return []
+            resultados = []
+            for minimo, grupo in self._grupos(terminos, candidatos):
+                # Los de este grupo y los siguientes tienen rango >= minimo
+                mejores = sum(1 for r in resultados if r[0] < minimo)
+                if mejores >= limite:
+                    break
+                # Los de rango == minimo de grupos anteriores ganan sólo a los de número mayor
+                iguales = sorted(r[1] for r in resultados if r[0] == minimo)
+                previos = propios = 0
+                for numero in sorted(grupo):
+                    entrada = self._docs.get(numero)
+                    if entrada is None:
+                        continue
+                    doc_id, textos, datos = entrada
+                    if filtro is not None and not filtro(doc_id):
+                        continue
+                    rango = self._rango(terminos, textos)
+                    if rango is None:
+                        continue
+                    resultados.append((rango, numero, datos))
+                    if rango == minimo:
+                        propios += 1
+                        while previos < len(iguales) and iguales[previos] < numero:
+                            previos += 1
+                        # El resto del grupo tiene rango >= minimo y número mayor
+                        if mejores + previos + propios >= limite:
+                            break
+                else:
+                    continue
+                break
+        mejores = heapq.nsmallest(limite, resultados, key=lambda r: r[:2])
+        return [r[2] for r in mejores]
+
+    def __len__(self):
+        return len(self._docs)
@@ -0,0 +1,179 @@
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request, session
+from config import OBSERVADORES_DB
+
+# Límites (le) de los histogramas
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_LLAMADAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Token opcional para que Prometheus lea /metrics sin sesión (Authorization: Bearer ...)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _tipo_llamada(url):
+    """Clasifica el request HTTP a ArangoDB según la API usada."""
+    for fragmento, tipo in (("/_api/cursor", "aql"), ("/_api/document", "documento"),
+                            ("/_api/collection", "coleccion"), ("/_api/index", "indice")):
+        if fragmento in url:
+            return tipo
+    return "otro"
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.total}'
+        yield f"{nombre}_sum{{{etiquetas}}} {self.suma}"
+        yield f"{nombre}_count{{{etiquetas}}} {self.total}"
+
+
+class RegistroMetricas:
+    """
+    Métricas del proceso en formato Prometheus:
+    latencia, tamaño de respuesta y códigos de estado por endpoint, y
+    llamadas a la base (cantidad y tiempo) hechas dentro de cada request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latencia = {}
+        self.bytes = {}
+        self.llamadas_por_request = {}
+        self.estados = {}
+        self.db_llamadas = {}
+        self.db_segundos = {}
+        self.fuentes = []
+
+    # ---- Llamadas a la base (las notifica config.ClienteHTTPMedido) ----
+    def observar_db(self, metodo, url, segundos, ok):
+        actual = getattr(self._local, "request", None)
+        endpoint = actual["endpoint"] if actual is not None else "fuera_de_request"
+        if actual is not None:
+            actual["llamadas"] += 1
+        clave = (endpoint, _tipo_llamada(url))
+        with self._lock:
+            self.db_llamadas[clave] = self.db_llamadas.get(clave, 0) + 1
+            self.db_segundos[clave] = self.db_segundos.get(clave, 0.0) + segundos
+
+    # ---- Requests HTTP ----
+    def iniciar_request(self, endpoint):
+        self._local.request = {"endpoint": endpoint, "inicio": time.perf_counter(), "llamadas": 0}
+
+    def terminar_request(self, metodo, estado, tamanio):
+        actual = getattr(self._local, "request", None)
+        if actual is None:
+            return
+        self._local.request = None
+        endpoint = actual["endpoint"]
+        duracion = time.perf_counter() - actual["inicio"]
+        with self._lock:
+            self.latencia.setdefault(endpoint, Histograma(BUCKETS_LATENCIA)).observar(duracion)
+            self.bytes.setdefault(endpoint, Histograma(BUCKETS_BYTES)).observar(tamanio)
+            self.llamadas_por_request.setdefault(endpoint, Histograma(BUCKETS_LLAMADAS)).observar(actual["llamadas"])
+            clave = (endpoint, metodo, estado)
+            self.estados[clave] = self.estados.get(clave, 0) + 1
+
+    def agregar_fuente(self, prefijo, funcion):
+        """Publica como gauges los valores numéricos del dict que devuelve funcion()."""
+        if all(p != prefijo for p, _ in self.fuentes):
+            self.fuentes.append((prefijo, funcion))
+
+    # ---- Exportación ----
+    def texto_prometheus(self):
+        lineas = []
+        with self._lock:
+            secciones = (
+                ("http_request_duration_seconds", "Latencia de los requests por endpoint", self.latencia),
+                ("http_response_size_bytes", "Tamaño de las respuestas por endpoint", self.bytes),
+                ("http_request_db_calls", "Llamadas a ArangoDB por request", self.llamadas_por_request),
+            )
+            for nombre, ayuda, histogramas in secciones:
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+                for endpoint, histograma in sorted(histogramas.items()):
+                    lineas += histograma.lineas(nombre, f'endpoint="{endpoint}"')
+
+            lineas += ["# HELP http_requests_total Requests por endpoint, método y código",
+                       "# TYPE http_requests_total counter"]
+            for (endpoint, metodo, estado), total in sorted(self.estados.items()):
+                lineas.append(f'http_requests_total{{endpoint="{endpoint}",method="{metodo}",status="{estado}"}} {total}')
+
+            lineas += ["# HELP db_calls_total Llamadas a ArangoDB por endpoint y tipo",
+                       "# TYPE db_calls_total counter"]
+            for (endpoint, tipo), total in sorted(self.db_llamadas.items()):
+                lineas.append(f'db_calls_total{{endpoint="{endpoint}",tipo="{tipo}"}} {total}')
+            lineas += ["# HELP db_call_seconds_total Tiempo en llamadas a ArangoDB por endpoint y tipo",
+                       "# TYPE db_call_seconds_total counter"]
+            for (endpoint, tipo), segundos in sorted(self.db_segundos.items()):
+                lineas.append(f'db_call_seconds_total{{endpoint="{endpoint}",tipo="{tipo}"}} {segundos}')
+
+        for prefijo, funcion in self.fuentes:
+            try:
+                valores = funcion()
+            except Exception as e:
+                print(f"❌ Error leyendo métricas de {prefijo}:", e)
+                continue
+            for clave, valor in sorted(valores.items()):
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    lineas += [f"# TYPE {prefijo}_{clave} gauge", f"{prefijo}_{clave} {valor}"]
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+
+def _autorizado():
+    if "usuario" in session and session["usuario"].get("rol") == "administrador":
+        return True
+    if METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+    return False
+
+
+def instalar_metricas(app):
+    """Registra el middleware de métricas y la ruta /metrics (sólo administradores)."""
+    if registro.observar_db not in OBSERVADORES_DB:
+        OBSERVADORES_DB.append(registro.observar_db)
+
+    @app.before_request
+    def _inicio_request():
+        registro.iniciar_request(request.endpoint or "sin_ruta")
+
+    @app.after_request
+    def _respuesta(respuesta):
+        g.metricas_estado = respuesta.status_code
+        g.metricas_bytes = respuesta.content_length or 0
+        return respuesta
+
+    @app.teardown_request
+    def _fin_request(error):
+        registro.terminar_request(
+            request.method,
+            g.get("metricas_estado", 500),
+            g.get("metricas_bytes", 0)
+        )
+
+    @app.route("/metrics")
+    def metrics():
+        if not _autorizado():
+            return Response("No autorizado\n", status=403, mimetype="text/plain")
+        return Response(registro.texto_prometheus(), mimetype="text/plain; version=0.0.4")
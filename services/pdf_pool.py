@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolPDF:
+    """
+    Pool de hilos para generar PDFs fuera del request.
+
+    - Los trabajos se identifican por una clave (ej. el _key de la factura):
+      si ya hay uno en curso con esa clave se devuelve el mismo Future.
+    - El executor se crea en el primer uso y se recrea si el proceso cambió
+      (fork de un servidor multi-worker), así cada worker tiene sus hilos.
+    - Lleva métricas de profundidad de cola y tiempos de render.
+    """
+
+    def __init__(self, hilos=None):
+        self.hilos = hilos or int(os.getenv("PDF_RENDER_HILOS", "2"))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pendientes = {}
+        self._en_cola = 0
+        self._en_proceso = 0
+        self._completados = 0
+        self._errores = 0
+        self._tiempo_total = 0.0
+        self._tiempo_max = 0.0
+        self._tiempo_ultimo = 0.0
+
+    def _obtener_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="pdf")
+            self._pid = os.getpid()
+            self._pendientes = {}
+            self._en_cola = 0
+            self._en_proceso = 0
+        return self._executor
+
+    def encolar(self, clave, funcion, *args):
+        """Encola funcion(*args) bajo 'clave' y devuelve su Future."""
+        with self._lock:
+            executor = self._obtener_executor()
+            futuro = self._pendientes.get(clave)
+            if futuro is not None and not futuro.done():
+                return futuro
+            self._en_cola += 1
+            futuro = executor.submit(self._ejecutar, funcion, *args)
+            self._pendientes[clave] = futuro
+        futuro.add_done_callback(lambda f, c=clave: self._liberar(c, f))
+        return futuro
+
+    def pendiente(self, clave):
+        """Devuelve el Future en curso para 'clave' (o None)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return None
+            futuro = self._pendientes.get(clave)
+            return futuro if futuro is not None and not futuro.done() else None
+
+    def _ejecutar(self, funcion, *args):
+        with self._lock:
+            self._en_cola -= 1
+            self._en_proceso += 1
+        inicio = time.perf_counter()
+        ok = False
+        try:
+            resultado = funcion(*args)
+            ok = True
+            return resultado
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._en_proceso -= 1
+                if ok:
+                    self._completados += 1
+                    self._tiempo_total += duracion
+                    self._tiempo_max = max(self._tiempo_max, duracion)
+                    self._tiempo_ultimo = duracion
+                else:
+                    self._errores += 1
+
+    def _liberar(self, clave, futuro):
+        with self._lock:
+            if self._pendientes.get(clave) is futuro:
+                del self._pendientes[clave]
+
+    def metricas(self):
+        """Profundidad de cola y tiempos de render (en milisegundos)."""
+        with self._lock:
+            return {
+                "hilos": self.hilos,
+                "en_cola": self._en_cola,
+                "en_proceso": self._en_proceso,
+                "completados": self._completados,
+                "errores": self._errores,
+                "render_ms_promedio": round(self._tiempo_total / self._completados * 1000, 2) if self._completados else 0.0,
+                "render_ms_max": round(self._tiempo_max * 1000, 2),
+                "render_ms_ultimo": round(self._tiempo_ultimo * 1000, 2)
+            }
+
+
+# Pool compartido por las rutas de facturación
+pool_facturas = PoolPDF()
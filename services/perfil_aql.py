@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Consultas más lentas que esto (ms) van al log JSONL y se perfilan
+AQL_LENTA_MS = float(os.getenv("AQL_LENTA_MS", "200"))
+AQL_LOG_LENTO = os.getenv(
+    "AQL_LOG_LENTO",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "aql_lento.jsonl")
+)
+AQL_LOG_MAX_BYTES = int(os.getenv("AQL_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+AQL_LOG_ARCHIVOS = int(os.getenv("AQL_LOG_ARCHIVOS", "5"))
+
+
+def normalizar_consulta(query):
+    return " ".join(query.split())
+
+
+def huella(query):
+    """Identificador estable de una consulta (mismo texto = misma huella)."""
+    return hashlib.sha1(normalizar_consulta(query).encode("utf-8")).hexdigest()[:12]
+
+
+def forma_bind_vars(bind_vars):
+    """Tipos (no valores) de los bind vars: {"q": "str", "lineas": "list[3]"}."""
+    forma = {}
+    for nombre, valor in (bind_vars or {}).items():
+        if isinstance(valor, (list, tuple)):
+            forma[nombre] = f"list[{len(valor)}]"
+        else:
+            forma[nombre] = type(valor).__name__
+    return forma
+
+
+def _resumen_plan(plan):
+    """Nodos del plan que leen colecciones: tipo, colección e índices usados."""
+    nodos = []
+    for nodo in plan.get("nodes", []):
+        if nodo.get("type") in ("EnumerateCollectionNode", "IndexNode"):
+            nodos.append({
+                "id": nodo.get("id"),
+                "tipo": nodo.get("type"),
+                "coleccion": nodo.get("collection"),
+                "indices": [i.get("name") for i in nodo.get("indexes", [])]
+            })
+    return nodos
+
+
+class PerfilAQL:
+    """
+    Estadísticas por consulta (agrupadas por huella) y log de consultas lentas.
+
+    - Por cada ejecución: duración (incluye traer todos los lotes), filas,
+      y estadísticas del servidor (scanned_full, scanned_index, filtered).
+    - La primera vez que una consulta supera AQL_LENTA_MS se guarda su plan
+      (explain) y la siguiente ejecución se hace con profile=2; ambos quedan
+      en el log JSONL rotativo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultas = {}
+        self._planes = {}
+        self._perfilar = set()
+        self._logger = None
+
+    def _log(self):
+        if self._logger is None:
+            os.makedirs(os.path.dirname(AQL_LOG_LENTO), exist_ok=True)
+            logger = logging.getLogger("aql_lento")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            manejador = RotatingFileHandler(AQL_LOG_LENTO, maxBytes=AQL_LOG_MAX_BYTES,
+                                            backupCount=AQL_LOG_ARCHIVOS, encoding="utf-8")
+            manejador.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(manejador)
+            self._logger = logger
+        return self._logger
+
+    def debe_perfilar(self, clave):
+        with self._lock:
+            return clave in self._perfilar
+
+    def registrar(self, db, query, bind_vars, duracion, filas, stats, profile=None, error=None,
+                  explicar=True):
+        clave = huella(query)
+        ms = duracion * 1000
+        lenta = ms >= AQL_LENTA_MS
+        with self._lock:
+            c = self.consultas.get(clave)
+            if c is None:
+                c = self.consultas[clave] = {
+                    "huella": clave,
+                    "consulta": normalizar_consulta(query)[:2000],
+                    "ejecuciones": 0, "errores": 0, "lentas": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "filas": 0,
+                    "scanned_full": 0, "scanned_index": 0, "filtered": 0
+                }
+            c["ejecuciones"] += 1
+            c["total_ms"] += ms
+            c["max_ms"] = max(c["max_ms"], ms)
+            c["filas"] += filas
+            c["errores"] += 1 if error else 0
+            c["lentas"] += 1 if lenta else 0
+            for campo in ("scanned_full", "scanned_index", "filtered"):
+                c[campo] += (stats or {}).get(campo, 0) or 0
+            primera_lenta = explicar and lenta and clave not in self._planes
+            if profile is not None:
+                self._perfilar.discard(clave)
+            elif primera_lenta:
+                self._perfilar.add(clave)
+
+        if not lenta and profile is None:
+            return
+        plan = self._planes.get(clave)
+        if primera_lenta:
+            try:
+                plan = _resumen_plan(db.aql.explain(query, bind_vars=bind_vars))
+            except Exception as e:
+                plan = {"error": str(e)}
+            with self._lock:
+                self._planes[clave] = plan
+        entrada = {
+            "fecha": datetime.utcnow().isoformat(),
+            "huella": clave,
+            "ms": round(ms, 2),
+            "filas": filas,
+            "bind_vars": forma_bind_vars(bind_vars),
+            "stats": stats or {},
+            "plan": plan,
+            "consulta": normalizar_consulta(query)
+        }
+        if profile is not None:
+            entrada["profile"] = profile
+        if error:
+            entrada["error"] = error
+        try:
+            self._log().info(json.dumps(entrada, default=str, ensure_ascii=False))
+        except Exception as e:
+            print("❌ Error escribiendo log de AQL lentas:", e)
+
+    def top(self, limite=20, orden="total_ms"):
+        with self._lock:
+            filas = [dict(c) for c in self.consultas.values()]
+        for c in filas:
+            c["promedio_ms"] = c["total_ms"] / c["ejecuciones"] if c["ejecuciones"] else 0.0
+            c["plan"] = self._planes.get(c["huella"])
+        return sorted(filas, key=lambda c: c.get(orden, 0), reverse=True)[:limite]
+
+
+perfil = PerfilAQL()
+
+
+class CursorMedido:
+    """Cursor de python-arango que registra la consulta al terminar de leerla."""
+
+    def __init__(self, cursor, db, query, bind_vars, inicio, perfilada):
+        self._cursor = cursor
+        self._db = db
+        self._query = query
+        self._bind_vars = bind_vars
+        self._inicio = inicio
+        self._perfilada = perfilada
+        self._filas = 0
+        self._registrado = False
+
+    def _terminar(self, explicar=True):
+        if self._registrado:
+            return
+        self._registrado = True
+        duracion = time.perf_counter() - self._inicio
+        perfil.registrar(
+            self._db, self._query, self._bind_vars, duracion, self._filas,
+            self._cursor.statistics(),
+            self._cursor.profile() if self._perfilada else None,
+            explicar=explicar
+        )
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            fila = next(self._cursor)
+        except StopIteration:
+            self._terminar()
+            raise
+        self._filas += 1
+        return fila
+
+    def __len__(self):
+        return len(self._cursor)
+
+    def __getattr__(self, atributo):
+        return getattr(self._cursor, atributo)
+
+    def __del__(self):
+        # Cursores que no se leyeron hasta el final (o no se leyeron)
+        try:
+            self._terminar(explicar=False)
+        except Exception:
+            pass
+
+
+class AQLMedido:
+    """Envuelve db.aql: execute() devuelve un CursorMedido."""
+
+    def __init__(self, aql, db):
+        self._aql = aql
+        self._db = db
+
+    def execute(self, query, bind_vars=None, **kwargs):
+        perfilada = perfil.debe_perfilar(huella(query))
+        if perfilada:
+            kwargs["profile"] = 2
+        inicio = time.perf_counter()
+        try:
+            cursor = self._aql.execute(query, bind_vars=bind_vars, **kwargs)
+        except Exception as e:
+            perfil.registrar(self._db, query, bind_vars, time.perf_counter() - inicio, 0, None, error=str(e))
+            raise
+        return CursorMedido(cursor, self._db, query, bind_vars, inicio, perfilada)
+
+    def __getattr__(self, atributo):
+        return getattr(self._aql, atributo)
+
+
+class BaseDatosMedida:
+    """Envuelve la base de python-arango para instrumentar db.aql."""
+
+    def __init__(self, db):
+        self._db = db
+
+    @property
+    def aql(self):
+        return AQLMedido(self._db.aql, self._db)
+
+    def __getattr__(self, atributo):
+        return getattr(self._db, atributo)
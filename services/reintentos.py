@@ -0,0 +1,25 @@
+import time
+from config import obtener_db
+
+# Códigos de ArangoDB por los que vale la pena repetir la consulta completa:
+# 1200 = conflicto de escritura (otra transacción tocó el mismo documento);
+# 1210 = violación de índice único (dos UPSERT simultáneos sobre una clave
+# que no existía: ambos insertan y uno pierde).
+ERRORES_CONFLICTO = (1200, 1210)
+
+
+def ejecutar_con_reintentos(aql, bind_vars, max_reintentos=5, espera=0.01):
+    """
+    Ejecuta una consulta de escritura y devuelve sus resultados en una lista.
+    Si choca con otra transacción (ERRORES_CONFLICTO) la reintenta hasta
+    'max_reintentos' veces, esperando espera * 2^intento segundos entre
+    intentos. La consulta completa se aborta en el servidor ante el
+    conflicto, así que reintentarla es seguro.
+    """
+    for intento in range(max_reintentos):
+        try:
+            return list(obtener_db().aql.execute(aql, bind_vars=bind_vars))
+        except Exception as e:
+            if getattr(e, "error_code", None) not in ERRORES_CONFLICTO or intento == max_reintentos - 1:
+                raise
+            time.sleep(espera * (2 ** intento))
@@ -0,0 +1,98 @@
+import os
+import threading
+from services.reintentos import ejecutar_con_reintentos
+
+# IDs que cada proceso reserva de una vez por secuencia (hi/lo). Los que un
+# proceso no llega a usar antes de terminar quedan como huecos en la numeración.
+SECUENCIA_BLOQUE = int(os.getenv("SECUENCIA_BLOQUE", "20"))
+
+# Reintentos si otro proceso reservó a la vez (write-write conflict o alta
+# simultánea del contador)
+_MAX_REINTENTOS = 8
+
+# counters/<nombre>.valor es el último ID entregado por la secuencia
+_AQL_RESERVAR = """
+UPSERT {_key: @nombre}
+INSERT {_key: @nombre, valor: @cantidad}
+UPDATE {valor: OLD.valor + @cantidad}
+IN counters
+RETURN NEW.valor
+"""
+
+
+def reservar_ids(nombre, cantidad):
+    """
+    Reserva 'cantidad' IDs consecutivos de la secuencia en un solo viaje a la
+    base y devuelve el range reservado (p. ej. para importaciones masivas).
+    La escritura sobre el contador es atómica: si otro proceso reserva al
+    mismo tiempo la consulta choca, se aborta sin cambios y se reintenta,
+    así dos procesos nunca reciben el mismo ID.
+    """
+    cantidad = int(cantidad)
+    if cantidad <= 0:
+        raise ValueError("La cantidad de IDs a reservar debe ser positiva")
+    ultimo = ejecutar_con_reintentos(_AQL_RESERVAR, {"nombre": nombre, "cantidad": cantidad},
+                                     max_reintentos=_MAX_REINTENTOS, espera=0.005)[0]
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+class Secuencia:
+    """
+    Secuencia con bloques reservados (hi/lo): siguiente() entrega IDs desde
+    memoria y sólo va a la base cuando se agota el bloque. Los procesos
+    creados por fork descartan el bloque heredado y reservan uno propio.
+    """
+
+    def __init__(self, nombre, bloque=SECUENCIA_BLOQUE):
+        self.nombre = nombre
+        self.bloque = max(1, bloque)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._siguiente = 1
+        self._limite = 0
+        self.reservas = 0
+
+    def siguiente(self):
+        with self._lock:
+            if self._pid != os.getpid() or self._siguiente > self._limite:
+                ids = reservar_ids(self.nombre, self.bloque)
+                self._siguiente, self._limite = ids.start, ids[-1]
+                self._pid = os.getpid()
+                self.reservas += 1
+            valor = self._siguiente
+            self._siguiente += 1
+            return valor
+
+    def disponibles(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return 0
+            return self._limite - self._siguiente + 1
+
+
+_secuencias = {}
+_lock = threading.Lock()
+
+
+def secuencia(nombre):
+    """Secuencia compartida del proceso para 'nombre' (se crea en el primer uso)."""
+    with _lock:
+        if nombre not in _secuencias:
+            _secuencias[nombre] = Secuencia(nombre)
+        return _secuencias[nombre]
+
+
+def siguiente_id(nombre):
+    """Siguiente ID de la secuencia (clientes, usuarios, empleado, contrato...)."""
+    return secuencia(nombre).siguiente()
+
+
+def metricas():
+    with _lock:
+        lista = list(_secuencias.values())
+    return {
+        "bloque": SECUENCIA_BLOQUE,
+        "secuencias": len(lista),
+        "reservas": sum(s.reservas for s in lista),
+        "ids_disponibles": sum(s.disponibles() for s in lista),
+    }
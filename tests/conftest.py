@@ -0,0 +1,31 @@
+import os
+import uuid
+import pytest
+from services.arango_memoria import BaseDatosMemoria
+
+# Servidor ArangoDB de pruebas (opcional). Si está definido, cada prueba corre
+# también contra él en una base temporal: así se comprueba que el backend en
+# memoria devuelve lo mismo que el servidor. Sin él esas variantes se saltean.
+ARANGO_PRUEBAS_HOST = os.getenv("ARANGO_PRUEBAS_HOST")
+ARANGO_PRUEBAS_USERNAME = os.getenv("ARANGO_PRUEBAS_USERNAME", "root")
+ARANGO_PRUEBAS_PASSWORD = os.getenv("ARANGO_PRUEBAS_PASSWORD", "")
+
+
+@pytest.fixture(params=["memoria", "servidor"])
+def db(request):
+    """Base vacía: en memoria o, con ARANGO_PRUEBAS_HOST, una base temporal del servidor."""
+    if request.param == "memoria":
+        yield BaseDatosMemoria("pruebas")
+        return
+    if not ARANGO_PRUEBAS_HOST:
+        pytest.skip("ARANGO_PRUEBAS_HOST no está definido")
+    from arango import ArangoClient
+    cliente = ArangoClient(hosts=ARANGO_PRUEBAS_HOST)
+    sistema = cliente.db("_system", username=ARANGO_PRUEBAS_USERNAME, password=ARANGO_PRUEBAS_PASSWORD)
+    nombre = f"pruebas_{uuid.uuid4().hex[:12]}"
+    sistema.create_database(nombre)
+    try:
+        yield cliente.db(nombre, username=ARANGO_PRUEBAS_USERNAME, password=ARANGO_PRUEBAS_PASSWORD)
+    finally:
+        sistema.delete_database(nombre)
+        cliente.close()
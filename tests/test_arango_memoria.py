@@ -0,0 +1,281 @@
+"""
+Pruebas del backend en memoria (services/arango_memoria) sobre las
+construcciones de AQL y de python-arango que usan los modelos. Con
+ARANGO_PRUEBAS_HOST corren también contra un servidor real (ver conftest).
+"""
+import pytest
+from arango.exceptions import ArangoError
+
+ERR_CONFLICTO = 1200
+ERR_UNICO = 1210
+ERR_FUNCION_DESCONOCIDA = 1540
+
+# Mismo analizador que models/schema.py
+ANALIZADOR_NGRAM = {
+    "type": "pipeline",
+    "properties": {"pipeline": [
+        {"type": "norm", "properties": {"locale": "es", "case": "lower", "accent": False}},
+        {"type": "ngram", "properties": {"min": 3, "max": 3, "preserveOriginal": False, "streamType": "utf8"}},
+    ]},
+    "features": ["frequency", "norm", "position"],
+}
+
+
+def consultar(db, aql, **bind_vars):
+    return list(db.aql.execute(aql, bind_vars=bind_vars))
+
+
+def codigo_error(excinfo):
+    return excinfo.value.error_code
+
+
+# ---- UPSERT ----
+def test_upsert_inserta_y_despues_actualiza(db):
+    db.create_collection("counters")
+    aql = """
+    UPSERT {_key: @nombre}
+    INSERT {_key: @nombre, valor: @cantidad}
+    UPDATE {valor: OLD.valor + @cantidad}
+    IN counters
+    RETURN {valor: NEW.valor, nuevo: OLD == null}
+    """
+    assert consultar(db, aql, nombre="clientes", cantidad=20) == [{"valor": 20, "nuevo": True}]
+    assert consultar(db, aql, nombre="clientes", cantidad=20) == [{"valor": 40, "nuevo": False}]
+    assert db.collection("counters").get("clientes")["valor"] == 40
+
+
+def test_upsert_por_atributo_no_clave(db):
+    db.create_collection("ventas_diarias")
+    aql = """
+    UPSERT {fecha: @fecha}
+    INSERT {fecha: @fecha, total: @total}
+    UPDATE {total: OLD.total + @total}
+    IN ventas_diarias
+    """
+    consultar(db, aql, fecha="2024-05-01", total=10)
+    consultar(db, aql, fecha="2024-05-01", total=5)
+    consultar(db, aql, fecha="2024-05-02", total=1)
+    assert consultar(db, "FOR d IN ventas_diarias SORT d.fecha RETURN [d.fecha, d.total]") == [
+        ["2024-05-01", 15], ["2024-05-02", 1]
+    ]
+
+
+# ---- COLLECT / AGGREGATE ----
+@pytest.fixture
+def ventas(db):
+    col = db.create_collection("ventas")
+    col.insert_many([
+        {"_key": "1", "vendedor": "ana", "total": 10, "fecha": "2024-05-01T10:00:00"},
+        {"_key": "2", "vendedor": "ana", "total": 5, "fecha": "2024-05-02T11:00:00"},
+        {"_key": "3", "vendedor": "luis", "total": 7, "fecha": "2024-05-01T12:00:00"},
+        {"_key": "4", "total": 1, "fecha": "2024-05-02T09:00:00"},
+    ])
+    return col
+
+
+def test_collect_aggregate(db, ventas):
+    aql = """
+    FOR v IN ventas
+        COLLECT vendedor = NOT_NULL(v.vendedor, "N/A")
+        AGGREGATE total = SUM(v.total), transacciones = COUNT(1), mayor = MAX(v.total)
+        RETURN {vendedor, total, transacciones, mayor}
+    """
+    assert consultar(db, aql) == [
+        {"vendedor": "N/A", "total": 1, "transacciones": 1, "mayor": 1},
+        {"vendedor": "ana", "total": 15, "transacciones": 2, "mayor": 10},
+        {"vendedor": "luis", "total": 7, "transacciones": 1, "mayor": 7},
+    ]
+
+
+def test_collect_sin_grupos_y_con_into(db, ventas):
+    assert consultar(db, "FOR v IN ventas COLLECT AGGREGATE total = SUM(v.total) RETURN total") == [23]
+    aql = """
+    FOR v IN ventas
+        COLLECT dia = SUBSTRING(v.fecha, 0, 10) INTO grupo = v._key
+        RETURN {dia, claves: SORTED(grupo)}
+    """
+    assert consultar(db, aql) == [
+        {"dia": "2024-05-01", "claves": ["1", "3"]},
+        {"dia": "2024-05-02", "claves": ["2", "4"]},
+    ]
+    aql = "FOR v IN ventas COLLECT vendedor = v.vendedor WITH COUNT INTO n RETURN [vendedor, n]"
+    assert consultar(db, aql) == [[None, 1], ["ana", 2], ["luis", 1]]
+
+
+# ---- DOCUMENT() ----
+def test_document(db):
+    db.create_collection("stock").insert_many([
+        {"_key": "p1", "cantidad": 3}, {"_key": "p2", "cantidad": 0}
+    ])
+    aql = """
+    RETURN {
+        por_clave: DOCUMENT("stock", "p1").cantidad,
+        por_id: DOCUMENT("stock/p2").cantidad,
+        varios: DOCUMENT("stock", ["p2", "nada", "p1"])[*]._key,
+        falta: DOCUMENT("stock", "nada")
+    }
+    """
+    assert consultar(db, aql) == [{"por_clave": 3, "por_id": 0, "varios": ["p2", "p1"], "falta": None}]
+
+
+# ---- SEARCH / TOKENS / BM25 ----
+@pytest.fixture
+def vista_clientes(db):
+    db.create_analyzer("texto_ngram", ANALIZADOR_NGRAM["type"], ANALIZADOR_NGRAM["properties"],
+                       ANALIZADOR_NGRAM["features"])
+    db.create_collection("clientes").insert_many([
+        {"_key": "corto", "nombre": "Gómez"},
+        {"_key": "largo", "nombre": "Juan Carlos Gómez Fernández"},
+        {"_key": "otro", "nombre": "Ana López"},
+    ])
+    db.create_arangosearch_view("clientes_busqueda", {"links": {"clientes": {"fields": {
+        "nombre": {"analyzers": ["texto_ngram"]}
+    }}}})
+
+
+def test_tokens_normaliza_y_parte_en_trigramas(db, vista_clientes):
+    tokens = consultar(db, 'RETURN TOKENS("GÓMEZ", "texto_ngram")')[0]
+    assert sorted(tokens) == ["gom", "mez", "ome"]
+    assert consultar(db, 'RETURN TOKENS("go", "texto_ngram")') == [[]]
+
+
+def test_search_all_ordena_por_bm25(db, vista_clientes):
+    aql = """
+    LET terminos = TOKENS(@q, "texto_ngram")
+    FOR c IN clientes_busqueda
+        SEARCH ANALYZER(terminos ALL == c.nombre, "texto_ngram")
+        OPTIONS {waitForSync: true}
+        SORT BM25(c) DESC
+        RETURN c._key
+    """
+    # A igual frecuencia puntúa más el campo más corto
+    assert consultar(db, aql, q="gomez") == ["corto", "largo"]
+    assert consultar(db, aql, q="lopez") == ["otro"]
+    assert consultar(db, aql, q="gomezz") == []
+
+
+def test_search_starts_with_y_like(db, vista_clientes):
+    aql = """
+    FOR c IN clientes_busqueda
+        SEARCH ANALYZER(CONDICION, "texto_ngram")
+        OPTIONS {waitForSync: true}
+        SORT c._key
+        RETURN c._key
+    """
+    # Algún trigrama que empieza con "lo": "López" y "Carlos"
+    assert consultar(db, aql.replace("CONDICION", "STARTS_WITH(c.nombre, @p)"), p="lo") == ["largo", "otro"]
+    # LIKE sobre los trigramas encuentra también el final del campo
+    assert consultar(db, aql.replace("CONDICION", "LIKE(c.nombre, @p)"), p="%ez%") == ["corto", "largo", "otro"]
+    assert consultar(db, aql.replace("CONDICION", "LIKE(c.nombre, @p)"), p="%zq%") == []
+
+
+# ---- Transacciones ----
+def test_transaccion_abortada_no_deja_escrituras(db):
+    db.create_collection("ventas")
+    db.collection("ventas").insert({"_key": "previa", "total": 1})
+    transaccion = db.begin_transaction(write=["ventas"])
+    transaccion.collection("ventas").insert({"_key": "nueva", "total": 2})
+    transaccion.aql.execute("UPDATE 'previa' WITH {total: 99} IN ventas")
+    transaccion.aql.execute("REMOVE 'nueva' IN ventas")
+    transaccion.aql.execute("INSERT {_key: 'otra'} IN ventas")
+    assert transaccion.abort_transaction() is True
+    assert transaccion.transaction_status() == "aborted"
+    assert consultar(db, "FOR v IN ventas RETURN [v._key, v.total]") == [["previa", 1]]
+
+
+def test_transaccion_confirmada(db):
+    db.create_collection("ventas")
+    transaccion = db.begin_transaction(write=["ventas"])
+    transaccion.collection("ventas").insert({"_key": "nueva"})
+    transaccion.commit_transaction()
+    assert transaccion.transaction_status() == "committed"
+    assert db.collection("ventas").has("nueva")
+
+
+def test_consulta_que_falla_no_deja_escrituras(db):
+    db.create_collection("ventas").insert({"_key": "3"})
+    with pytest.raises(ArangoError) as excinfo:
+        consultar(db, "FOR i IN 1..5 INSERT {_key: TO_STRING(i)} IN ventas")
+    assert codigo_error(excinfo) == ERR_UNICO
+    assert db.collection("ventas").count() == 1
+
+
+# ---- Índices únicos y sparse ----
+def test_indice_unico_sparse(db):
+    productos = db.create_collection("productos")
+    productos.add_index({"type": "persistent", "name": "idx_productos_codigo_barras",
+                         "fields": ["codigo_barras"], "unique": True, "sparse": True})
+    # Sparse: los documentos sin código (o con null) no chocan entre sí
+    productos.insert({"_key": "a"})
+    productos.insert({"_key": "b", "codigo_barras": None})
+    productos.insert({"_key": "c", "codigo_barras": "779"})
+    with pytest.raises(ArangoError) as excinfo:
+        productos.insert({"_key": "d", "codigo_barras": "779"})
+    assert codigo_error(excinfo) == ERR_UNICO
+    with pytest.raises(ArangoError) as excinfo:
+        productos.update({"_key": "a", "codigo_barras": "779"})
+    assert codigo_error(excinfo) == ERR_UNICO
+    with pytest.raises(ArangoError) as excinfo:
+        consultar(db, "UPDATE 'b' WITH {codigo_barras: '779'} IN productos")
+    assert codigo_error(excinfo) == ERR_UNICO
+    assert consultar(db, "FOR p IN productos SORT p._key RETURN p.codigo_barras") == [None, None, "779"]
+
+
+def test_indice_unico_no_sparse(db):
+    usuarios = db.create_collection("usuarios")
+    usuarios.add_index({"type": "persistent", "name": "idx_usuarios_email", "fields": ["email"], "unique": True})
+    usuarios.insert({"_key": "a"})
+    # Sin sparse el atributo ausente se indexa como null y también es único
+    with pytest.raises(ArangoError) as excinfo:
+        usuarios.insert({"_key": "b"})
+    assert codigo_error(excinfo) == ERR_UNICO
+    with pytest.raises(ArangoError) as excinfo:
+        usuarios.insert({"_key": "a", "email": "x@y.z"})
+    assert codigo_error(excinfo) == ERR_UNICO
+
+
+def test_indices_por_nombre(db):
+    col = db.create_collection("stock")
+    col.add_index({"type": "persistent", "name": "idx_stock_producto_id", "fields": ["producto_id"]})
+    assert [i["name"] for i in col.indexes()] == ["primary", "idx_stock_producto_id"]
+
+
+# ---- Funciones que AQL no tiene ----
+@pytest.mark.parametrize("aql", ['RETURN INDEXES("stock")', "RETURN NO_EXISTE(1)"])
+def test_funcion_desconocida(db, aql):
+    db.create_collection("stock")
+    with pytest.raises(ArangoError) as excinfo:
+        consultar(db, aql)
+    assert codigo_error(excinfo) == ERR_FUNCION_DESCONOCIDA
+
+
+# ---- Conflictos de _rev ----
+def test_conflicto_de_rev(db):
+    stock = db.create_collection("stock")
+    stock.insert({"_key": "p1", "cantidad": 5})
+    leido = stock.get("p1")
+    stock.update({"_key": "p1", "cantidad": 4})
+    with pytest.raises(ArangoError) as excinfo:
+        stock.update({**leido, "cantidad": 3}, check_rev=True)
+    assert codigo_error(excinfo) == ERR_CONFLICTO
+    with pytest.raises(ArangoError) as excinfo:
+        stock.delete(leido, check_rev=True)
+    assert codigo_error(excinfo) == ERR_CONFLICTO
+    # Sin verificar la _rev gana la última escritura
+    stock.update({**leido, "cantidad": 3}, check_rev=False)
+    assert stock.get("p1")["cantidad"] == 3
+
+
+def test_conflicto_de_rev_en_aql(db):
+    stock = db.create_collection("stock")
+    stock.insert({"_key": "p1", "cantidad": 5})
+    leido = stock.get("p1")
+    stock.update({"_key": "p1", "cantidad": 4})
+    aql = "UPDATE @doc WITH {cantidad: @doc.cantidad - 1} IN stock OPTIONS {ignoreRevs: @ignorar} RETURN NEW.cantidad"
+    with pytest.raises(ArangoError) as excinfo:
+        consultar(db, aql, doc=leido, ignorar=False)
+    assert codigo_error(excinfo) == ERR_CONFLICTO
+    assert stock.get("p1")["cantidad"] == 4
+    assert consultar(db, aql, doc=leido, ignorar=True) == [4]
+    actual = stock.get("p1")
+    assert consultar(db, aql, doc=actual, ignorar=False) == [3]
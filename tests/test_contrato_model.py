@@ -0,0 +1,39 @@
+"""Búsqueda de contratos (models/contrato_model._filtros_busqueda) sobre el backend en memoria."""
+import pytest
+from models.contrato_model import _filtros_busqueda, campos_busqueda
+
+
+@pytest.fixture
+def contratos(db):
+    col = db.create_collection("contratos")
+    col.add_index({"type": "persistent", "name": "idx_contratos_busqueda", "fields": ["busqueda_claves[*]"]})
+    filas = [
+        ("1", {"nombre": "Ana", "apellido": "Gómez", "nro_documento": "1010"}, "Indefinido", "Cajera"),
+        ("2", {"nombre": "Luis", "apellido": "Pérez", "nro_documento": "2020"}, "Fijo", "Bodeguero"),
+        ("3", {"nombre": "Marta", "apellido": "Ruiz", "nro_documento": "3030"}, "Aprendizaje", "Auxiliar"),
+    ]
+    for clave, empleado, tipo_contrato, cargo in filas:
+        contrato = {"_key": clave, "tipo_contrato": tipo_contrato, "cargo": cargo}
+        col.insert({**contrato, **campos_busqueda(contrato, empleado)})
+    return col
+
+
+def buscar(db, termino):
+    bind_vars = {}
+    filtros = _filtros_busqueda(termino, bind_vars)
+    aql = "FOR contrato IN contratos " + " ".join(filtros) + " SORT contrato._key RETURN contrato._key"
+    return list(db.aql.execute(aql, bind_vars=bind_vars))
+
+
+@pytest.mark.parametrize("termino, esperado", [
+    ("ez", ["1", "2"]),       # 2 letras en medio o al final de una palabra
+    ("ui", ["2", "3"]),
+    ("GÓ", ["1"]),            # sin tildes ni mayúsculas
+    ("a", ["1", "3"]),
+    ("omez", ["1"]),          # 3 o más letras: por trigramas
+    ("bodeg", ["2"]),
+    ("zz", []),
+    ("", ["1", "2", "3"]),
+])
+def test_busqueda_contiene_el_termino(db, contratos, termino, esperado):
+    assert buscar(db, termino) == esperado